@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import importlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import model_router
+from jsonl_log import CompressedJSONLWriter, read_records
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Log settings
+LOG_ENABLED = os.environ.get("AI_DECISION_LOG", "1") != "0"
+LOG_DIR = os.environ.get("AI_DECISION_LOG_DIR", os.path.join("logs", "ai_decisions"))
+SEGMENT_BYTES = int(os.environ.get("AI_DECISION_LOG_SEGMENT_MB", "16")) * 1024 * 1024
+PROMPT_CACHE_SIZE = int(os.environ.get("AI_DECISION_LOG_PROMPT_CACHE", "10000"))  # Recent prompt hashes remembered
+
+# Log names: one record per call, and each distinct prompt stored once
+DECISIONS = 'decisions'
+PROMPTS = 'prompts'
+
+_writers = {}
+_prompt_hashes = OrderedDict()  # Recently logged prompt hashes, least recently seen first
+_lock = threading.Lock()
+
+
+def prompt_hash(system_message, prompt):
+    """Stable hash identifying a (system message, prompt) pair."""
+    return hashlib.sha256(f"{system_message}\x00{prompt}".encode('utf-8')).hexdigest()
+
+
+def _writer(name):
+    with _lock:
+        writer = _writers.get(name)
+        if writer is None:
+            writer = _writers[name] = CompressedJSONLWriter(LOG_DIR, name, max_bytes=SEGMENT_BYTES)
+        return writer
+
+
+def _is_new_prompt(digest):
+    """
+    Return True unless a prompt hash is among the PROMPT_CACHE_SIZE most recently seen.
+
+    Only this process's recent prompts are remembered, so a prompt can be
+    logged again after a restart or once evicted; load_prompts keeps one
+    record per hash.
+    """
+    with _lock:
+        if digest in _prompt_hashes:
+            _prompt_hashes.move_to_end(digest)
+            return False
+        _prompt_hashes[digest] = None
+        if len(_prompt_hashes) > PROMPT_CACHE_SIZE:
+            _prompt_hashes.popitem(last=False)
+        return True
+
+
+def _decision_of(function, result):
+    """Decision and confidence of a parsed result, per the function's routing policy."""
+    if not isinstance(result, dict):
+        return None, None
+    policy = model_router.get_policy(function)
+    try:
+        return policy.decision(result), model_router.as_number(policy.confidence(result))
+    except Exception:
+        return None, None
+
+
+def record(function, model, system_message, prompt, latency, usage=None, result=None, error=None,
+           currency_pair=None, raw_response=None, stream=False):
+    """
+    Append one Groq call to the decision log.
+
+    The prompt text is written to the prompts log only the first time its hash
+    is seen recently (see _is_new_prompt); every call is written to the decisions log with the hash, model,
+    latency, token usage and parsed result. Writing happens in the background,
+    so this never blocks on disk.
+
+    Args:
+        function (str): AI function name (e.g. 'analyze_market_with_ai')
+        model (str): Model that served the call
+        system_message (str): System message sent
+        prompt (str): User prompt sent
+        latency (float): Seconds the call took
+        usage: Usage object reported by the API, if any
+        result (dict): Parsed AI result, if the call succeeded
+        error (str): Error message, if the call failed
+        currency_pair (str): Pair the call was about, if any
+        raw_response (str): Raw response text (kept when it could not be parsed)
+        stream (bool): Whether the completion was streamed
+    """
+    if not LOG_ENABLED:
+        return
+    try:
+        digest = prompt_hash(system_message, prompt)
+        now = datetime.utcnow().isoformat()
+        if _is_new_prompt(digest):
+            _writer(PROMPTS).write({
+                'prompt_hash': digest,
+                'function': function,
+                'system_message': system_message,
+                'prompt': prompt,
+                'first_seen': now
+            })
+
+        decision, confidence = _decision_of(function, result)
+        entry = {
+            'timestamp': now,
+            'function': function,
+            'model': model,
+            'prompt_hash': digest,
+            'currency_pair': currency_pair,
+            'latency': round(latency, 4),
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None) if usage else None,
+            'completion_tokens': getattr(usage, 'completion_tokens', None) if usage else None,
+            'stream': stream,
+            'decision': decision,
+            'confidence': confidence,
+            'result': result,
+            'error': error
+        }
+        if raw_response is not None:
+            entry['raw_response'] = raw_response
+        _writer(DECISIONS).write(entry)
+    except Exception as e:
+        # Logging must never break an AI call
+        logger.error(f"Error recording AI decision for {function}: {str(e)}")
+
+
+def flush():
+    """Block until all queued log records have been written."""
+    for writer in list(_writers.values()):
+        writer.flush()
+
+
+def iter_decisions(function=None, model=None, currency_pair=None, since=None, with_prompts=False):
+    """
+    Yield logged decisions, oldest first, optionally filtered.
+
+    Args:
+        function (str): Only decisions of this AI function
+        model (str): Only decisions served by this model
+        currency_pair (str): Only decisions about this pair
+        since (str): Only decisions at or after this ISO timestamp
+        with_prompts (bool): Attach `system_message` and `prompt` to each record
+    """
+    prompts = load_prompts() if with_prompts else None
+    for entry in read_records(LOG_DIR, DECISIONS):
+        if function and entry.get('function') != function:
+            continue
+        if model and entry.get('model') != model:
+            continue
+        if currency_pair and entry.get('currency_pair') != currency_pair:
+            continue
+        if since and entry.get('timestamp', '') < since:
+            continue
+        if prompts is not None:
+            text = prompts.get(entry.get('prompt_hash'), {})
+            entry['system_message'] = text.get('system_message')
+            entry['prompt'] = text.get('prompt')
+        yield entry
+
+
+def load_prompts():
+    """Return the logged prompts keyed by prompt hash."""
+    return {record['prompt_hash']: record for record in read_records(LOG_DIR, PROMPTS)}
+
+
+# Replay
+
+def echo_stub(function, model, system_message, prompt, logged):
+    """Replay stub answering with the logged result (measures the replay pipeline itself)."""
+    return dict(logged.get('result') or {})
+
+
+def hold_stub(function, model, system_message, prompt, logged):
+    """Replay stub that never trades."""
+    return {'recommendation': 'hold', 'execute_trade': False, 'trade_type': 'hold', 'confidence': 0}
+
+
+STUBS = {
+    'echo': echo_stub,
+    'hold': hold_stub
+}
+
+
+def groq_responder(function, model, system_message, prompt, logged):
+    """Replay a prompt against a Groq model (bypassing the live rate limiter and breakers)."""
+    import groq_ai
+    return groq_ai._response_json(groq_ai._create_completion(model, system_message, prompt))
+
+
+def load_stub(spec):
+    """Resolve a stub name from STUBS or a 'module:function' reference."""
+    if spec in STUBS:
+        return STUBS[spec]
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f"Unknown stub '{spec}', expected one of {sorted(STUBS)} or module:function")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def replay(responder, model=None, function=None, since=None, limit=None, workers=8):
+    """
+    Re-run logged prompts and compare the new decisions with the logged ones.
+
+    Each distinct prompt is replayed once, against its most recent successful
+    logged decision. Calls run concurrently on a thread pool.
+
+    Args:
+        responder (callable): responder(function, model, system_message, prompt, logged)
+            returns the parsed result dict
+        model (str): Model to replay against (defaults to the logged model)
+        function (str): Only replay prompts of this AI function
+        since (str): Only replay decisions at or after this ISO timestamp
+        limit (int): Maximum number of prompts to replay
+        workers (int): Number of concurrent calls
+
+    Returns:
+        dict: Summary with per-function agreement rates, confidence drift,
+            latency and the individual disagreements
+    """
+    prompts = load_prompts()
+    latest = {}
+    for entry in iter_decisions(function=function, since=since):
+        if entry.get('error') or entry.get('prompt_hash') not in prompts:
+            continue
+        latest[(entry['function'], entry['prompt_hash'])] = entry
+    items = list(latest.values())
+    if limit:
+        items = items[-limit:]
+
+    def run(logged):
+        text = prompts[logged['prompt_hash']]
+        start = time.monotonic()
+        try:
+            result = responder(logged['function'], model or logged['model'],
+                               text['system_message'], text['prompt'], logged)
+            error = None
+        except Exception as e:
+            result, error = None, str(e)
+        return logged, result, error, time.monotonic() - start
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        outcomes = list(executor.map(run, items))
+    elapsed = time.monotonic() - started
+
+    summary = {}
+    disagreements = []
+    for logged, result, error, latency in outcomes:
+        stats = summary.setdefault(logged['function'], {
+            'replayed': 0,
+            'errors': 0,
+            'agreed': 0,
+            'latency_total': 0.0,
+            'confidence_drift_total': 0.0,
+            'confidence_compared': 0
+        })
+        stats['replayed'] += 1
+        stats['latency_total'] += latency
+        if error:
+            stats['errors'] += 1
+            continue
+
+        decision, confidence = _decision_of(logged['function'], result)
+        if decision == logged.get('decision'):
+            stats['agreed'] += 1
+        else:
+            disagreements.append({
+                'function': logged['function'],
+                'currency_pair': logged.get('currency_pair'),
+                'prompt_hash': logged['prompt_hash'],
+                'logged_model': logged.get('model'),
+                'logged_decision': logged.get('decision'),
+                'replayed_decision': decision
+            })
+        if confidence is not None and logged.get('confidence') is not None:
+            stats['confidence_drift_total'] += confidence - logged['confidence']
+            stats['confidence_compared'] += 1
+
+    for stats in summary.values():
+        answered = stats['replayed'] - stats['errors']
+        stats['agreement_rate'] = round(stats['agreed'] / answered, 3) if answered else None
+        stats['avg_latency'] = round(stats.pop('latency_total') / stats['replayed'], 3)
+        compared = stats.pop('confidence_compared')
+        drift = stats.pop('confidence_drift_total')
+        stats['avg_confidence_drift'] = round(drift / compared, 2) if compared else None
+
+    return {
+        'prompts': len(items),
+        'elapsed': round(elapsed, 3),
+        'throughput': round(len(items) / elapsed, 1) if elapsed else None,
+        'functions': summary,
+        'disagreements': disagreements
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged AI prompts and compare decisions")
+    parser.add_argument("--model", help="Groq model to replay against (defaults to the logged model)")
+    parser.add_argument("--stub", help=f"Replay against a stub instead of Groq ({', '.join(STUBS)} or module:function)")
+    parser.add_argument("--function", help="Only replay prompts of this AI function")
+    parser.add_argument("--since", help="Only replay decisions at or after this ISO timestamp")
+    parser.add_argument("--limit", type=int, help="Maximum number of prompts to replay")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent replay calls (default 8)")
+    args = parser.parse_args()
+
+    try:
+        # Registers the routing policies, which define how decisions are compared
+        import groq_ai  # noqa: F401
+    except Exception as e:
+        if not args.stub:
+            raise
+        logger.warning(f"Could not load groq_ai routing policies, comparing recommendations only: {str(e)}")
+
+    responder = load_stub(args.stub) if args.stub else groq_responder
+    summary = replay(responder, model=args.model, function=args.function, since=args.since,
+                     limit=args.limit, workers=args.workers)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
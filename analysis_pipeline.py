@@ -0,0 +1,165 @@
+import time
+import logging
+import threading
+from metrics import LatencyHistogram
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class AnalysisContext:
+    """
+    State shared by the stages of one pipeline run.
+
+    The request parameters are set up front; stages read the values earlier
+    stages produced and add their own as attributes. `timings` records how
+    long each stage took and `skipped` which stages did not run.
+    """
+
+    def __init__(self, currency_pair, timeframe='1d', **options):
+        self.currency_pair = currency_pair
+        self.timeframe = timeframe
+        self.options = options
+        self.timings = {}
+        self.skipped = []
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+
+class Stage:
+    """
+    One step of an analysis pipeline.
+
+    Args:
+        name (str): Stage name (used to skip, replace and time it)
+        func (callable): func(context) reads and sets context attributes
+        provides (tuple): Context attributes the stage sets; required for caching
+        cache_ttl (float): Seconds to reuse the stage's outputs for the same
+            cache key (0 disables caching)
+        cache_key (callable): cache_key(context) returns the key outputs are
+            cached under (defaults to the pair and timeframe)
+        skip_if (callable): skip_if(context) returns True to skip the stage
+    """
+
+    def __init__(self, name, func, provides=(), cache_ttl=0, cache_key=None, skip_if=None):
+        self.name = name
+        self.func = func
+        self.provides = tuple(provides)
+        self.cache_ttl = cache_ttl
+        self.cache_key = cache_key or (lambda context: (context.currency_pair, context.timeframe))
+        self.skip_if = skip_if
+        self.histogram = LatencyHistogram()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+
+    def run(self, context):
+        if self.cache_ttl and self.provides:
+            key = self.cache_key(context)
+            with self._cache_lock:
+                cached = self._cache.get(key)
+                if cached and time.monotonic() - cached[0] < self.cache_ttl:
+                    self.cache_hits += 1
+                    for name, value in cached[1].items():
+                        setattr(context, name, value)
+                    return
+            self.func(context)
+            with self._cache_lock:
+                self._cache[key] = (time.monotonic(), {name: context.get(name) for name in self.provides})
+        else:
+            self.func(context)
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+
+class Pipeline:
+    """
+    Ordered list of stages run against a shared AnalysisContext.
+
+    Stages can be swapped (replace), reconfigured (configure) and skipped per
+    run; the latency of every stage and of whole runs is recorded in
+    histograms (see snapshot).
+    """
+
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = list(stages)
+        self.histogram = LatencyHistogram()
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(f"Unknown stage '{name}' in pipeline {self.name}")
+
+    def replace(self, name, func):
+        """Swap the implementation of a stage, keeping its settings."""
+        stage = self.stage(name)
+        stage.func = func
+        stage.clear_cache()
+        return stage
+
+    def configure(self, name, **settings):
+        """Change settings of a stage (e.g. cache_ttl or skip_if) at runtime."""
+        stage = self.stage(name)
+        for key, value in settings.items():
+            if not hasattr(stage, key):
+                raise ValueError(f"Unknown stage setting: {key}")
+            setattr(stage, key, value)
+        stage.clear_cache()
+        return stage
+
+    def run(self, context, skip=()):
+        """
+        Run every stage in order.
+
+        Args:
+            context (AnalysisContext): Shared state for the run
+            skip (iterable): Names of stages to skip for this run
+
+        Returns:
+            AnalysisContext: The context, with the stages' outputs and timings
+        """
+        start = time.monotonic()
+        for stage in self.stages:
+            if stage.name in skip or (stage.skip_if and stage.skip_if(context)):
+                context.skipped.append(stage.name)
+                continue
+            stage_start = time.monotonic()
+            try:
+                stage.run(context)
+            finally:
+                elapsed = time.monotonic() - stage_start
+                stage.histogram.observe(elapsed)
+                context.timings[stage.name] = round(elapsed, 4)
+        elapsed = time.monotonic() - start
+        self.histogram.observe(elapsed)
+        logger.debug(f"{self.name} pipeline for {context.currency_pair} took {elapsed:.3f}s: {context.timings}")
+        return context
+
+    def snapshot(self):
+        """Return latency histograms for the whole pipeline and each stage."""
+        return {
+            'pipeline': self.name,
+            'total': self.histogram.snapshot(),
+            'stages': [
+                {
+                    'name': stage.name,
+                    'cache_ttl': stage.cache_ttl,
+                    'cache_hits': stage.cache_hits,
+                    'latency': stage.histogram.snapshot()
+                }
+                for stage in self.stages
+            ]
+        }
+
+    def reset_metrics(self):
+        self.histogram.reset()
+        for stage in self.stages:
+            stage.histogram.reset()
+            stage.cache_hits = 0
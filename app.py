@@ -1,12 +1,15 @@
 import os
+import hmac
 import logging
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, current_app
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 import market_analysis
+import correlation
 import trading_bot
 import datetime
+import pandas as pd
 from functools import wraps
 
 # Configure logging
@@ -52,6 +55,8 @@ with app.app_context():
         Trade.query.limit(1).all()
         MarketAnalysis.query.limit(1).all()
         logger.info("Database tables verified successfully")
+        # Create tables added since the database was set up (existing ones are left as they are)
+        db.create_all()
     except Exception as e:
         logger.warning(f"Database tables need to be recreated: {str(e)}")
         # Drop all tables and recreate them
@@ -72,6 +77,23 @@ def with_app_context(f):
                 return f(*args, **kwargs)
     return decorated_function
 
+# Admin API check decorator
+def admin_api_required(f):
+    """
+    Restrict an endpoint to admins: requests must send ADMIN_API_TOKEN in the
+    X-Admin-Token header. Without a configured token the endpoints are disabled.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admin_token = os.environ.get("ADMIN_API_TOKEN")
+        if not admin_token:
+            return jsonify({'error': 'Admin API disabled: ADMIN_API_TOKEN is not configured'}), 503
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), admin_token.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 # Initialize trading bot
 bot = trading_bot.TradingBot()
 
@@ -92,7 +114,7 @@ def index():
     
     # Get latest analysis for a few currency pairs
     try:
-        eurusd_analysis = market_analysis.analyze_market('EURUSD')
+        eurusd_analysis = market_analysis.shared_analysis('EURUSD')
         bot_status['eurusd_recommendation'] = eurusd_analysis['recommendation']
         bot_status['eurusd_trend'] = eurusd_analysis['trend']
     except:
@@ -102,6 +124,10 @@ def index():
     
     return render_template('index.html', bot_status=bot_status)
 
+def run_analysis(currency_pair, timeframe):
+    """Analyze one timeframe, or all of them at once for timeframe 'mtf' (shared, see shared_analysis)."""
+    return market_analysis.shared_analysis(currency_pair, timeframe)
+
 @app.route('/analyze', methods=['GET', 'POST'])
 def analyze():
     if request.method == 'POST':
@@ -109,7 +135,7 @@ def analyze():
         timeframe = request.form.get('timeframe', '1d')
         
         try:
-            analysis_result = market_analysis.analyze_market(currency_pair, timeframe)
+            analysis_result = run_analysis(currency_pair, timeframe)
             session['analysis_result'] = analysis_result
             
             # Log the successful analysis
@@ -129,7 +155,7 @@ def analyze():
     timeframe = request.args.get('timeframe', '1d')
     
     try:
-        analysis_result = market_analysis.analyze_market(currency_pair, timeframe)
+        analysis_result = run_analysis(currency_pair, timeframe)
         session['analysis_result'] = analysis_result
         
         return render_template('analysis.html', 
@@ -145,7 +171,7 @@ def analyze_currency(currency_pair):
     timeframe = request.args.get('timeframe', '1d')
     
     try:
-        analysis_result = market_analysis.analyze_market(currency_pair, timeframe)
+        analysis_result = run_analysis(currency_pair, timeframe)
         session['analysis_result'] = analysis_result
         
         return render_template('analysis.html', 
@@ -187,7 +213,7 @@ def trading():
                 # Use the latest analysis to make trading decision
                 analysis = session.get('analysis_result', None)
                 if not analysis:
-                    analysis = market_analysis.analyze_market(currency_pair, '1d')
+                    analysis = market_analysis.analyze_market(currency_pair, '1d', ai_decision_only=True)
                 
                 result = bot.auto_trade(currency_pair, amount, analysis=analysis)
                 if result and result.get('status') == 'success':
@@ -218,6 +244,10 @@ def get_market_data(currency_pair):
     try:
         # Get historical data for the chart
         data = market_analysis.get_historical_data(currency_pair, timeframe)
+        if request.args.get('levels'):
+            # Support/resistance levels detected on the same data
+            detected = market_analysis.detect_levels(pd.DataFrame(data))
+            return jsonify({'data': data, 'levels': detected['levels']})
         return jsonify(data)
     except Exception as e:
         logger.error(f"Market data error: {str(e)}")
@@ -265,10 +295,17 @@ def analyze_trade_risk():
         if data.get('include_portfolio', False):
             # In a real application, you would get this from the logged-in user
             # For now, we'll use a demo portfolio
+            open_trades = trading_bot.TradingBot().get_open_trades()
             portfolio_info = {
                 'balance': 10000.0,  # Demo balance
-                'open_trades': trading_bot.TradingBot().get_open_trades()
+                'open_trades': open_trades
             }
+            # Exposure of the open trades correlated with the proposed one
+            try:
+                portfolio_info.update(correlation.correlated_exposure(
+                    currency_pair, trade_details['trade_type'], open_trades))
+            except Exception as e:
+                logger.error(f"Error computing correlated exposure: {str(e)}")
             
         # Call the risk analyzer
         risk_analysis = groq_ai.analyze_trade_risk(
@@ -295,5 +332,146 @@ def analyze_trade_risk():
             'message': f"Error analyzing trade risk: {str(e)}"
         }), 500
 
+@app.route('/api/admin/ai_breakers', methods=['GET'])
+@admin_api_required
+def ai_breakers():
+    """Show the state of the Groq circuit breakers (per endpoint and model)."""
+    import circuit_breaker
+    return jsonify({
+        'breakers': circuit_breaker.snapshot(),
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/ai_breakers/reset', methods=['POST'])
+@admin_api_required
+def reset_ai_breakers():
+    """Close all Groq circuit breakers and clear their statistics."""
+    import circuit_breaker
+    circuit_breaker.reset_all()
+    logger.info("Groq circuit breakers reset by admin")
+    return jsonify({'status': 'success'})
+
+@app.route('/api/admin/ai_usage', methods=['GET'])
+@admin_api_required
+def ai_usage():
+    """Show Groq prompt and completion token usage per function and model."""
+    import groq_ai
+    return jsonify({
+        'usage': groq_ai.token_usage_snapshot(),
+        'prompt_token_budget': groq_ai.prompt_templates.PROMPT_TOKEN_BUDGET,
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/ai_routing', methods=['GET'])
+@admin_api_required
+def ai_routing():
+    """Show Groq model routing policies with per-model latency and agreement rates."""
+    import groq_ai
+    return jsonify({
+        'routing': groq_ai.model_router.snapshot(),
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/analysis_writer', methods=['GET'])
+@admin_api_required
+def analysis_writer():
+    """Show the state of the background writer saving market analyses."""
+    return jsonify({
+        'writer': market_analysis.analysis_writer_stats(),
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/analysis_stages', methods=['GET'])
+@admin_api_required
+def analysis_stages():
+    """Show per-stage latency histograms of the analyze_market pipelines and shared analysis counters."""
+    return jsonify({
+        'stages': market_analysis.ANALYSIS_PIPELINE.snapshot(),
+        'mtf_stages': market_analysis.MTF_PIPELINE.snapshot(),
+        'shared': market_analysis.shared_analysis_stats(),
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    """Receive Telegram updates in webhook mode (authenticated by the webhook secret token)."""
+    import telegram_bot_simple
+    if not telegram_bot_simple.verify_webhook_secret(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        logger.warning(f"Rejected Telegram webhook request from {request.remote_addr}: invalid secret token")
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No update provided'}), 400
+    try:
+        telegram_bot_simple.process_webhook_update(data)
+    except Exception as e:
+        # Answer 200 anyway, Telegram would only resend the same update
+        logger.error(f"Error processing Telegram update: {str(e)}")
+    return jsonify({'ok': True})
+
+@app.route('/api/admin/telegram_webhook', methods=['POST'])
+@admin_api_required
+def register_telegram_webhook():
+    """Register the Telegram webhook at TELEGRAM_WEBHOOK_URL (the request body is not used)."""
+    import telegram_bot_simple
+    try:
+        telegram_bot_simple.set_webhook()
+        return jsonify({'status': 'success', 'url': telegram_bot_simple.WEBHOOK_URL})
+    except Exception as e:
+        logger.error(f"Error setting Telegram webhook: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/admin/telegram_workers', methods=['GET'])
+@admin_api_required
+def telegram_workers():
+    """Show the Telegram bot worker pool, outbound message queue, chat activity writer, session store and live status messages."""
+    import telegram_bot_simple
+    import telegram_auth
+    import telegram_sessions
+    import bot_commands
+    return jsonify({
+        'workers': telegram_bot_simple.handler_pool.snapshot(),
+        'outbox': telegram_bot_simple.outbox.snapshot(),
+        'chat_writer': telegram_auth.chat_writer_stats(),
+        'sessions': telegram_sessions.store.stats(),
+        'live_status': bot_commands.live_status.stats(),
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/telegram_broadcast', methods=['GET'])
+@admin_api_required
+def telegram_broadcast():
+    """Show the schedule and last run of the Telegram signal broadcast."""
+    import telegram_bot_simple
+    import broadcast
+    broadcaster = telegram_bot_simple.broadcaster
+    return jsonify({
+        'enabled': broadcaster is not None,
+        'interval': broadcast.BROADCAST_INTERVAL,
+        'pairs': broadcast.BROADCAST_PAIRS,
+        'last_run': broadcaster.last_run if broadcaster else None,
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/telegram_admins/reload', methods=['POST'])
+@admin_api_required
+def reload_telegram_admins():
+    """Reload the Telegram admin users from TELEGRAM_ADMIN_USERS (the request body is not used)."""
+    import telegram_auth
+    count = telegram_auth.admins.reload()
+    logger.info(f"Telegram admin users reloaded by admin ({count} admins)")
+    return jsonify({'status': 'success', 'admins': count})
+
+@app.route('/api/admin/analysis_backup/import', methods=['POST'])
+@admin_api_required
+def import_analysis_backup():
+    """Replay analyses from the backup log into the database."""
+    try:
+        result = market_analysis.import_analysis_backup()
+        return jsonify(dict(result, status='success'))
+    except Exception as e:
+        logger.error(f"Error importing analysis backup: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,297 @@
+import time
+import logging
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+import correlation
+import indicator_kernels
+import levels
+import market_analysis
+
+# Benchmarks by name: name -> (description, function(args) -> list of result rows)
+BENCHMARKS = {}
+
+
+def benchmark(name, description):
+    """Register a benchmark function."""
+    def decorator(func):
+        BENCHMARKS[name] = (description, func)
+        return func
+    return decorator
+
+
+def measure(func, iterations, warmup=3):
+    """
+    Time `func` and trace its allocations.
+
+    Returns:
+        dict: Mean and best time per call (ms), and the mean peak memory
+            allocated during a call (KiB)
+    """
+    for _ in range(warmup):
+        func()
+
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Allocations are traced separately, tracing slows the calls down
+    traced = min(iterations, 20)
+    tracemalloc.start()
+    peak = 0
+    for _ in range(traced):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func()
+        peak += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        'mean_ms': round(1000 * sum(times) / len(times), 3),
+        'best_ms': round(1000 * min(times), 3),
+        'peak_alloc_kib': round(peak / traced / 1024, 1)
+    }
+
+
+def sample_frame(periods, seed=1):
+    """Simulated OHLCV data for EURUSD as a DataFrame."""
+    np.random.seed(seed)
+    return pd.DataFrame(market_analysis.get_historical_data('EURUSD', '1d', periods))
+
+
+def sample_closes(periods, seed=1):
+    """A random walk of closing prices (fast enough for millions of bars)."""
+    rng = np.random.default_rng(seed)
+    return 1.10 * np.cumprod(1 + np.clip(rng.normal(0, 0.01, periods), -0.03, 0.03))
+
+
+def sample_bars(periods, seed=1):
+    """Simulated high, low, close and volume arrays for millions of bars."""
+    rng = np.random.default_rng(seed)
+    close = sample_closes(periods, seed)
+    return {
+        'high': close * (1 + np.abs(rng.normal(0, 0.005, periods))),
+        'low': close * (1 - np.abs(rng.normal(0, 0.005, periods))),
+        'close': close,
+        'volume': rng.integers(1000, 10000, periods).astype(float)
+    }
+
+
+# Reference implementation of the analysis output path before it was made
+# lean (full feature columns, df.iloc[-1] rows and iterrows serialization)
+
+def _legacy_indicators(df):
+    df['sma_5'] = df['close'].rolling(window=5).mean()
+    df['sma_20'] = df['close'].rolling(window=20).mean()
+    delta = df['close'].diff()
+    gain = delta.where(delta > 0, 0).fillna(0)
+    loss = -delta.where(delta < 0, 0).fillna(0)
+    rs = gain.rolling(window=14).mean() / loss.rolling(window=14).mean()
+    df['rsi'] = 100 - (100 / (1 + rs))
+    df['ema_12'] = df['close'].ewm(span=12, adjust=False).mean()
+    df['ema_26'] = df['close'].ewm(span=26, adjust=False).mean()
+    df['macd'] = df['ema_12'] - df['ema_26']
+    df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
+    df['macd_hist'] = df['macd'] - df['macd_signal']
+    df['sma_20'] = df['close'].rolling(window=20).mean()
+    df['std_20'] = df['close'].rolling(window=20).std()
+    df['upper_band'] = df['sma_20'] + (df['std_20'] * 2)
+    df['lower_band'] = df['sma_20'] - (df['std_20'] * 2)
+    return df
+
+
+def _legacy_features(df):
+    df['price_change'] = df['close'].pct_change()
+    df['price_change_1d'] = df['close'].pct_change(periods=1)
+    df['price_change_5d'] = df['close'].pct_change(periods=5)
+    df['above_sma_20'] = (df['close'] > df['sma_20']).astype(int)
+    df['sma_cross'] = ((df['sma_5'] > df['sma_20']) &
+                       (df['sma_5'].shift(1) <= df['sma_20'].shift(1))).astype(int)
+    df['rsi_overbought'] = (df['rsi'] > 70).astype(int)
+    df['rsi_oversold'] = (df['rsi'] < 30).astype(int)
+    df['macd_cross_up'] = ((df['macd'] > df['macd_signal']) &
+                           (df['macd'].shift(1) <= df['macd_signal'].shift(1))).astype(int)
+    df['macd_cross_down'] = ((df['macd'] < df['macd_signal']) &
+                             (df['macd'].shift(1) >= df['macd_signal'].shift(1))).astype(int)
+    df['volatility'] = df['std_20'] / df['sma_20']
+    return df.dropna()
+
+
+def _legacy_output(frame):
+    df = _legacy_features(_legacy_indicators(frame.copy()))
+    latest = df.iloc[-1]
+    indicators = {name: round(latest[name], 5) for name in ('rsi', 'macd', 'macd_signal', 'sma_20',
+                                                            'upper_band', 'lower_band')}
+    indicators = {key: value.item() if hasattr(value, 'item') else value for key, value in indicators.items()}
+    historical = [{'date': row['date'], 'close': float(row['close'])} for _, row in df.tail(30).iterrows()]
+    return indicators, historical
+
+
+def _lean_output(frame):
+    df = market_analysis.prepare_features(market_analysis.calculate_indicators(frame.copy()))
+    market_analysis.latest_features(df)
+    latest = market_analysis.latest_values(df)
+    indicators = {name: round(latest[name], 5) for name in ('rsi', 'macd', 'macd_signal', 'sma_20',
+                                                           'upper_band', 'lower_band')}
+    return indicators, market_analysis._historical_points(df)
+
+
+@benchmark('analysis_output', "Indicators, features and serialization of analyze_market (legacy vs lean)")
+def bench_analysis_output(args):
+    frame = sample_frame(args.periods)
+    return [
+        dict(case='legacy', **measure(lambda: _legacy_output(frame), args.iterations)),
+        dict(case='lean', **measure(lambda: _lean_output(frame), args.iterations))
+    ]
+
+
+@benchmark('analyze_market', "Full analyze_market pipeline without AI or persistence")
+def bench_analyze_market(args):
+    return [dict(case='analyze_market', **measure(
+        lambda: market_analysis.analyze_market('EURUSD', use_ai=False, skip=('persist',)), args.iterations))]
+
+
+@benchmark('levels', "Support/resistance detection: vectorized over the history vs one incremental update")
+def bench_levels(args):
+    frame = sample_frame(args.periods)
+    high, low, close, volume = (frame[column].to_numpy() for column in ('high', 'low', 'close', 'volume'))
+    detector = levels.LevelDetector()
+    for bar in zip(high[:-1], low[:-1], close[:-1], volume[:-1]):
+        detector.update(*bar)
+
+    def update():
+        detector.update(high[-1], low[-1], close[-1], volume[-1])
+        detector.levels()
+
+    return [
+        dict(case='detect_levels', **measure(lambda: levels.detect_levels(high, low, close, volume), args.iterations)),
+        dict(case='incremental', **measure(update, args.iterations))
+    ]
+
+
+@benchmark('indicators', "Indicator kernels, each with its dependencies, and the analyze_market set together")
+def bench_indicators(args):
+    data = sample_bars(args.periods)
+    cases = [(name, [name]) for name in indicator_kernels.INDICATORS]
+    cases.append(('analysis_set', list(market_analysis.ANALYSIS_INDICATORS)))
+    rows = []
+    for case, names in cases:
+        result = measure(lambda: indicator_kernels.compute(data, names), args.iterations)
+        rows.append(dict(case=case, numba=indicator_kernels.NUMBA_ENABLED,
+                         mbars_per_s=round(args.periods / result['mean_ms'] / 1000, 2), **result))
+    return rows
+
+
+def _legacy_rsi(close):
+    # RSI as calculate_indicators computed it before the single-pass kernel
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).fillna(0)
+    loss = -delta.where(delta < 0, 0).fillna(0)
+    rs = gain.rolling(window=14).mean() / loss.rolling(window=14).mean()
+    return 100 - (100 / (1 + rs))
+
+
+@benchmark('rsi', "RSI: legacy pandas rolling vs the single-pass kernel and one incremental update")
+def bench_rsi(args):
+    closes = sample_closes(args.periods)
+    series = pd.Series(closes)
+    incremental = indicator_kernels.IncrementalRSI()
+    for close in closes[:-1]:
+        incremental.update(close)
+    rows = [
+        dict(case='legacy_pandas', **measure(lambda: _legacy_rsi(series), args.iterations)),
+        dict(case='kernel_simple', **measure(lambda: indicator_kernels.rsi(closes, smoothing='simple'), args.iterations)),
+        dict(case='kernel_wilder', **measure(lambda: indicator_kernels.rsi(closes), args.iterations)),
+        dict(case='incremental', **measure(lambda: incremental.update(closes[-1]), args.iterations))
+    ]
+    for row in rows:
+        row['numba'] = indicator_kernels.NUMBA_ENABLED
+    return rows
+
+
+# Oscillator columns compared in points; the other indicators relative to their value
+OSCILLATORS = ('rsi', 'adx', 'plus_di', 'minus_di', 'stoch_k', 'stoch_d')
+
+
+@benchmark('compact', "Analysis frame: float64 vs compact dtypes (frame memory, indicator time, float32 error)")
+def bench_compact(args):
+    np.random.seed(1)
+    history = market_analysis.get_historical_data('EURUSD', '1d', args.periods)
+    rows = []
+    frames = {}
+    for case, compact in (('float64', False), ('compact', True)):
+        frame = market_analysis.price_frame(history, compact)
+        frames[case] = market_analysis.calculate_indicators(frame.copy())
+        rows.append(dict(case=case, frame_kib=round(frames[case].memory_usage(deep=True).sum() / 1024, 1),
+                         **measure(lambda: market_analysis.calculate_indicators(frame.copy()), args.iterations)))
+
+    # Largest float32 error of the compact indicators against float64, in
+    # points for oscillators and relative to the price for the others
+    reference, compact = frames['float64'], frames['compact']
+    price = reference['close'].to_numpy()
+    errors = {}
+    for column in reference.columns:
+        if column in ('date', 'volume'):
+            continue
+        error = np.abs(compact[column].to_numpy(dtype=np.float64) - reference[column].to_numpy())
+        if column not in OSCILLATORS:
+            error = error / price
+        errors[column] = float(np.nanmax(error))
+    rows[0].update(max_rel_error=0.0, max_osc_error=0.0)
+    rows[1].update(max_rel_error=f"{max(v for k, v in errors.items() if k not in OSCILLATORS):.1e}",
+                   max_osc_error=f"{max(v for k, v in errors.items() if k in OSCILLATORS):.1e}")
+    return rows
+
+
+@benchmark('correlation', "Rolling correlation across 120 instruments: full recompute vs one incremental bar vs a cached read")
+def bench_correlation(args):
+    instruments, window = 120, correlation.CORRELATION_WINDOW
+    rng = np.random.default_rng(1)
+    closes = 100 * np.cumprod(1 + rng.normal(0, 0.01, (max(args.periods, window) + 2, instruments)), axis=0)
+    service = correlation.CorrelationService([f"PAIR{i}" for i in range(instruments)])
+    service.load(closes[:-1])
+    service.correlation(window)
+    returns = np.log(closes[1:] / closes[:-1])[-window:]
+
+    def update():
+        service.update(closes[-1])
+        service.correlation(window)
+
+    return [
+        dict(case='np_corrcoef', **measure(lambda: np.corrcoef(returns, rowvar=False), args.iterations)),
+        dict(case='incremental', **measure(update, args.iterations)),
+        dict(case='cached', **measure(lambda: service.correlation(window), args.iterations))
+    ]
+
+
+def print_rows(name, rows):
+    columns = list(rows[0])
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print(f"\n{name}")
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the market analysis code")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per case (default 200)")
+    parser.add_argument("--periods", type=int, default=100, help="Bars of price history (default 100)")
+    args = parser.parse_args()
+
+    # Keep the analysis log output out of the results
+    logging.disable(logging.INFO)
+
+    for name in args.names or list(BENCHMARKS):
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark '{name}'")
+        description, func = BENCHMARKS[name]
+        print_rows(f"{name}: {description}", func(args))
+
+
+if __name__ == "__main__":
+    main()
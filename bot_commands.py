@@ -0,0 +1,1101 @@
+import os
+import copy
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import market_analysis
+import trading_bot
+import telegram_auth
+import telegram_sessions
+from live_status import LiveBoard
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Get the web app URL from environment variables
+WEB_APP_URL = os.environ.get("WEB_APP_URL", "https://trading-bot.replit.app")
+
+# Blocking analysis and trading calls of the commands run on these threads
+TELEGRAM_IO_THREADS = int(os.environ.get("TELEGRAM_IO_THREADS", "16"))  # Blocking calls running at once
+
+VALID_PAIRS = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "XAUUSD", "BTCUSD", "ETHUSD"]
+DEFAULT_PAIR = "EURUSD"
+
+# /autotrade without pairs trades the user's default pair (UserSettings) or this watchlist
+AUTOTRADE_WATCHLIST = [pair.strip().upper() for pair in os.environ.get(
+    "AUTOTRADE_WATCHLIST", DEFAULT_PAIR).split(",") if pair.strip()]
+DEFAULT_AUTOTRADE_AMOUNT = 1000  # USD split across the watchlist, without settings or an amount
+
+WORKING = "⏳ Working…"
+BUSY = "⏳ The bot is busy with other requests. Please try again in a moment."
+ACCESS_RESTRICTED = (
+    "⚠️ Access Restricted: This trading bot is only available to authorized administrators. "
+    "Please contact the system administrator for access permissions."
+)
+
+# Callback data of inline buttons: "<version>:<action>[:<arg>...]". Bump
+# CALLBACK_VERSION when an action changes meaning; buttons of other versions
+# are answered with a fresh menu instead of being misread.
+CALLBACK_VERSION = 1
+MAX_CALLBACK_BYTES = 64  # Telegram's limit
+
+# Callback actions (short, so buttons can carry their arguments within the limit)
+PAIR, CURRENCIES, MENU, BUY, SELL, AUTO, POCKET_CALL, POCKET_PUT, STATUS, CLOSE, LIVE, STOP_LIVE = (
+    'p', 'c', 'm', 'b', 's', 'a', 'pc', 'pp', 'st', 'x', 'lv', 'ls')
+
+# Callback data of buttons sent before callback data was versioned
+LEGACY_CALLBACKS = {
+    'trade': MENU, 'back_to_menu': MENU, 'show_currencies': CURRENCIES,
+    'trade_buy': BUY, 'trade_sell': SELL, 'trade_auto': AUTO,
+    'trade_pocket_call': POCKET_CALL, 'trade_pocket_put': POCKET_PUT,
+    'trade_status': STATUS, 'close_trade': CLOSE
+}
+
+
+def encode_callback(action, *args):
+    """Encode a button action and its arguments as callback data."""
+    data = ':'.join([str(CALLBACK_VERSION), action] + [str(arg) for arg in args])
+    if len(data.encode()) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data longer than {MAX_CALLBACK_BYTES} bytes: {data}")
+    return data
+
+def decode_callback(data):
+    """
+    Decode callback data.
+
+    Returns:
+        tuple: (action, list of arguments); the action is None for buttons
+            of another version and unknown data
+    """
+    if data in LEGACY_CALLBACKS:
+        return LEGACY_CALLBACKS[data], []
+    if data.startswith("set_pair_"):
+        return PAIR, [data[len("set_pair_"):]]
+    version, _, rest = data.partition(':')
+    if version != str(CALLBACK_VERSION) or not rest:
+        return None, []
+    action, *args = rest.split(':')
+    return action, args
+
+
+class Button:
+    """An inline keyboard button: a callback button with `data` or a link with `url`."""
+
+    def __init__(self, text, data=None, url=None):
+        self.text = text
+        self.data = data
+        self.url = url
+
+
+class Transport:
+    """
+    How a command answers, implemented by each Telegram library adapter.
+
+    Keyboards are lists of rows of Buttons. The methods return the
+    adapter's handle of the sent message (a Message, or a Future of one
+    when the adapter queues sends) without waiting for Telegram unless the
+    adapter has to.
+    """
+
+    # The "working..." acknowledgement sent before a slow command started, if any
+    ack = None
+
+    async def reply(self, text, keyboard=None, parse_mode=None):
+        """Send a message to the chat."""
+        raise NotImplementedError
+
+    async def edit(self, text, keyboard=None, parse_mode=None):
+        """Edit the message whose button was pressed."""
+        raise NotImplementedError
+
+    async def respond(self, text, keyboard=None, parse_mode=None):
+        """Replace the acknowledgement (so progress messages are overwritten), or reply without one."""
+        raise NotImplementedError
+
+    async def answer(self, text=None):
+        """Answer the button press (with an optional notification)."""
+        raise NotImplementedError
+
+    async def edit_sent(self, message, text, keyboard=None, parse_mode=None):
+        """Edit a message sent earlier (the handle returned by reply or edit)."""
+        raise NotImplementedError
+
+
+class CommandContext:
+    """
+    A command, text message or button press, independent of the Telegram library.
+
+    Args:
+        transport (Transport): Sends the answers
+        update: The library's Update (effective_user, effective_chat)
+        user_data (dict): Per-user state kept by the library in this process
+            (conversation state goes in ctx.session)
+        args (list): Command arguments
+        text (str): Text of a plain message
+        data (str): Callback data of a button press
+    """
+
+    def __init__(self, transport, update, user_data, args=None, text=None, data=None):
+        self.transport = transport
+        self.update = update
+        self.user_data = user_data
+        self.args = list(args or ())
+        self.text = text
+        self.data = data
+        self.user = update.effective_user
+        self.chat_id = update.effective_chat.id if update.effective_chat else None
+        # Conversation state (see telegram_sessions), loaded for handlers with session=True
+        self.session = {}
+
+    def reply(self, text, keyboard=None, parse_mode=None):
+        return self.transport.reply(text, keyboard, parse_mode)
+
+    def edit(self, text, keyboard=None, parse_mode=None):
+        return self.transport.edit(text, keyboard, parse_mode)
+
+    def respond(self, text, keyboard=None, parse_mode=None):
+        return self.transport.respond(text, keyboard, parse_mode)
+
+    def answer(self, text=None):
+        return self.transport.answer(text)
+
+
+_io_executor = ThreadPoolExecutor(max_workers=TELEGRAM_IO_THREADS, thread_name_prefix='telegram-io')
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the I/O threads without holding up the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+
+
+class AsyncTrader:
+    """
+    Awaitable analysis and trading API for the commands.
+
+    The analysis, Groq and database calls behind it are blocking; they run
+    on the I/O threads (trading calls inside a Flask app context), so a
+    slow analysis does not hold up other chats.
+    """
+
+    def __init__(self, bot=None):
+        self.bot = bot or trading_bot.TradingBot()
+
+    @staticmethod
+    def _in_app_context(func):
+        from app import with_app_context
+        return with_app_context(func)
+
+    async def analyze(self, currency_pair, timeframe='1d'):
+        """Shared analysis of a pair (see market_analysis.shared_analysis); timeframe 'mtf' for all timeframes."""
+        return await run_blocking(market_analysis.shared_analysis, currency_pair, timeframe)
+
+    async def analyze_batch(self, currency_pairs, use_ai=False):
+        """
+        Shared analyses of several pairs, run concurrently.
+
+        Returns:
+            dict: Pair to its analysis, or to the exception it failed with
+        """
+        analyses = await asyncio.gather(*(run_blocking(market_analysis.shared_analysis, pair, '1d', use_ai)
+                                          for pair in currency_pairs), return_exceptions=True)
+        return dict(zip(currency_pairs, analyses))
+
+    async def saved_analysis_id(self, currency_pair, timeframe='1d'):
+        """Database id of the pair's latest saved analysis (see market_analysis.saved_analysis_id)."""
+        return await run_blocking(market_analysis.saved_analysis_id, currency_pair, timeframe)
+
+    async def evaluate_trade(self, analysis, currency_pair, risk_level="medium"):
+        import groq_ai
+        return await run_blocking(groq_ai.evaluate_trade_opportunity, analysis, currency_pair, risk_level)
+
+    async def execute_trade(self, currency_pair, trade_type, amount, **kwargs):
+        return await run_blocking(self._in_app_context(self.bot.execute_trade), currency_pair, trade_type, amount,
+                                  **kwargs)
+
+    async def execute_trades(self, orders, **kwargs):
+        return await run_blocking(self._in_app_context(self.bot.execute_trades), orders, **kwargs)
+
+    async def size_position(self, currency_pair, trade_type, amount, leverage=1):
+        return await run_blocking(self._in_app_context(self.bot.size_position), currency_pair, trade_type, amount,
+                                  leverage=leverage)
+
+    async def close_trade(self, trade_id):
+        return await run_blocking(self._in_app_context(self.bot.close_trade), trade_id)
+
+    async def open_trades(self):
+        return await run_blocking(self._in_app_context(self.bot.get_open_trades))
+
+    async def prices(self, currency_pairs):
+        """Current prices of the pairs, in one snapshot read."""
+        return await run_blocking(self.bot.price_snapshot, currency_pairs)
+
+    async def trade_history(self):
+        return await run_blocking(self._in_app_context(self.bot.get_trade_history))
+
+    async def user_settings(self, telegram_id):
+        """Settings of the User linked to a Telegram account, as a dict (None if there are none)."""
+        def load():
+            from models import User, UserSettings
+            user = User.query.filter_by(telegram_id=str(telegram_id)).first()
+            settings = UserSettings.query.filter_by(user_id=user.id).first() if user else None
+            if settings is None:
+                return None
+            return {
+                'currency_pair': settings.default_currency_pair,
+                'amount': settings.default_trade_amount,
+                'risk_level': settings.risk_level
+            }
+        return await run_blocking(self._in_app_context(load))
+
+
+trader = AsyncTrader()
+
+
+class Handler:
+    """
+    A command (or the button or text handler) as registered by the adapters.
+
+    Args:
+        name (str): Command name (without the slash)
+        func: async func(ctx)
+        admin (bool): Only for admins (see authorize)
+        ack (str): Sent at once before a slow command runs; the command's
+            ctx.respond() calls replace it
+        session (bool): Load the conversation state into ctx.session
+    """
+
+    def __init__(self, name, func, admin=True, ack=None, session=False):
+        self.name = name
+        self.func = func
+        self.admin = admin
+        self.ack = ack
+        self.session = session
+
+
+def authorize(ctx):
+    """
+    Whether the user may use admin commands.
+
+    The admin set is checked on every update, so reloads apply
+    immediately. Admin activity is saved in the background.
+    """
+    user = ctx.user
+    user_id = str(user.id) if user and user.id else "unknown"
+    username = user.username if user and user.username else "unknown"
+
+    if telegram_auth.is_admin(user):
+        if not ctx.user_data.get('is_admin', False):
+            logger.info(f"Admin access granted to user {user_id} ({username})")
+        ctx.user_data['is_admin'] = True
+        # Registration and last activity are saved in the background
+        telegram_auth.record_activity(ctx.update)
+        return True
+
+    ctx.user_data['is_admin'] = False
+    # Log unauthorized access attempt
+    logger.warning(f"Unauthorized access attempt by user {user_id} ({username})")
+    return False
+
+async def run(handler, ctx):
+    """
+    Run a handler (after the admin check).
+    
+    With handler.session the conversation state is loaded into ctx.session
+    first and saved afterwards if the handler changed it, so a conversation
+    can continue in another bot process or after a restart.
+    """
+    if not handler.session:
+        await handler.func(ctx)
+        return
+    store = telegram_sessions.store
+    key = telegram_sessions.session_key(ctx.chat_id, ctx.user.id if ctx.user else None)
+    state, version = await run_blocking(store.load, key)
+    ctx.session = copy.deepcopy(state)
+    try:
+        await handler.func(ctx)
+    finally:
+        if ctx.session != state:
+            await run_blocking(store.save, key, ctx.session, version)
+
+async def handle(handler, ctx):
+    """Run a handler for an update: check admin access, acknowledge slow commands, run it."""
+    if handler.admin and not authorize(ctx):
+        await ctx.reply(ACCESS_RESTRICTED)
+        return
+    try:
+        if handler.ack and ctx.data is None:
+            ctx.transport.ack = await ctx.reply(handler.ack)
+        await run(handler, ctx)
+    except Exception as e:
+        logger.error(f"Error in Telegram handler {handler.name}: {str(e)}")
+
+# Keyboards
+def trade_actions(currency_pair):
+    """Trade buttons; each carries its pair, so pressing it needs no stored selection."""
+    return [
+        [Button("Buy", encode_callback(BUY, currency_pair)), Button("Sell", encode_callback(SELL, currency_pair))],
+        [Button("Call (Pocket)", encode_callback(POCKET_CALL, currency_pair)),
+         Button("Put (Pocket)", encode_callback(POCKET_PUT, currency_pair))],
+        [Button("Auto Trade (AI)", encode_callback(AUTO, currency_pair))],
+    ]
+
+CURRENCY_OPTIONS = [
+    [Button("EUR/USD", encode_callback(PAIR, "EURUSD")), Button("GBP/USD", encode_callback(PAIR, "GBPUSD"))],
+    [Button("USD/JPY", encode_callback(PAIR, "USDJPY")), Button("AUD/USD", encode_callback(PAIR, "AUDUSD"))],
+    [Button("USD/CAD", encode_callback(PAIR, "USDCAD")), Button("Gold", encode_callback(PAIR, "XAUUSD"))],
+    [Button("Bitcoin", encode_callback(PAIR, "BTCUSD")), Button("Ethereum", encode_callback(PAIR, "ETHUSD"))],
+]
+
+BACK_TO_MENU = [Button("« Back to Menu", encode_callback(MENU))]
+
+async def start(ctx):
+    """Send a message when the command /start is issued."""
+    user = ctx.user
+    is_admin = telegram_auth.is_admin(user)
+
+    # Basic welcome message for all users
+    welcome_message = (
+        f"👋 Hello {user.first_name if user else 'trader'}!\n\n"
+        f"Welcome to the AI Trading Bot. I can help you analyze forex markets, cryptocurrencies, and commodities, and execute trades with AI-powered recommendations.\n\n"
+        f"I support multiple trading pairs including:\n"
+        f"• Forex: EUR/USD, GBP/USD, USD/JPY, AUD/USD, USD/CAD\n"
+        f"• Commodities: Gold (XAU/USD)\n"
+        f"• Crypto: Bitcoin (BTC/USD), Ethereum (ETH/USD)\n\n"
+        f"Here's what I can do:\n"
+        f"• /analyze [pair] - Analyze a trading pair (e.g. /analyze XAUUSD, or /analyze XAUUSD mtf for 1h/4h/1d)\n"
+        f"• /trade - Open the trading menu with pair selection\n"
+        f"• /status - Check your current trades (/status live keeps the P/L updating)\n"
+        f"• /help - Show complete help message\n\n"
+    )
+
+    # For admin users, add link to web interface
+    if is_admin:
+        keyboard = [
+            [Button("🌐 Open Web Dashboard", url=WEB_APP_URL)],
+            [Button("💼 Trade Now", encode_callback(MENU))]
+        ]
+
+        # Add admin-specific message
+        welcome_message += (
+            f"*Admin Features:*\n"
+            f"• Access to the web dashboard for advanced trading\n"
+            f"• Pocket options trading with expiry times\n"
+            f"• Risk analysis with AI-powered insights\n\n"
+            f"Click the button below to access the web dashboard!"
+        )
+
+        await ctx.reply(welcome_message, keyboard, parse_mode='Markdown')
+    else:
+        # Regular welcome message with simple start button
+        welcome_message += f"Let's get started! Use /trade to begin."
+        await ctx.reply(welcome_message, [[Button("🚀 Get Started", encode_callback(MENU))]])
+
+async def help_command(ctx):
+    """Send a message when the command /help is issued."""
+    help_text = (
+        "Here are the commands you can use:\n\n"
+        "/analyze [currency_pair] [mtf] - Analyze a currency pair (e.g., /analyze XAUUSD); add mtf for 1h, 4h and 1d in one analysis\n"
+        "/trade - Show the trading options with currency selection\n"
+        "/status - Check your current trades (/status live keeps the P/L updating)\n"
+        "/history - See your trading history\n"
+        "/buy [amount] - Buy a currency pair (e.g., /buy 1000)\n"
+        "/sell [amount] - Sell a currency pair (e.g., /sell 1000)\n"
+        "/autotrade [amount] [pairs] - Let AI trade a watchlist, amount split between the pairs (e.g., /autotrade 1000 EURUSD GBPUSD XAUUSD)\n"
+        "/pocket_call [amount] [expiry] - Place a pocket option call (e.g., /pocket_call 100 5)\n"
+        "/pocket_put [amount] [expiry] - Place a pocket option put (e.g., /pocket_put 100 5)\n"
+        "/close [trade_id] - Close a specific trade (e.g., /close 1)\n"
+        "/help - Show this help message\n\n"
+        "Supported Currency Pairs:\n"
+        "• EURUSD - Euro/US Dollar\n"
+        "• GBPUSD - British Pound/US Dollar\n"
+        "• USDJPY - US Dollar/Japanese Yen\n"
+        "• AUDUSD - Australian Dollar/US Dollar\n"
+        "• USDCAD - US Dollar/Canadian Dollar\n"
+        "• XAUUSD - Gold/US Dollar\n"
+        "• BTCUSD - Bitcoin/US Dollar\n"
+        "• ETHUSD - Ethereum/US Dollar"
+    )
+    await ctx.reply(help_text)
+
+async def analyze_command(ctx):
+    """Analyze a currency pair."""
+    args = ctx.args
+    currency_pair = DEFAULT_PAIR
+
+    if args:
+        input_pair = args[0].upper()
+        if input_pair in VALID_PAIRS:
+            currency_pair = input_pair
+        else:
+            await ctx.respond(
+                f"❌ Invalid currency pair: {input_pair}\n"
+                f"Valid options are: {', '.join(VALID_PAIRS)}"
+            )
+            return
+
+    # "/analyze EURUSD mtf" analyzes 1h, 4h and 1d together
+    if len(args) > 1 and args[1].lower() in ('mtf', 'all'):
+        await ctx.respond(f"📊 Analyzing {currency_pair} on all timeframes...")
+        try:
+            analysis = await trader.analyze(currency_pair, 'mtf')
+            await ctx.respond(format_mtf_result(analysis))
+        except Exception as e:
+            logger.error(f"Error in multi-timeframe analysis: {str(e)}")
+            await ctx.respond(f"❌ Error analyzing market: {str(e)}")
+        return
+
+    await ctx.respond(f"📊 Analyzing {currency_pair}...")
+
+    try:
+        # Get market analysis, shared with concurrent and recent requests for the pair;
+        # it already includes the Groq AI analysis when AI is available
+        analysis = await trader.analyze(currency_pair)
+        ai_analysis = analysis.get('ai_analysis')
+
+        # Use AI's recommendation if available
+        if ai_analysis and not ai_analysis.get('ai_error', False):
+            # Format analysis result with AI insights
+            message = format_analysis_result(analysis, ai_analysis)
+        else:
+            # Use standard analysis if AI fails
+            message = format_analysis_result(analysis)
+        await ctx.respond(message)
+
+    except Exception as e:
+        logger.error(f"Error in market analysis: {str(e)}")
+        await ctx.respond(f"❌ Error analyzing market: {str(e)}")
+
+def format_mtf_result(analysis):
+    """Format a multi-timeframe analysis result."""
+    confluence = analysis.get('confluence', {})
+    trend = analysis.get('trend', 'neutral')
+    trend_emoji = "📈" if trend == 'bullish' else "📉" if trend == 'bearish' else "📊"
+
+    message = (
+        f"{trend_emoji} Multi-timeframe analysis for {analysis.get('currency_pair')}\n\n"
+        f"Current Price: {analysis.get('current_price', 'N/A')}\n"
+        f"Confluence Score: {confluence.get('score', 'N/A')} (-100 bearish to +100 bullish)"
+        f"{' - timeframes aligned' if confluence.get('aligned') else ''}\n"
+        f"Recommendation: {analysis.get('recommendation', 'hold').capitalize()} ({analysis.get('confidence', 'N/A')}%)\n\n"
+    )
+    for timeframe, result in analysis.get('timeframes', {}).items():
+        message += (
+            f"• {timeframe}: {result['trend'].capitalize()}, {result['recommendation'].capitalize()} "
+            f"({result['confidence']}%), RSI {result['indicators'].get('rsi', 'N/A')}\n"
+        )
+    message += (
+        f"\nSupport: {analysis.get('support', 'N/A')}\n"
+        f"Resistance: {analysis.get('resistance', 'N/A')}\n"
+    )
+
+    ai_analysis = analysis.get('ai_analysis')
+    if ai_analysis and not ai_analysis.get('ai_error', False):
+        message += (
+            f"\nAI Insights:\n"
+            f"• Timeframe alignment: {ai_analysis.get('timeframe_alignment', 'N/A')}\n"
+            f"\n{ai_analysis.get('reasoning', '')}\n"
+        )
+    return message
+
+def format_analysis_result(analysis, ai_analysis=None):
+    """Format the analysis result in a nice message."""
+    # Get data from analysis
+    currency_pair = analysis.get('currency_pair', 'EURUSD')
+    current_price = analysis.get('current_price', 0)
+    trend = analysis.get('trend', 'neutral')
+    recommendation = analysis.get('recommendation', 'hold')
+
+    # Get indicators
+    indicators = analysis.get('indicators', {})
+    rsi = indicators.get('rsi', 'N/A')
+
+    # Set emoji based on trend
+    trend_emoji = "📈" if trend == 'bullish' else "📉" if trend == 'bearish' else "📊"
+
+    # Create message
+    message = (
+        f"{trend_emoji} *Analysis for {currency_pair}*\n\n"
+        f"*Current Price:* {current_price}\n"
+        f"*Trend:* {trend.capitalize()}\n"
+        f"*Recommendation:* {recommendation.capitalize()}\n\n"
+    )
+
+    # Add support and resistance
+    message += (
+        f"*Support:* {analysis.get('support', 'N/A')}\n"
+        f"*Resistance:* {analysis.get('resistance', 'N/A')}\n\n"
+    )
+
+    # Add key indicators
+    message += (
+        f"*Key Indicators:*\n"
+        f"• RSI: {rsi}\n"
+        f"• MACD: {indicators.get('macd', 'N/A')}\n"
+        f"• MACD Signal: {indicators.get('macd_signal', 'N/A')}\n"
+    )
+
+    # Add AI insights if available
+    if ai_analysis:
+        message += (
+            f"\n*AI Insights:*\n"
+            f"• Confidence: {ai_analysis.get('confidence', 'N/A')}%\n"
+            f"• Risk Assessment: {ai_analysis.get('risk_assessment', 'N/A')}\n"
+            f"• Timeframe: {ai_analysis.get('timeframe', 'short_term').replace('_', ' ').capitalize()}\n"
+            f"\n{ai_analysis.get('reasoning', '')}\n"
+        )
+
+    return message
+
+def format_open_trades(open_trades, prices=None):
+    """Format the open trades for /status and the status button, with their P/L at `prices` (pair to price)."""
+    prices = prices or {}
+    message = "*Your Open Trades:*\n\n"
+    total = 0.0
+
+    for trade in open_trades:
+        price = prices.get(trade.get('currency_pair'))
+        if price is None:
+            profit_loss = "Calculating..."
+        else:
+            pl = trading_bot.calculate_profit_loss(trade.get('type', trade.get('trade_type')), trade.get('price', 0),
+                                                   price, trade.get('amount', 0), trade.get('leverage') or 1)
+            pl = round(pl, 2)
+            total += pl
+            emoji = "🟢" if pl > 0 else "🔴" if pl < 0 else "⚪"
+            profit_loss = f"{emoji} ${pl:+.2f} (at {price})"
+        message += (
+            f"*Trade #{trade.get('id', 0)}*\n"
+            f"• Pair: {trade.get('currency_pair', 'UNKNOWN')}\n"
+            f"• Type: {trade.get('type', trade.get('trade_type', 'UNKNOWN')).upper()}\n"
+            f"• Amount: ${trade.get('amount', 0)}\n"
+            f"• Entry: {trade.get('price', 0)}\n"
+            f"• Current P/L: {profit_loss}\n\n"
+        )
+    if prices:
+        message += f"*Total P/L: ${total:+.2f}*\n"
+    return message
+
+async def open_positions():
+    """The open trades with the current prices of their pairs (one price snapshot for all pairs)."""
+    open_trades = await trader.open_trades()
+    prices = await trader.prices({trade['currency_pair'] for trade in open_trades}) if open_trades else {}
+    return open_trades, prices
+
+def render_status(state, live=False):
+    """Text and keyboard of the status message for open_positions() state; `live` while it is kept updated."""
+    open_trades, prices = state
+    if open_trades:
+        text = format_open_trades(open_trades, prices)
+    else:
+        text = "You don't have any open trades.\n"
+    if live:
+        text += f"\n🔴 Live, updated every {live_status.interval:g}s"
+        keyboard = [[Button("Close a Trade", encode_callback(CLOSE))],
+                    [Button("⏹ Stop Live Updates", encode_callback(STOP_LIVE))]]
+    else:
+        keyboard = [[Button("Close a Trade", encode_callback(CLOSE))],
+                    [Button("🔴 Live Updates", encode_callback(LIVE))]]
+    return text, keyboard + [BACK_TO_MENU]
+
+# Status messages kept updated with the current P/L (/status live)
+live_status = LiveBoard('status', open_positions, render_status)
+
+async def _show_status(ctx, send, live=False):
+    """Send (ctx.reply) or edit (ctx.edit) the status message, and keep it updated if `live`."""
+    if live and not live_status.has_room(ctx.chat_id):
+        live = False
+        await ctx.reply("Too many live status messages right now, here is the current status.")
+    state = await open_positions()
+    text, keyboard = render_status(state, live)
+    message = await send(text, keyboard)
+    if live:
+        await live_status.watch(ctx.chat_id, ctx.transport, message, text, state)
+
+async def trade_command(ctx):
+    """Show trading menu for the selected currency pair."""
+    currency_pair = ctx.session.get('pair', DEFAULT_PAIR)
+    keyboard = trade_actions(currency_pair) + [
+        [Button("Check Status", encode_callback(STATUS))],
+        [Button("Select Currency Pair 💱", encode_callback(CURRENCIES))]
+    ]
+    await ctx.reply(f"🤖 Trading Options ({currency_pair}):", keyboard)
+
+async def status_command(ctx):
+    """Show current trade status; /status live keeps the message updated."""
+    try:
+        live = bool(ctx.args) and ctx.args[0].lower() == 'live'
+        await _show_status(ctx, ctx.reply, live)
+
+    except Exception as e:
+        logger.error(f"Error getting trade status: {str(e)}")
+        await ctx.reply(f"❌ Error getting trade status: {str(e)}")
+
+async def history_command(ctx):
+    """Show trade history."""
+    try:
+        trade_history = await trader.trade_history()
+
+        if not trade_history:
+            await ctx.reply("You don't have any trade history yet.")
+            return
+
+        message = "*Your Trade History:*\n\n"
+
+        for trade in trade_history:
+            profit_loss = trade.get('profit_loss') or 0
+            emoji = "🟢" if profit_loss > 0 else "🔴" if profit_loss < 0 else "⚪"
+            status_emoji = "✅" if trade.get('status') == 'closed' else "⏳"
+
+            message += (
+                f"*Trade #{trade.get('id', 0)}*\n"
+                f"Pair: {trade.get('currency_pair', 'UNKNOWN')}\n"
+                f"Type: {trade.get('type', trade.get('trade_type', 'UNKNOWN')).upper()}\n"
+                f"Amount: ${trade.get('amount', 0)}\n"
+                f"Price: {trade.get('price', 0)}\n"
+                f"Status: {status_emoji} {str(trade.get('status', 'unknown')).capitalize()}\n"
+            )
+
+            if trade.get('status') == 'closed':
+                message += f"P/L: {emoji} ${profit_loss:.2f}\n"
+
+            message += "\n"
+
+        await ctx.reply(message, parse_mode='Markdown')
+
+    except Exception as e:
+        logger.error(f"Error getting trade history: {str(e)}")
+        await ctx.reply(f"❌ Error getting trade history: {str(e)}")
+
+async def _execute_trade(ctx, currency_pair, trade_type, amount):
+    """Execute a buy or sell trade and report the result."""
+    try:
+        result = await trader.execute_trade(currency_pair, trade_type, amount)
+
+        if result and result.get('status') == 'success':
+            message = (
+                f"✅ Trade executed successfully!\n\n"
+                f"*{trade_type.capitalize()} {currency_pair}*\n"
+                f"• Amount: ${amount}\n"
+                f"• Price: {result.get('price', 0)}\n"
+                f"• Trade ID: {result.get('trade_id', 0)}\n\n"
+                f"You can check your trade status with /status"
+            )
+            await ctx.reply(message)
+        else:
+            await ctx.reply(f"❌ Trade failed: {result.get('message', 'Unknown error')}")
+
+    except Exception as e:
+        logger.error(f"Error executing {trade_type} trade: {str(e)}")
+        await ctx.reply(f"❌ Error executing trade: {str(e)}")
+
+async def _trade_command(ctx, trade_type):
+    amount = 1000  # Default amount
+
+    if ctx.args:
+        try:
+            amount = float(ctx.args[0])
+        except ValueError:
+            await ctx.reply(f"❌ Invalid amount. Please provide a number. Example: /{trade_type} 1000")
+            return
+
+    await _execute_trade(ctx, DEFAULT_PAIR, trade_type, amount)
+
+async def buy_command(ctx):
+    """Execute a buy trade."""
+    await _trade_command(ctx, 'buy')
+
+async def sell_command(ctx):
+    """Execute a sell trade."""
+    await _trade_command(ctx, 'sell')
+
+def _plan_number(value, default, cast):
+    """A number from an AI trade plan, which may come as a string like '10%'."""
+    if isinstance(value, str):
+        try:
+            return cast(value.strip().strip('%'))
+        except ValueError:
+            return default
+    return value if value is not None else default
+
+def _ai_budget():
+    """How many AI trade evaluations can start now (0 without a Groq API key)."""
+    if not os.environ.get("GROQ_API_KEY"):
+        return 0
+    try:
+        import groq_ai
+        return groq_ai.rate_budget()
+    except ImportError:
+        logger.warning("Groq AI module not found, using standard analysis")
+        return 0
+
+def _watchlist_decision(currency_pair, analysis, trade_plan, amount):
+    """
+    What to do with a pair of an auto-traded watchlist.
+
+    The AI trade plan decides if there is one; otherwise (no budget left,
+    or the AI failed) the technical analysis does, as in
+    TradingBot.auto_trade.
+
+    Returns:
+        dict: pair, source ('AI' or 'technical'), reason, and the order to
+            execute if any, without its analysis_id (or error if the pair
+            could not be analyzed)
+    """
+    if isinstance(analysis, Exception):
+        return {'pair': currency_pair, 'error': f"Analysis failed: {str(analysis)}"}
+    if isinstance(trade_plan, Exception):
+        logger.error(f"Error using Groq AI for {currency_pair}: {str(trade_plan)}")
+        trade_plan = None
+
+    if trade_plan and not trade_plan.get('ai_error', False):
+        reasoning = trade_plan.get('reasoning') or 'No reasoning provided'
+        trade_type = trade_plan.get('trade_type', analysis.get('recommendation', 'hold'))
+        if not trade_plan.get('execute_trade', False) or trade_type not in ['buy', 'sell']:
+            return {'pair': currency_pair, 'source': 'AI', 'reason': reasoning}
+
+        # Use the AI position size and leverage
+        position_percentage = _plan_number(trade_plan.get('position_size_percentage'), 10, float)
+        leverage = _plan_number(trade_plan.get('leverage'), 1, int)
+        order = {'currency_pair': currency_pair, 'trade_type': trade_type,
+                 'amount': round(amount * position_percentage / 100, 2), 'leverage': leverage}
+        return {'pair': currency_pair, 'source': 'AI', 'reason': reasoning, 'order': order}
+
+    recommendation = analysis.get('recommendation', 'hold')
+    confidence = analysis.get('confidence', 0)
+    if recommendation not in ['buy', 'sell']:
+        return {'pair': currency_pair, 'source': 'technical', 'reason': f"Recommendation: {recommendation} ({confidence}%)"}
+    if confidence < trading_bot.AUTO_TRADE_MIN_CONFIDENCE:
+        return {'pair': currency_pair, 'source': 'technical', 'reason': f"Confidence too low ({confidence}%)"}
+    order = {'currency_pair': currency_pair, 'trade_type': recommendation, 'amount': round(amount, 2),
+             'leverage': 1}
+    return {'pair': currency_pair, 'source': 'technical', 'reason': f"{recommendation} ({confidence}%)",
+            'order': order}
+
+def _short(text, limit=150):
+    text = ' '.join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def format_auto_trade_summary(decisions, results, amount_per_pair):
+    """One message summarizing an auto-traded watchlist."""
+    traded = sum(1 for result in results.values() if result.get('status') == 'success')
+    lines = [f"🤖 Auto-trade: {traded} of {len(decisions)} pairs traded (${amount_per_pair:.2f} per pair)", ""]
+    for decision in decisions:
+        pair = decision['pair']
+        if 'error' in decision:
+            lines.append(f"❌ {pair}: {_short(decision['error'])}")
+            continue
+        result = results.get(pair)
+        if result is None:
+            lines.append(f"⏸ {pair}: hold ({decision['source']}) - {_short(decision['reason'])}")
+        elif result.get('status') == 'success':
+            lines.append(
+                f"✅ {result['type'].upper()} {pair} ${result['amount']:.2f} @ {result['price']}, "
+                f"{result['leverage']}x ({decision['source']}) - Trade #{result['trade_id']}"
+            )
+            lines.append(f"   {_short(decision['reason'])}")
+        else:
+            lines.append(f"❌ {pair}: trade failed - {_short(result.get('message', 'Unknown error'))}")
+    lines += ["", "You can check your trade status with /status"]
+    return "\n".join(lines)
+
+async def _auto_trade(ctx, currency_pairs, amount, risk_level="medium"):
+    """
+    Auto-trade a watchlist, with `amount` split evenly between its pairs.
+
+    The pairs are analyzed in one batch (technical analyses, shared with
+    other callers). The strongest signals are then evaluated by the AI
+    concurrently, as many as the Groq rate budget allows right now, and the
+    other pairs are decided on their technical analysis. The resulting
+    orders are executed together and answered with one summary.
+    """
+    try:
+        amount_per_pair = amount / len(currency_pairs)
+        analyses = await trader.analyze_batch(currency_pairs)
+
+        # Spend the AI budget on the pairs with the strongest technical signal
+        analyzed = [pair for pair in currency_pairs if not isinstance(analyses[pair], Exception)]
+        analyzed.sort(key=lambda pair: (analyses[pair].get('recommendation') in ('buy', 'sell'),
+                                        analyses[pair].get('confidence', 0)), reverse=True)
+        evaluated = analyzed[:_ai_budget()]
+        trade_plans = await asyncio.gather(*(trader.evaluate_trade(analyses[pair], pair, risk_level)
+                                             for pair in evaluated), return_exceptions=True)
+        trade_plans = dict(zip(evaluated, trade_plans))
+
+        decisions = [_watchlist_decision(pair, analyses[pair], trade_plans.get(pair), amount_per_pair)
+                     for pair in currency_pairs]
+        orders = [decision['order'] for decision in decisions if decision.get('order')]
+        # Link the trades to the saved analyses, as TradingBot.auto_trade does
+        analysis_ids = await asyncio.gather(*(trader.saved_analysis_id(order['currency_pair'])
+                                              for order in orders))
+        for order, analysis_id in zip(orders, analysis_ids):
+            order['analysis_id'] = analysis_id
+        results = await trader.execute_trades(orders) if orders else []
+        results = {order['currency_pair']: result for order, result in zip(orders, results)}
+
+        await ctx.respond(format_auto_trade_summary(decisions, results, amount_per_pair))
+
+    except Exception as e:
+        logger.error(f"Error executing auto-trade: {str(e)}")
+        await ctx.respond(f"❌ Error executing auto-trade: {str(e)}")
+
+def _watchlist_args(args):
+    """
+    The amount and pairs of /autotrade arguments like "500 EURUSD,GBPUSD XAUUSD".
+
+    Returns:
+        tuple: (amount or None, list of pairs)
+
+    Raises:
+        ValueError: For an argument that is neither a pair nor the amount
+    """
+    amount = None
+    currency_pairs = []
+    for arg in args:
+        for token in arg.upper().split(','):
+            token = token.strip()
+            if not token:
+                continue
+            if token in VALID_PAIRS:
+                if token not in currency_pairs:
+                    currency_pairs.append(token)
+                continue
+            try:
+                value = float(token)
+            except ValueError:
+                raise ValueError(token)
+            if amount is not None or value <= 0:
+                raise ValueError(token)
+            amount = value
+    return amount, currency_pairs
+
+async def autotrade_command(ctx):
+    """Auto-trade a watchlist: the pairs given, the user's default pair, or AUTOTRADE_WATCHLIST."""
+    try:
+        amount, currency_pairs = _watchlist_args(ctx.args)
+    except ValueError as e:
+        await ctx.respond(f"❌ Invalid pair or amount: {e}. Example: /autotrade 1000 EURUSD GBPUSD")
+        return
+
+    settings = None
+    if ctx.user:
+        try:
+            settings = await trader.user_settings(ctx.user.id)
+        except Exception as e:
+            logger.error(f"Error loading user settings: {str(e)}")
+
+    if not currency_pairs:
+        if settings and settings.get('currency_pair') in VALID_PAIRS:
+            currency_pairs = [settings['currency_pair']]
+        else:
+            currency_pairs = AUTOTRADE_WATCHLIST
+    amount = amount or (settings or {}).get('amount') or DEFAULT_AUTOTRADE_AMOUNT
+    risk_level = (settings or {}).get('risk_level') or "medium"
+
+    await _auto_trade(ctx, currency_pairs, amount, risk_level)
+
+async def _close_trade(ctx, trade_id):
+    """Close a trade and report the result."""
+    try:
+        result = await trader.close_trade(trade_id)
+
+        if result and result.get('status') == 'success':
+            message = (
+                f"✅ Trade #{trade_id} closed successfully!\n\n"
+                f"• Close Price: {result.get('close_price', 0)}\n"
+                f"• Profit/Loss: ${result.get('profit_loss', 0):.2f}\n"
+            )
+            await ctx.reply(message)
+        else:
+            await ctx.reply(f"❌ Failed to close trade: {result.get('message', 'Unknown error')}")
+
+    except Exception as e:
+        logger.error(f"Error closing trade: {str(e)}")
+        await ctx.reply(f"❌ Error closing trade: {str(e)}")
+
+async def close_command(ctx):
+    """Close a trade by ID."""
+    if not ctx.args:
+        await ctx.reply("❌ Please provide a trade ID to close. Example: /close 1")
+        return
+
+    try:
+        trade_id = int(ctx.args[0])
+    except ValueError:
+        await ctx.reply("❌ Invalid trade ID. Please provide a number. Example: /close 1")
+        return
+
+    await _close_trade(ctx, trade_id)
+
+async def _pocket_option(ctx, option_type):
+    """Execute a pocket option (binary option) CALL or PUT."""
+    amount = 100  # Default amount
+    expiry_minutes = 5  # Default expiry time in minutes
+
+    if not ctx.args:
+        await ctx.reply(f"❌ Please provide amount and expiry time. Example: /pocket_{option_type} 100 5")
+        return
+
+    try:
+        amount = float(ctx.args[0])
+        if len(ctx.args) > 1:
+            expiry_minutes = int(ctx.args[1])
+    except ValueError:
+        await ctx.reply(f"❌ Invalid values. Please provide numbers. Example: /pocket_{option_type} 100 5")
+        return
+
+    currency_pair = DEFAULT_PAIR
+
+    try:
+        # Execute the pocket option trade
+        result = await trader.execute_trade(
+            currency_pair,
+            option_type,
+            amount,
+            source='telegram',
+            expiry_minutes=expiry_minutes,
+            pocket_option=True
+        )
+
+        if result and result.get('status') == 'success':
+            # Calculate expiry time for display
+            expiry_time = datetime.utcnow() + timedelta(minutes=expiry_minutes)
+
+            message = (
+                f"✅ Pocket Option executed successfully!\n\n"
+                f"*{option_type.upper()} {currency_pair}*\n"
+                f"• Amount: ${amount}\n"
+                f"• Strike Price: {result.get('price', 0)}\n"
+                f"• Trade ID: {result.get('trade_id', 0)}\n"
+                f"• Expires in: {expiry_minutes} minutes\n"
+                f"• Expiry time: {expiry_time.strftime('%H:%M:%S UTC')}\n\n"
+                f"You can check your option status with /status"
+            )
+            await ctx.reply(message, parse_mode='Markdown')
+        else:
+            await ctx.reply(f"❌ Trade failed: {result.get('message', 'Unknown error')}")
+
+    except Exception as e:
+        logger.error(f"Error executing pocket {option_type} option: {str(e)}")
+        await ctx.reply(f"❌ Error executing pocket option: {str(e)}")
+
+async def pocket_call_command(ctx):
+    """Execute a pocket option CALL trade (binary option)."""
+    await _pocket_option(ctx, 'call')
+
+async def pocket_put_command(ctx):
+    """Execute a pocket option PUT trade (binary option)."""
+    await _pocket_option(ctx, 'put')
+
+async def button_handler(ctx):
+    """Handle callback queries from inline keyboard buttons."""
+    await ctx.answer()
+
+    action, args = decode_callback(ctx.data)
+    session = ctx.session
+
+    # Buttons carry their currency pair; older ones use the selected pair
+    currency_pair = args[0] if args and args[0] in VALID_PAIRS else session.get('pair', DEFAULT_PAIR)
+
+    # Handle currency pair selection
+    if action == PAIR:
+        session['pair'] = currency_pair
+        await ctx.edit(f"Currency pair set to: *{currency_pair}*\n\nWhat would you like to do?",
+                       trade_actions(currency_pair) + [BACK_TO_MENU])
+
+    # Show currency pair selection
+    elif action == CURRENCIES:
+        await ctx.edit("Select a currency pair to trade:",
+                       CURRENCY_OPTIONS + [[Button("« Back to Trading Menu", encode_callback(MENU))]])
+
+    # Back to main trading menu
+    elif action == MENU:
+        await trade_command(ctx)
+
+    # Trading operations: ask for the amount, which arrives as a text message
+    elif action in (BUY, SELL, AUTO):
+        prompts = {
+            BUY: f"How much do you want to buy of {currency_pair}? (in USD)",
+            SELL: f"How much do you want to sell of {currency_pair}? (in USD)",
+            AUTO: f"How much do you want to auto-trade {currency_pair}? (in USD)"
+        }
+        await ctx.edit(prompts[action])
+        session['await'] = {'action': {BUY: 'buy', SELL: 'sell', AUTO: 'auto'}[action], 'pair': currency_pair}
+
+    elif action in (POCKET_CALL, POCKET_PUT):
+        option_type = 'call' if action == POCKET_CALL else 'put'
+        await ctx.edit(f"Use /pocket_{option_type} [amount] [expiry] to place a pocket option "
+                       f"(e.g. /pocket_{option_type} 100 5).")
+
+    elif action in (STATUS, LIVE):
+        await _show_status(ctx, ctx.edit, live=action == LIVE)
+
+    elif action == STOP_LIVE:
+        if not await live_status.stop(ctx.chat_id):
+            await _show_status(ctx, ctx.edit)
+
+    elif action == CLOSE:
+        await ctx.edit("Enter the trade ID you want to close:")
+        session['await'] = {'action': 'close'}
+
+    else:
+        # A button of an older menu layout
+        await ctx.edit("⌛ This menu has expired, here is the current one.")
+        await trade_command(ctx)
+
+async def handle_text(ctx):
+    """Handle regular text messages (amounts and trade IDs asked for by the buttons)."""
+    text = ctx.text.lower()
+
+    # What the last button pressed asked for (kept in the session until answered or expired)
+    pending = ctx.session.pop('await', None)
+    if pending is None:
+        # Default response for text messages
+        await ctx.reply("I'm not sure what you mean. Use /help to see available commands.")
+        return
+
+    action = pending.get('action')
+    if action == 'close':
+        try:
+            trade_id = int(text)
+        except ValueError:
+            await ctx.reply("❌ Invalid trade ID. Please provide a number.")
+            return
+        await _close_trade(ctx, trade_id)
+        return
+
+    try:
+        amount = float(text)
+    except ValueError:
+        await ctx.reply("❌ Invalid amount. Please provide a number.")
+        return
+    currency_pair = pending.get('pair', DEFAULT_PAIR)
+    if action == 'auto':
+        await _auto_trade(ctx, [currency_pair], amount)
+    else:
+        await _execute_trade(ctx, currency_pair, action, amount)
+
+# Every command, for the adapters to register. Slow ones acknowledge at once.
+COMMANDS = [
+    Handler("start", start, admin=False),
+    Handler("help", help_command, admin=False),
+    Handler("analyze", analyze_command, ack=WORKING),
+    Handler("trade", trade_command, session=True),
+    Handler("status", status_command),
+    Handler("history", history_command),
+    Handler("buy", buy_command),
+    Handler("sell", sell_command),
+    Handler("autotrade", autotrade_command, ack=WORKING),
+    Handler("close", close_command),
+    Handler("pocket_call", pocket_call_command),
+    Handler("pocket_put", pocket_put_command),
+]
+
+# Inline keyboard buttons
+BUTTONS = Handler("button", button_handler, session=True)
+
+# Text messages that are not commands
+TEXT = Handler("text", handle_text, session=True)
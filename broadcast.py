@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+import market_analysis
+from rate_limit import SendLimiter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Broadcast settings
+BROADCAST_INTERVAL = float(os.environ.get("TELEGRAM_BROADCAST_INTERVAL", "0"))  # Seconds between broadcasts (0, the default, disables)
+BROADCAST_PAIRS = [pair.strip().upper() for pair in os.environ.get(
+    "TELEGRAM_BROADCAST_PAIRS", "EURUSD,GBPUSD,USDJPY,AUDUSD,USDCAD,XAUUSD,BTCUSD,ETHUSD").split(",") if pair.strip()]
+BROADCAST_USE_AI = os.environ.get("TELEGRAM_BROADCAST_AI", "0") == "1"  # Include the AI recommendation (a Groq call per pair)
+BROADCAST_FIRST = 60  # Seconds after startup of the first broadcast
+MAX_SEND_RETRIES = 2  # Retries of a send Telegram asked us to slow down for
+
+
+def compute_signals(pairs=None, use_ai=None):
+    """
+    Analyze every broadcast pair once.
+
+    Returns:
+        list: Analyses in pair order (pairs that fail are left out)
+    """
+    use_ai = BROADCAST_USE_AI if use_ai is None else use_ai
+    analyses = []
+    for pair in pairs or BROADCAST_PAIRS:
+        try:
+            analyses.append(market_analysis.shared_analysis(pair, use_ai=use_ai))
+        except Exception as e:
+            logger.error(f"Error analyzing {pair} for broadcast: {str(e)}")
+    return analyses
+
+
+def render_signals(analyses):
+    """Render one broadcast message for all analyses."""
+    lines = [f"📡 Market signals ({datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC)", ""]
+    for analysis in analyses:
+        trend = analysis.get('trend', 'neutral')
+        trend_emoji = "📈" if trend == 'bullish' else "📉" if trend == 'bearish' else "📊"
+        lines.append(
+            f"{trend_emoji} {analysis.get('currency_pair')}: {analysis.get('current_price', 'N/A')} - "
+            f"{str(analysis.get('recommendation', 'hold')).capitalize()} ({analysis.get('confidence', 'N/A')}%), "
+            f"RSI {(analysis.get('indicators') or {}).get('rsi', 'N/A')}"
+        )
+    lines += ["", "Use /analyze [pair] for the full analysis."]
+    return "\n".join(lines)
+
+
+def active_chat_ids():
+    """Chat IDs of every active TelegramChat."""
+    from app import db, with_app_context
+    from models import TelegramChat
+
+    @with_app_context
+    def load():
+        return [chat_id for chat_id, in db.session.query(TelegramChat.chat_id).filter_by(is_active=True)]
+
+    return load()
+
+
+def deactivate_chats(chat_ids):
+    """Mark chats that blocked the bot or no longer exist as inactive."""
+    if not chat_ids:
+        return
+    from app import db, with_app_context
+    from models import TelegramChat
+
+    @with_app_context
+    def update():
+        TelegramChat.query.filter(TelegramChat.chat_id.in_(chat_ids)).update(
+            {'is_active': False}, synchronize_session=False)
+        db.session.commit()
+
+    update()
+    logger.info(f"Deactivated {len(chat_ids)} Telegram chats that can no longer be reached")
+
+
+class Broadcaster:
+    """
+    Send one message to many chats within Telegram's send limits.
+
+    `send(chat_id, text)` delivers a message. Sends are paced by a
+    SendLimiter (30 messages/s overall, 1/s per chat). When Telegram still
+    asks to slow down the send is retried after the requested delay; chats
+    that blocked the bot or were deleted are collected so they can be
+    deactivated.
+    """
+
+    def __init__(self, send, limiter=None):
+        self.send = send
+        self.limiter = limiter or SendLimiter()
+        self._lock = threading.Lock()  # One broadcast at a time
+        self.last_run = {}
+
+    def fan_out(self, text, chat_ids):
+        """
+        Send `text` to every chat.
+
+        Returns:
+            dict: Counts of recipients, sent and failed messages, the chats
+                that could not be reached ('unreachable') and the duration
+        """
+        from telegram.error import RetryAfter, BadRequest
+        try:
+            from telegram.error import Unauthorized
+        except ImportError:
+            # Renamed in python-telegram-bot 20
+            from telegram.error import Forbidden as Unauthorized
+
+        start = time.monotonic()
+        sent = failed = 0
+        unreachable = []
+        for chat_id in chat_ids:
+            for attempt in range(MAX_SEND_RETRIES + 1):
+                self.limiter.acquire(chat_id)
+                try:
+                    self.send(chat_id, text)
+                    sent += 1
+                except RetryAfter as e:
+                    if attempt < MAX_SEND_RETRIES:
+                        logger.warning(f"Telegram asked to slow down, retrying in {e.retry_after}s")
+                        time.sleep(e.retry_after)
+                        continue
+                    failed += 1
+                except Unauthorized:
+                    unreachable.append(chat_id)
+                except BadRequest as e:
+                    if 'chat not found' in str(e).lower():
+                        unreachable.append(chat_id)
+                    else:
+                        logger.error(f"Error broadcasting to chat {chat_id}: {str(e)}")
+                        failed += 1
+                except Exception as e:
+                    logger.error(f"Error broadcasting to chat {chat_id}: {str(e)}")
+                    failed += 1
+                break
+        return {
+            'recipients': len(chat_ids),
+            'sent': sent,
+            'failed': failed,
+            'unreachable': unreachable,
+            'send_seconds': round(time.monotonic() - start, 3)
+        }
+
+    def run(self, pairs=None):
+        """
+        Analyze each pair once, render the message once and send it to every active chat.
+
+        Returns:
+            dict: Statistics of the run (also kept in last_run), or None if
+                a broadcast was already running
+        """
+        if not self._lock.acquire(blocking=False):
+            logger.warning("Previous broadcast still running, skipping this one")
+            return None
+        try:
+            start = time.monotonic()
+            analyses = compute_signals(pairs)
+            analysis_seconds = round(time.monotonic() - start, 3)
+            if not analyses:
+                logger.warning("No analyses to broadcast")
+                return None
+            text = render_signals(analyses)
+            chat_ids = active_chat_ids()
+            result = self.fan_out(text, chat_ids)
+            deactivate_chats(result['unreachable'])
+
+            result.update({
+                'timestamp': datetime.now().isoformat(),
+                'pairs': [analysis.get('currency_pair') for analysis in analyses],
+                'analysis_seconds': analysis_seconds,
+                'unreachable': len(result['unreachable'])
+            })
+            self.last_run = result
+            logger.info(f"Broadcast {len(analyses)} signals to {result['sent']}/{result['recipients']} chats "
+                        f"in {result['send_seconds']}s")
+            return result
+        finally:
+            self._lock.release()
+
+
+def schedule(job_queue, interval=None, first=BROADCAST_FIRST, limiter=None):
+    """
+    Schedule broadcasts on an Updater's JobQueue.
+
+    Pass the SendLimiter used for replies as `limiter` so broadcasts and
+    replies share Telegram's send limits.
+
+    Returns:
+        Broadcaster: The scheduled broadcaster, or None if broadcasts are disabled
+    """
+    interval = BROADCAST_INTERVAL if interval is None else interval
+    if interval <= 0:
+        logger.info("Telegram signal broadcasts disabled")
+        return None
+    broadcaster = Broadcaster(lambda chat_id, text: job_queue.bot.send_message(chat_id=chat_id, text=text),
+                              limiter)
+    job_queue.run_repeating(lambda context: broadcaster.run(), interval=interval, first=first,
+                            name='signal_broadcast')
+    logger.info(f"Broadcasting signals for {len(BROADCAST_PAIRS)} pairs every {interval:g}s")
+    return broadcaster
@@ -0,0 +1,147 @@
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from metrics import LatencyHistogram
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ChatWorkerPool:
+    """
+    Run handlers on a bounded pool of worker threads, in order per chat.
+
+    submit(key, func, ...) queues a call and returns a Future immediately.
+    Calls for the same key (a chat) run one at a time in submission order;
+    calls for different keys run concurrently on up to `workers` threads. A
+    chat is in the ready queue at most once, so a chat with a long backlog
+    cannot hold more than one worker.
+
+    Up to `max_pending` calls (and `max_per_chat` per chat) can wait; beyond
+    that submit() returns None so the caller can tell the user to retry.
+    Worker threads are started on the first submit. Queue wait and handler
+    latency are recorded in histograms (see snapshot).
+    """
+
+    def __init__(self, name, workers=8, max_pending=100, max_per_chat=5):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_chat = max_per_chat
+
+        self._chats = {}  # key -> deque of queued calls; present while the chat has queued or running calls
+        self._ready = deque()  # keys whose next call can start
+        self._pending = 0
+        self._running = 0
+        self._closed = False
+        self._threads = []
+        self._cond = threading.Condition()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'errors': 0,
+            'rejected': 0,
+            'max_pending_seen': 0
+        }
+        self.queue_wait = LatencyHistogram()
+        self.latency = {}  # handler name -> LatencyHistogram
+        atexit.register(self.close)
+
+    def submit(self, key, func, *args, name=None, **kwargs):
+        """Queue func(*args, **kwargs) behind earlier calls for `key`; None if the queue is full."""
+        name = name or getattr(func, '__name__', 'handler')
+        with self._cond:
+            queued = self._chats.get(key)
+            if (self._closed or self._pending >= self.max_pending
+                    or (queued is not None and len(queued) >= self.max_per_chat)):
+                self._stats['rejected'] += 1
+                return None
+            if not self._threads:
+                self._start()
+            future = Future()
+            if queued is None:
+                queued = self._chats[key] = deque()
+                self._ready.append(key)
+            queued.append((name, func, args, kwargs, future, time.monotonic()))
+            self._pending += 1
+            self._stats['submitted'] += 1
+            self._stats['max_pending_seen'] = max(self._stats['max_pending_seen'], self._pending)
+            self._cond.notify()
+        return future
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _histogram(self, name):
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or self._closed)
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                name, func, args, kwargs, future, queued_at = self._chats[key].popleft()
+                self._pending -= 1
+                self._running += 1
+
+            self.queue_wait.observe(time.monotonic() - queued_at)
+            start = time.monotonic()
+            try:
+                future.set_result(func(*args, **kwargs))
+                failed = False
+            except Exception as e:
+                logger.error(f"Error in {self.name} handler {name}: {str(e)}")
+                future.set_exception(e)
+                failed = True
+            self._histogram(name).observe(time.monotonic() - start)
+
+            with self._cond:
+                self._running -= 1
+                self._stats['completed'] += 1
+                if failed:
+                    self._stats['errors'] += 1
+                # The chat's next call may start now that this one is done
+                if self._chats[key]:
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._chats[key]
+
+    def close(self, timeout=None):
+        """Stop accepting calls, finish the queued ones and stop the workers."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def snapshot(self):
+        """Return queue depth, running calls, counters and latency histograms."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'workers': self.workers,
+                'started': bool(self._threads),
+                'pending': self._pending,
+                'running': self._running,
+                'chats': len(self._chats),
+                'max_pending': self.max_pending
+            })
+        snapshot['queue_wait'] = self.queue_wait.snapshot()
+        snapshot['handlers'] = {name: histogram.snapshot() for name, histogram in sorted(self.latency.items())}
+        return snapshot
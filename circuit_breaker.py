@@ -0,0 +1,310 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Thread pool used to launch hedged (duplicate) requests
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hedged-call')
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because its breaker is open."""
+
+    def __init__(self, name, retry_in):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker over a sliding window of recent calls.
+
+    The breaker trips when, over the last `window_size` calls (and at least
+    `min_calls` of them), the error rate reaches `error_threshold` or the
+    latency percentile `latency_percentile` exceeds `latency_threshold`
+    seconds. While open, calls fail fast with CircuitOpenError. After
+    `cooldown` seconds a single probe call is let through (half-open); its
+    outcome decides whether the breaker closes again or re-opens.
+    """
+
+    def __init__(self, name, window_size=20, min_calls=5, error_threshold=0.5,
+                 latency_threshold=8.0, latency_percentile=95, cooldown=30.0):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.latency_threshold = latency_threshold
+        self.latency_percentile = latency_percentile
+        self.cooldown = cooldown
+
+        self._calls = deque(maxlen=window_size)  # (ok, latency) tuples
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._trip_reason = None
+        self._total_calls = 0
+        self._total_failures = 0
+        self._short_circuited = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        # Must be called with the lock held
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self):
+        """Return True if a call may proceed, False if it should be short-circuited."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def retry_in(self):
+        """Seconds until the breaker will allow a probe call."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def record_success(self, latency):
+        self._record(True, latency)
+
+    def record_failure(self, latency):
+        self._record(False, latency)
+
+    def _record(self, ok, latency):
+        with self._lock:
+            self._total_calls += 1
+            if not ok:
+                self._total_failures += 1
+
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok and latency < self.latency_threshold:
+                    logger.info(f"Circuit '{self.name}' closed after successful probe")
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self._trip_reason = None
+                else:
+                    self._trip(f"probe failed ({'slow' if ok else 'error'})")
+                return
+
+            self._calls.append((ok, latency))
+            if state == CLOSED and len(self._calls) >= self.min_calls:
+                error_rate = self._error_rate()
+                latency_pct = self._latency_percentile()
+                if error_rate >= self.error_threshold:
+                    self._trip(f"error rate {error_rate:.0%}")
+                elif latency_pct > self.latency_threshold:
+                    self._trip(f"p{self.latency_percentile} latency {latency_pct:.2f}s")
+
+    def _trip(self, reason):
+        # Must be called with the lock held
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trip_reason = reason
+        logger.warning(f"Circuit '{self.name}' opened: {reason}")
+
+    def _error_rate(self):
+        if not self._calls:
+            return 0.0
+        return sum(1 for ok, _ in self._calls if not ok) / len(self._calls)
+
+    def _latency_percentile(self):
+        if not self._calls:
+            return 0.0
+        latencies = sorted(latency for _, latency in self._calls)
+        index = min(len(latencies) - 1, int(round(self.latency_percentile / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._calls.clear()
+            self._probe_in_flight = False
+            self._trip_reason = None
+
+    def snapshot(self):
+        """Return the breaker state and window statistics as a dict."""
+        with self._lock:
+            state = self._current_state()
+            return {
+                'name': self.name,
+                'state': state,
+                'trip_reason': self._trip_reason,
+                'retry_in': round(max(0.0, self.cooldown - (time.monotonic() - self._opened_at)), 2) if state == OPEN else 0.0,
+                'window_calls': len(self._calls),
+                'error_rate': round(self._error_rate(), 3),
+                f'p{self.latency_percentile}_latency': round(self._latency_percentile(), 3),
+                'total_calls': self._total_calls,
+                'total_failures': self._total_failures,
+                'short_circuited': self._short_circuited,
+                'config': {
+                    'window_size': self.window_size,
+                    'min_calls': self.min_calls,
+                    'error_threshold': self.error_threshold,
+                    'latency_threshold': self.latency_threshold,
+                    'cooldown': self.cooldown
+                }
+            }
+
+
+# Registry of breakers, one per (endpoint, model)
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+BREAKER_DEFAULTS = {}
+
+
+def configure(**defaults):
+    """Set the default settings used for breakers created from now on."""
+    BREAKER_DEFAULTS.update(defaults)
+
+
+def get_breaker(endpoint, model):
+    """Get (or create) the breaker for an endpoint and model."""
+    key = f"{endpoint}:{model}"
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key, **BREAKER_DEFAULTS)
+            _BREAKERS[key] = breaker
+        return breaker
+
+
+def snapshot():
+    """Return the state of every registered breaker."""
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def reset_all():
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    for breaker in breakers:
+        breaker.reset()
+
+
+def _timed(breaker, func):
+    """Run func once, recording its outcome and latency on the breaker."""
+    start = time.monotonic()
+    try:
+        result = func()
+    except Exception:
+        breaker.record_failure(time.monotonic() - start)
+        raise
+    breaker.record_success(time.monotonic() - start)
+    return result
+
+
+def _discard(future, on_discarded):
+    # The losing call of a hedge can't be interrupted once started; hand its result over when it finishes
+    if future.cancel() or on_discarded is None:
+        return
+
+    def done(future):
+        if future.exception() is None:
+            try:
+                on_discarded(future.result())
+            except Exception as e:
+                logger.error(f"Error handling a discarded hedged result: {str(e)}")
+    future.add_done_callback(done)
+
+
+def _hedged(breaker, func, hedge_after, can_hedge=None, on_discarded=None):
+    """
+    Run func, and if it hasn't finished after `hedge_after` seconds launch a
+    second identical call, unless can_hedge() returns False. The first
+    successful result wins; the other one is passed to on_discarded.
+    """
+    primary = _HEDGE_EXECUTOR.submit(_timed, breaker, func)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+    if can_hedge is not None and not can_hedge():
+        logger.info(f"Not hedging slow call on '{breaker.name}'")
+        return primary.result()
+
+    logger.info(f"Hedging slow call on '{breaker.name}' after {hedge_after:.2f}s")
+    pending = {primary, _HEDGE_EXECUTOR.submit(_timed, breaker, func)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    _discard(loser, on_discarded)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call(breaker, func, retry_on=None, max_retries=2, backoff_base=0.5, backoff_cap=8.0,
+         hedge_after=0, retry_after=None, can_hedge=None, on_discarded=None):
+    """
+    Call func() under the protection of a circuit breaker.
+
+    Args:
+        breaker (CircuitBreaker): Breaker guarding the call
+        func (callable): Zero-argument function performing the request
+        retry_on (callable): Predicate deciding whether an exception is retryable
+        max_retries (int): Maximum number of retries for retryable errors
+        backoff_base (float): Base delay for exponential backoff, in seconds
+        backoff_cap (float): Maximum backoff delay, in seconds
+        hedge_after (float): Launch a duplicate request after this many seconds (0 disables)
+        retry_after (callable): Optional function returning a server-suggested delay for an exception
+        can_hedge (callable): Optional predicate deciding whether a duplicate request may be launched now
+        on_discarded (callable): Optional function called with the result of a hedged request that lost
+
+    Returns:
+        The result of func()
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name, breaker.retry_in())
+        try:
+            if hedge_after and hedge_after > 0:
+                return _hedged(breaker, func, hedge_after, can_hedge=can_hedge, on_discarded=on_discarded)
+            return _timed(breaker, func)
+        except Exception as e:
+            if attempt >= max_retries or not (retry_on and retry_on(e)):
+                raise
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(backoff_cap, backoff_base * (2 ** attempt)))
+            suggested = retry_after(e) if retry_after else None
+            if suggested:
+                delay = max(delay, min(suggested, backoff_cap))
+            attempt += 1
+            logger.warning(f"Retrying call on '{breaker.name}' in {delay:.2f}s "
+                           f"(attempt {attempt}/{max_retries}): {str(e)}")
+            time.sleep(delay)
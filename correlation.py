@@ -0,0 +1,379 @@
+import os
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Pairs tracked by the shared service
+CORRELATION_PAIRS = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "XAUUSD", "BTCUSD", "ETHUSD"]
+
+# Service settings
+CORRELATION_WINDOW = int(os.environ.get("CORRELATION_WINDOW", "60"))  # Default window, in bars of returns
+MAX_HISTORY = 250  # Bars of returns kept to build matrices for new window lengths
+CORRELATION_THRESHOLD = 0.5  # Open positions correlated at least this much count as exposure
+MIN_POSITION_SCALE = 0.25  # Correlated exposure shrinks a new position to no less than this
+
+
+class RollingCovariance:
+    """
+    Rolling covariance of return vectors over the last `window` bars.
+
+    Keeps the window's returns in a ring buffer with their running sum and
+    sum of outer products. Each update adds the new bar and removes the one
+    leaving the window with a single rank-2 product, so it costs O(n²) for
+    n instruments instead of the O(window * n²) of a full recompute. Every
+    `window` updates the sums are rebuilt from the buffer, which keeps
+    floating point drift from accumulating at the same amortized cost.
+    Updates work in place in preallocated buffers, and the correlation
+    matrix is computed once per update, when first asked for.
+    """
+
+    def __init__(self, size, window):
+        if window < 2:
+            raise ValueError("Covariance window must be at least 2 bars")
+        self.size = size
+        self.window = window
+        self._buffer = np.zeros((window, size))
+        self._sum = np.zeros(size)
+        self._products = np.zeros((size, size))
+        self._position = 0
+        self._count = 0
+        self._since_resync = 0
+        # Operands and result of the rank-2 update
+        self._left = np.empty((size, 2))
+        self._right = np.empty((2, size))
+        self._scratch = np.empty((size, size))
+        self._correlation = None  # Cached until the next update
+
+    @property
+    def observations(self):
+        return min(self._count, self.window)
+
+    def update(self, returns):
+        """Add one bar of returns (one value per instrument)."""
+        returns = np.asarray(returns, dtype=float)
+        self._correlation = None
+        if self._count >= self.window:
+            leaving = self._buffer[self._position]
+            self._sum += returns
+            self._sum -= leaving
+            # x x' - o o' as one product of the stacked vectors
+            self._left[:, 0] = returns
+            self._left[:, 1] = leaving
+            self._right[0] = returns
+            np.negative(leaving, out=self._right[1])
+            np.matmul(self._left, self._right, out=self._scratch)
+        else:
+            self._sum += returns
+            self._outer(returns, returns)
+        self._products += self._scratch
+        self._buffer[self._position] = returns
+        self._position = (self._position + 1) % self.window
+        self._count += 1
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self._resync()
+
+    def load(self, rows):
+        """Fill the window from a (bars x instruments) array of returns at once."""
+        rows = np.asarray(rows, dtype=float)[-self.window:]
+        self._buffer[:len(rows)] = rows
+        self._count = len(rows)
+        self._position = len(rows) % self.window
+        self._resync()
+
+    def _resync(self):
+        data = self._buffer[:self.observations]
+        data.sum(axis=0, out=self._sum)
+        np.matmul(data.T, data, out=self._products)
+        self._since_resync = 0
+        self._correlation = None
+
+    def _outer(self, a, b):
+        # a b' into the scratch buffer, as a rank-2 product with a zero row (numpy is slow at rank 1)
+        self._left[:, 0] = a
+        self._left[:, 1] = 0.0
+        self._right[0] = b
+        self._right[1] = 0.0
+        return np.matmul(self._left, self._right, out=self._scratch)
+
+    def _scatter(self):
+        # (n - 1) times the covariance: the sum of products minus s s' / n
+        scatter = np.empty((self.size, self.size))
+        np.subtract(self._products, self._outer(self._sum, self._sum / self.observations), out=scatter)
+        return scatter
+
+    def covariance(self):
+        """The sample covariance matrix, or None with fewer than 2 bars."""
+        n = self.observations
+        if n < 2:
+            return None
+        covariance = self._scatter()
+        covariance /= n - 1
+        return covariance
+
+    def correlation(self):
+        """The correlation matrix (0 for instruments without variance), or None; read-only."""
+        if self._correlation is None:
+            if self.observations < 2:
+                return None
+            correlation = self._scatter()
+            std = np.sqrt(np.clip(np.diag(correlation), 0, None))
+            scale = np.zeros_like(std)
+            np.divide(1.0, std, out=scale, where=std > 0)
+            correlation *= self._outer(scale, scale)
+            np.clip(correlation, -1.0, 1.0, out=correlation)
+            np.fill_diagonal(correlation, 1.0)
+            correlation.flags.writeable = False
+            self._correlation = correlation
+        return self._correlation
+
+
+class CorrelationService:
+    """
+    Rolling correlation and covariance of log returns across instruments.
+
+    Feed one bar of closes for all instruments with update(); instruments
+    missing from a bar keep their last price (a zero return). Closes
+    fetched one pair at a time go through observe(), which adds a bar once
+    it is complete. One
+    RollingCovariance is kept per window length: it is built from the
+    stored return history the first time that window is asked for and
+    updated incrementally on every bar after that.
+    """
+
+    def __init__(self, pairs, max_history=MAX_HISTORY):
+        self.pairs = list(pairs)
+        self.index = {pair: i for i, pair in enumerate(self.pairs)}
+        self.max_history = max_history
+        self.bars = 0
+        self._returns = deque(maxlen=max_history)
+        self._last_prices = None
+        self._matrices = {}  # window -> RollingCovariance
+        self._lock = threading.Lock()
+        self.last_bar = None  # Label (e.g. date) of the last bar added
+        self._open_bar = None  # Label of the bar observe() is collecting closes for
+        self._open_prices = {}
+
+    def _vector(self, prices):
+        if isinstance(prices, dict):
+            vector = self._last_prices.copy() if self._last_prices is not None else np.full(len(self.pairs), np.nan)
+            for pair, price in prices.items():
+                if pair in self.index:
+                    vector[self.index[pair]] = price
+            return vector
+        return np.asarray(prices, dtype=float)
+
+    def update(self, prices):
+        """
+        Add a bar of closing prices.
+
+        Args:
+            prices: dict of pair -> close, or an array in `pairs` order
+        """
+        with self._lock:
+            vector = self._vector(prices)
+            if self._last_prices is not None:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    returns = np.log(vector / self._last_prices)
+                returns[~np.isfinite(returns)] = 0.0
+                self._returns.append(returns)
+                for matrix in self._matrices.values():
+                    matrix.update(returns)
+            self._last_prices = vector
+            self.bars += 1
+
+    def observe(self, pair, close, bar):
+        """
+        Record the latest close of `pair` in the bar labelled `bar` (e.g. its date).
+
+        Closes of the open bar replace each other as they are fetched; once
+        a later bar is observed the open one is complete and is added with
+        update(). Closes of bars already added are ignored.
+        """
+        complete = None
+        with self._lock:
+            if pair not in self.index or (self.last_bar is not None and bar <= self.last_bar):
+                return
+            if self._open_bar is not None and bar < self._open_bar:
+                return
+            if self._open_bar is not None and bar > self._open_bar:
+                complete = self._open_prices
+                self.last_bar = self._open_bar
+                self._open_prices = {}
+            self._open_bar = bar
+            self._open_prices[pair] = close
+        if complete:
+            self.update(complete)
+
+    def load(self, closes, last_bar=None):
+        """
+        Load a history of closes at once.
+
+        Args:
+            closes: (bars x instruments) array, or dict of pair -> closes of
+                equal length
+            last_bar: Label of the last bar (see observe)
+        """
+        if isinstance(closes, dict):
+            closes = np.column_stack([np.asarray(closes[pair], dtype=float) for pair in self.pairs])
+        closes = np.asarray(closes, dtype=float)
+        with self._lock:
+            if len(closes) > 1:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    returns = np.log(closes[1:] / closes[:-1])
+                returns[~np.isfinite(returns)] = 0.0
+                self._returns.extend(returns[-self.max_history:])
+            self._last_prices = closes[-1].copy()
+            self.bars += len(closes)
+            self.last_bar = last_bar
+            # Rebuild the cached windows from the new history
+            for matrix in self._matrices.values():
+                matrix.load(np.array(self._returns))
+
+    def _matrix(self, window):
+        matrix = self._matrices.get(window)
+        if matrix is None:
+            if window > self.max_history:
+                raise ValueError(f"Window of {window} bars exceeds the {self.max_history} bars of history kept")
+            matrix = RollingCovariance(len(self.pairs), window)
+            if self._returns:
+                matrix.load(np.array(self._returns))
+            self._matrices[window] = matrix
+        return matrix
+
+    def covariance(self, window=None):
+        """Covariance matrix of returns over `window` bars (in `pairs` order), or None."""
+        with self._lock:
+            return self._matrix(window or CORRELATION_WINDOW).covariance()
+
+    def correlation(self, window=None):
+        """Correlation matrix of returns over `window` bars (in `pairs` order), or None."""
+        with self._lock:
+            return self._matrix(window or CORRELATION_WINDOW).correlation()
+
+    def correlations_with(self, pair, window=None):
+        """Correlation of `pair` with every other tracked pair, as a dict."""
+        if pair not in self.index:
+            return {}
+        correlation = self.correlation(window)
+        if correlation is None:
+            return {}
+        row = correlation[self.index[pair]]
+        return {other: round(float(row[i]), 4) for i, other in enumerate(self.pairs) if other != pair}
+
+    def snapshot(self, window=None):
+        """Pairs, window, bars seen and the correlation matrix as nested lists."""
+        window = window or CORRELATION_WINDOW
+        correlation = self.correlation(window)
+        return {
+            'pairs': self.pairs,
+            'window': window,
+            'bars': self.bars,
+            'last_bar': self.last_bar,
+            'windows_cached': sorted(self._matrices),
+            'correlation': np.round(correlation, 4).tolist() if correlation is not None else None
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def _bar_date(bar):
+    return str(bar['date'])[:10]
+
+
+def get_service():
+    """The shared service for CORRELATION_PAIRS, loaded with daily history on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            import market_analysis
+            history = {pair: market_analysis.get_historical_data(pair, '1d', MAX_HISTORY + 1)
+                       for pair in CORRELATION_PAIRS}
+            service = CorrelationService(CORRELATION_PAIRS)
+            service.load({pair: [bar['close'] for bar in bars] for pair, bars in history.items()},
+                         last_bar=max(_bar_date(bars[-1]) for bars in history.values()))
+            _service = service
+        return _service
+
+
+def observe_daily_bars(currency_pair, historical_data):
+    """
+    Feed the latest daily close of a pair, as fetched for an analysis, to the shared service.
+
+    Does nothing until the service is first used (it then loads the
+    current history itself).
+    """
+    service = _service
+    if service is None or not historical_data:
+        return
+    latest = historical_data[-1]
+    service.observe(currency_pair, float(latest['close']), _bar_date(latest))
+
+
+def _direction(trade_type):
+    return 1 if str(trade_type).lower() in ('buy', 'call') else -1
+
+
+def correlated_exposure(currency_pair, trade_type, open_trades, window=None, threshold=CORRELATION_THRESHOLD,
+                        service=None):
+    """
+    Exposure of open positions that moves with a new trade.
+
+    Every open position whose pair correlates with `currency_pair` at least
+    `threshold` (in absolute terms) adds its notional value times the
+    correlation, signed by whether the two trades point the same way: a
+    long EURUSD adds to a new long GBPUSD and offsets a new short.
+
+    Returns:
+        dict: 'correlations' (open pair -> correlation with the new pair) and
+            'correlated_exposure' (in account currency; positive means the new
+            trade stacks on existing exposure)
+    """
+    service = service or get_service()
+    correlations = service.correlations_with(currency_pair, window)
+    direction = _direction(trade_type)
+    exposure = 0.0
+    open_correlations = {}
+    for trade in open_trades or []:
+        pair = trade.get('currency_pair')
+        correlation = 1.0 if pair == currency_pair else correlations.get(pair, 0.0)
+        open_correlations[pair] = correlation
+        if abs(correlation) < threshold:
+            continue
+        notional = float(trade.get('amount', 0) or 0) * float(trade.get('leverage', 1) or 1)
+        exposure += direction * _direction(trade.get('type', trade.get('trade_type'))) * correlation * notional
+    return {
+        'correlations': open_correlations,
+        'correlated_exposure': round(exposure, 2)
+    }
+
+
+def size_position(currency_pair, trade_type, amount, open_trades, leverage=1, window=None, service=None):
+    """
+    Shrink a new position by the correlated exposure it would stack on.
+
+    Existing exposure that moves with the trade is counted as part of the
+    same bet: the amount is scaled by notional / (notional + exposure), but
+    not below MIN_POSITION_SCALE. Trades that offset existing exposure are
+    not changed.
+
+    Returns:
+        tuple: (amount to trade, dict with the correlated exposure, the
+            correlations and the scale applied)
+    """
+    exposure = correlated_exposure(currency_pair, trade_type, open_trades, window, service=service)
+    notional = float(amount) * float(leverage or 1)
+    stacked = exposure['correlated_exposure']
+    scale = 1.0
+    if stacked > 0 and notional > 0:
+        scale = max(MIN_POSITION_SCALE, notional / (notional + stacked))
+    exposure['scale'] = round(scale, 4)
+    return round(float(amount) * scale, 2), exposure
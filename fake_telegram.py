@@ -0,0 +1,174 @@
+import json
+import time
+import logging
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from flask import Flask, request, jsonify
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 100000, 'is_bot': True, 'first_name': 'Fake Trading Bot', 'username': 'fake_trading_bot'}
+
+
+class FakeTelegram:
+    """
+    In-memory stand-in for the Telegram Bot API, for local webhook tests.
+
+    Point the bot at it with TELEGRAM_API_URL=http://localhost:<port>/bot.
+    It records the messages the bot sends and edits, remembers the webhook
+    registered with setWebhook, and delivers updates to it with the secret
+    token header like Telegram does. With `enforce_limits` it answers 429
+    with retry_after when a chat gets more than one message per second.
+    """
+
+    def __init__(self, enforce_limits=False):
+        self.enforce_limits = enforce_limits
+        self.webhook_url = None
+        self.secret_token = None
+        self.messages = []  # Sent and edited messages, in order
+        self.calls = {}  # method -> count
+        self._last_send = {}  # chat_id -> time of the last message
+        self._next_message_id = 1
+        self._next_update_id = 1
+        self._lock = threading.Lock()
+
+    def _message(self, chat_id, text, message_id=None, reply_markup=None):
+        with self._lock:
+            if message_id is None:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': text
+        }
+        if reply_markup:
+            message['reply_markup'] = reply_markup if isinstance(reply_markup, dict) else json.loads(reply_markup)
+        return message
+
+    def _rate_limited(self, chat_id):
+        if not self.enforce_limits:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_send.get(chat_id)
+            if last is not None and now - last < 1.0:
+                return max(1, round(1.0 - (now - last)))
+            self._last_send[chat_id] = now
+        return None
+
+    def call(self, method, params):
+        """Handle one Bot API call; returns (HTTP status, response body)."""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': BOT_USER}
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            self.secret_token = params.get('secret_token')
+            logger.info(f"Webhook set to {self.webhook_url}")
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was set'}
+        if method == 'deleteWebhook':
+            self.webhook_url = None
+            return 200, {'ok': True, 'result': True}
+        if method == 'getWebhookInfo':
+            return 200, {'ok': True, 'result': {'url': self.webhook_url or '', 'has_custom_certificate': False,
+                                                'pending_update_count': 0}}
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': []}
+        if method == 'answerCallbackQuery':
+            return 200, {'ok': True, 'result': True}
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id'))
+            retry_after = self._rate_limited(chat_id)
+            if retry_after:
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f'Too Many Requests: retry after {retry_after}',
+                             'parameters': {'retry_after': retry_after}}
+            message_id = int(params['message_id']) if method == 'editMessageText' else None
+            message = self._message(chat_id, params.get('text', ''), message_id, params.get('reply_markup'))
+            with self._lock:
+                self.messages.append(dict(message, method=method))
+            return 200, {'ok': True, 'result': message}
+        return 400, {'ok': False, 'error_code': 400, 'description': f'Bad Request: method {method} not supported'}
+
+    def make_update(self, text=None, chat_id=1, user_id=1, username='tester', callback_data=None, message_id=None):
+        """Build a message update (or a callback query update with `callback_data`)."""
+        with self._lock:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+        user = {'id': user_id, 'is_bot': False, 'first_name': username, 'username': username}
+        if callback_data is not None:
+            return {'update_id': update_id, 'callback_query': {
+                'id': str(update_id), 'from': user, 'chat_instance': str(chat_id), 'data': callback_data,
+                'message': self._message(chat_id, '', message_id or 1)
+            }}
+        message = {'message_id': update_id, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'},
+                   'from': user, 'text': text}
+        if text and text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': update_id, 'message': message}
+
+    def deliver(self, update, webhook_url=None):
+        """POST an update to the registered webhook; returns the HTTP status."""
+        url = webhook_url or self.webhook_url
+        if not url:
+            raise ValueError("No webhook registered")
+        headers = {'Content-Type': 'application/json'}
+        if self.secret_token:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.secret_token
+        req = urllib.request.Request(url, data=json.dumps(update).encode(), headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def create_app(fake=None):
+    """Flask app serving the fake Bot API (/bot<token>/<method>) and test helpers (/fake/...)."""
+    fake = fake or FakeTelegram()
+    app = Flask(__name__)
+    app.config['FAKE_TELEGRAM'] = fake
+
+    @app.route('/bot<token>/<method>', methods=['GET', 'POST'])
+    def bot_api(token, method):
+        params = request.get_json(silent=True) or request.form.to_dict() or request.args.to_dict()
+        status, body = fake.call(method, params)
+        return jsonify(body), status
+
+    @app.route('/fake/updates', methods=['POST'])
+    def push_update():
+        """Send an update to the webhook: {"text": "/analyze EURUSD", "chat_id": 1, "user_id": 1, "username": "tester"}."""
+        data = request.get_json(silent=True) or {}
+        update = data['update'] if 'update' in data else fake.make_update(**data)
+        return jsonify({'update': update, 'webhook_status': fake.deliver(update)})
+
+    @app.route('/fake/messages', methods=['GET'])
+    def sent_messages():
+        chat_id = request.args.get('chat_id', type=int)
+        messages = [m for m in fake.messages if chat_id is None or m['chat']['id'] == chat_id]
+        return jsonify({'messages': messages, 'calls': fake.calls, 'webhook_url': fake.webhook_url})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server for local webhook tests")
+    parser.add_argument("--port", type=int, default=8081, help="Port to listen on (default 8081)")
+    parser.add_argument("--enforce-limits", action="store_true", help="Answer 429 above 1 message/s per chat")
+    args = parser.parse_args()
+    logger.info(f"Fake Telegram Bot API on http://localhost:{args.port}/bot (set TELEGRAM_API_URL to this)")
+    create_app(FakeTelegram(args.enforce_limits)).run(host="127.0.0.1", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,18 @@ import os
 import logging
 import json
 import time
+import itertools
 from datetime import datetime
 import groq
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import wraps
+import ai_decision_log
+import circuit_breaker
+import levels
+import model_router
+import prompt_templates
+from json_stream import IncrementalJSONParser
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -17,36 +25,308 @@ API_CALLS = {}  # Store API call timestamps
 RATE_LIMIT = 5  # Max calls per minute
 RATE_WINDOW = 60  # Time window in seconds
 RATE_LOCK = threading.Lock()  # Lock for thread safety
+CALL_IDS = itertools.count()  # Keys of API_CALLS, one per call
 
-# Initialize Groq client
-client = groq.Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# Model and resilience settings
+GROQ_MODEL = model_router.FAST_MODEL  # First-pass model; escalation is configured in model_router
+GROQ_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", "20"))  # Per-request timeout in seconds
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", "2"))  # Jittered retries for 429/5xx
+GROQ_HEDGE_AFTER = float(os.environ.get("GROQ_HEDGE_AFTER", "0"))  # Seconds before a hedged request (0 disables)
+
+circuit_breaker.configure(
+    error_threshold=float(os.environ.get("GROQ_BREAKER_ERROR_RATE", "0.5")),
+    latency_threshold=float(os.environ.get("GROQ_BREAKER_LATENCY", "8")),
+    cooldown=float(os.environ.get("GROQ_BREAKER_COOLDOWN", "30"))
+)
+
+# Token usage totals per (function, model)
+TOKEN_USAGE = {}
+USAGE_LOCK = threading.Lock()
+
+# Initialize Groq client (retries are handled by circuit_breaker.call)
+client = groq.Groq(api_key=os.environ.get("GROQ_API_KEY"), timeout=GROQ_TIMEOUT, max_retries=0)
+
+def _take_rate_slot(wait=True):
+    """
+    Count one Groq call against the rate limit.
+
+    Waits for room when the limit is reached, or with wait=False returns
+    False instead (and the call is not counted).
+    """
+    with RATE_LOCK:
+        current_time = time.time()
+        # Clean up old timestamps
+        global API_CALLS
+        API_CALLS = {k: v for k, v in API_CALLS.items() if current_time - v < RATE_WINDOW}
+        
+        # Check if we've hit the rate limit
+        if len(API_CALLS) >= RATE_LIMIT:
+            if not wait:
+                return False
+            oldest_call = min(API_CALLS.values())
+            sleep_time = RATE_WINDOW - (current_time - oldest_call)
+            if sleep_time > 0:
+                logger.warning(f"Rate limit hit. Sleeping for {sleep_time:.2f} seconds")
+                time.sleep(sleep_time)
+        
+        # Register this call (calls from the same thread count separately)
+        API_CALLS[next(CALL_IDS)] = time.time()
+        return True
 
 # Rate limiting decorator
 def rate_limited(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        with RATE_LOCK:
-            current_time = time.time()
-            # Clean up old timestamps
-            global API_CALLS
-            API_CALLS = {k: v for k, v in API_CALLS.items() if current_time - v < RATE_WINDOW}
-            
-            # Check if we've hit the rate limit
-            if len(API_CALLS) >= RATE_LIMIT:
-                oldest_call = min(API_CALLS.values())
-                sleep_time = RATE_WINDOW - (current_time - oldest_call)
-                if sleep_time > 0:
-                    logger.warning(f"Rate limit hit. Sleeping for {sleep_time:.2f} seconds")
-                    time.sleep(sleep_time)
-            
-            # Register this call
-            call_id = id(threading.current_thread())
-            API_CALLS[call_id] = time.time()
+        _take_rate_slot()
         
         # Execute the function
         return func(*args, **kwargs)
     return wrapper
 
+def rate_budget():
+    """How many rate-limited calls can start now without waiting for the rate limit."""
+    with RATE_LOCK:
+        current_time = time.time()
+        recent = sum(1 for called in API_CALLS.values() if current_time - called < RATE_WINDOW)
+    return max(0, RATE_LIMIT - recent)
+
+# Circuit breaker decorator
+def circuit_guarded(endpoint, fallback):
+    """
+    Short-circuit calls to `endpoint` while its breaker is open.
+
+    The fallback is returned immediately, without waiting on the rate limiter
+    or the Groq client timeout, so callers can fall back to the local analysis.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            breaker = circuit_breaker.get_breaker(endpoint, model_router.get_policy(endpoint).fast_model)
+            if breaker.state == circuit_breaker.OPEN:
+                logger.warning(f"Groq circuit for {endpoint} is open, skipping AI call")
+                return fallback("AI service temporarily unavailable (circuit open)")
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _can_escalate(endpoint, model):
+    """
+    Whether a call of `endpoint` may be escalated to `model`.
+
+    Not while the model's circuit breaker is open, and only if the rate
+    limit has room for the extra call, which is then counted against it.
+    """
+    if circuit_breaker.get_breaker(endpoint, model).state == circuit_breaker.OPEN:
+        logger.warning(f"Groq circuit for {endpoint} on {model} is open, not escalating")
+        return False
+    if not _take_rate_slot(wait=False):
+        logger.warning(f"Groq rate limit reached, not escalating {endpoint} to {model}")
+        return False
+    return True
+
+def _route(endpoint, run, local_decision=None):
+    """model_router.route with escalations subject to the strong model's breaker and the rate limit."""
+    return model_router.route(endpoint, run, local_decision=local_decision,
+                              can_escalate=lambda model: _can_escalate(endpoint, model))
+
+def _is_retryable(error):
+    """Retry rate limiting (429) and server-side (5xx) errors only."""
+    if isinstance(error, groq.RateLimitError):
+        return True
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+def _retry_after(error):
+    """Return the server-suggested retry delay for an error, if any."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def _create_completion(model, system_message, prompt, stream=False):
+    """Send a single chat completion request to Groq."""
+    return client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.2,  # Low temperature for more consistent responses
+        max_tokens=1024,
+        stream=stream
+    )
+
+def _record_usage(endpoint, model, usage, estimated_prompt_tokens):
+    """Log the token usage of a single call and add it to the running totals."""
+    prompt_tokens = getattr(usage, 'prompt_tokens', None) if usage else None
+    completion_tokens = getattr(usage, 'completion_tokens', None) if usage else None
+    if prompt_tokens is None:
+        # The API did not report usage, fall back to our estimate
+        prompt_tokens = estimated_prompt_tokens
+    completion_tokens = completion_tokens or 0
+
+    logger.info(f"Groq token usage for {endpoint} ({model}): {prompt_tokens} prompt + "
+                f"{completion_tokens} completion tokens (estimated prompt: {estimated_prompt_tokens})")
+
+    with USAGE_LOCK:
+        totals = TOKEN_USAGE.setdefault(f"{endpoint}:{model}", {
+            'calls': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'estimated_prompt_tokens': 0
+        })
+        totals['calls'] += 1
+        totals['prompt_tokens'] += prompt_tokens
+        totals['completion_tokens'] += completion_tokens
+        totals['estimated_prompt_tokens'] += estimated_prompt_tokens
+
+def token_usage_snapshot():
+    """Return token usage totals and per-call averages per function and model."""
+    with USAGE_LOCK:
+        snapshot = {key: dict(totals) for key, totals in TOKEN_USAGE.items()}
+    for totals in snapshot.values():
+        calls = totals['calls'] or 1
+        totals['avg_prompt_tokens'] = round(totals['prompt_tokens'] / calls, 1)
+        totals['avg_completion_tokens'] = round(totals['completion_tokens'] / calls, 1)
+    return snapshot
+
+def _chat_completion(endpoint, system_message, prompt, model=None):
+    """
+    Call the Groq chat completion API through the endpoint's circuit breaker,
+    with jittered retries and optional hedging.
+    """
+    model = model or GROQ_MODEL
+    breaker = circuit_breaker.get_breaker(endpoint, model)
+    estimated = prompt_templates.estimate_tokens(system_message) + prompt_templates.estimate_tokens(prompt)
+    response = circuit_breaker.call(
+        breaker,
+        lambda: _create_completion(model, system_message, prompt),
+        retry_on=_is_retryable,
+        max_retries=GROQ_MAX_RETRIES,
+        hedge_after=GROQ_HEDGE_AFTER,
+        retry_after=_retry_after,
+        # A hedged duplicate is a request of its own: it needs a free rate slot and its tokens count
+        can_hedge=lambda: _take_rate_slot(wait=False),
+        on_discarded=lambda loser: _record_usage(endpoint, model, getattr(loser, 'usage', None), estimated)
+    )
+    _record_usage(endpoint, model, getattr(response, 'usage', None), estimated)
+    return response
+
+# Fields the market analysis decision depends on (the AI is asked to emit them first)
+MARKET_ANALYSIS_REQUIRED_FIELDS = ['trend', 'strength', 'recommendation', 'confidence']
+
+def _response_json(response):
+    """Extract and parse the JSON content of a chat completion response."""
+    ai_response = response.choices[0].message.content
+    if ai_response:
+        ai_response = ai_response.strip()
+    else:
+        ai_response = "{}"
+    try:
+        return json.loads(ai_response)
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse AI response as JSON: {ai_response[:100]}...")
+        raise
+
+def _completion_json(endpoint, system_message, prompt, model=None, currency_pair=None):
+    """Run a chat completion, parse its JSON content and record the call in the AI decision log."""
+    model = model or GROQ_MODEL
+    start = time.monotonic()
+    response = None
+    try:
+        response = _chat_completion(endpoint, system_message, prompt, model=model)
+        result = _response_json(response)
+    except Exception as e:
+        raw_response = None
+        if response is not None and getattr(response, 'choices', None):
+            raw_response = response.choices[0].message.content
+        ai_decision_log.record(endpoint, model, system_message, prompt, time.monotonic() - start,
+                               usage=getattr(response, 'usage', None), error=str(e), currency_pair=currency_pair,
+                               raw_response=raw_response)
+        raise
+    ai_decision_log.record(endpoint, model, system_message, prompt, time.monotonic() - start,
+                           usage=getattr(response, 'usage', None), result=dict(result), currency_pair=currency_pair)
+    return result
+
+def _market_analysis_fallback(reason):
+    """Default conservative market analysis returned when the AI is unavailable."""
+    return {
+        "trend": "neutral",
+        "strength": 50,
+        "recommendation": "hold",
+        "confidence": 50,
+        "reasoning": reason,
+        "ai_error": True
+    }
+
+def _trade_plan_fallback(reason):
+    """Default trade plan (don't execute) returned when the AI is unavailable."""
+    return {
+        "execute_trade": False,
+        "trade_type": "hold",
+        "reasoning": reason,
+        "ai_error": True
+    }
+
+def _risk_analysis_fallback(reason):
+    """Default conservative risk assessment returned when the AI is unavailable."""
+    return {
+        "risk_score": 80,  # Highest risk due to error
+        "risk_level": "extreme",
+        "risk_factors": [
+            {"factor": "Analysis Failure", "impact": "high", "description": reason}
+        ],
+        "overall_assessment": "Risk analysis failed. Consider this an extremely high-risk trade until proper assessment is completed.",
+        "ai_error": True
+    }
+
+def _trade_plan_decision(trade_plan):
+    """The trade plan's recommendation in buy/sell/hold terms."""
+    if not trade_plan.get('execute_trade', False):
+        return 'hold'
+    return trade_plan.get('trade_type')
+
+# Model routing: every function starts on the fast model. Market analysis and
+# trade evaluation escalate to the strong model when they disagree with the
+# local heuristic or sit near the auto-trade confidence threshold.
+model_router.register('analyze_market_with_ai')
+model_router.register('analyze_market_mtf_with_ai')
+model_router.register('evaluate_trade_opportunity', decision=_trade_plan_decision)
+model_router.register('analyze_trade_risk', strong_model=None)
+
+def _key_levels(market_data):
+    """Format the detected support/resistance levels for a prompt."""
+    detected = market_data.get('levels') or []
+    if not detected:
+        return 'N/A'
+    return ', '.join(f"{level['price']} {level['type']} ({level['touches']} touches)" for level in detected)
+
+def _market_analysis_prompt(market_data, currency_pair):
+    """Build the system message and user prompt for a market analysis request."""
+    # Format market data for the AI prompt
+    # Indicators still in their warm-up period are None and shown as N/A
+    values = {name: value for name, value in market_data.get('indicators', {}).items() if value is not None}
+    values['current_price'] = market_data.get('current_price', 'N/A')
+    values['support'] = market_data.get('support', 'N/A')
+    values['resistance'] = market_data.get('resistance', 'N/A')
+    values['key_levels'] = _key_levels(market_data)
+    return prompt_templates.render('analyze_market_with_ai', currency_pair, values)
+
+
+def _fill_market_analysis_defaults(analysis):
+    """Fill in any required market analysis fields missing from the AI response."""
+    for field in MARKET_ANALYSIS_REQUIRED_FIELDS:
+        if field not in analysis:
+            logger.warning(f"AI analysis missing required field: {field}")
+            analysis[field] = "neutral" if field == 'trend' else (
+                             "hold" if field == 'recommendation' else 50)
+    return analysis
+
+@circuit_guarded('analyze_market_with_ai', _market_analysis_fallback)
 @rate_limited
 def analyze_market_with_ai(market_data, currency_pair):
     """
@@ -60,195 +340,25 @@ def analyze_market_with_ai(market_data, currency_pair):
         dict: AI-generated market analysis including trend prediction and trade recommendation
     """
     try:
-        # Format market data for the AI prompt
-        indicators = market_data.get('indicators', {})
-        
-        # Determine the asset class based on currency pair
-        asset_class = "forex"  # Default
-        
-        if currency_pair in ["BTCUSD", "ETHUSD"]:
-            asset_class = "crypto"
-        elif currency_pair == "XAUUSD":
-            asset_class = "commodity"
-            
-        # Create a detailed prompt with market information, customized by asset class
-        if asset_class == "forex":
-            prompt = f"""
-As a forex trading expert, analyze the following market data for {currency_pair} and provide a detailed trading recommendation.
-
-TECHNICAL INDICATORS:
-- RSI: {indicators.get('rsi', 'N/A')}
-- MACD: {indicators.get('macd', 'N/A')}
-- MACD Signal: {indicators.get('macd_signal', 'N/A')}
-- SMA 20: {indicators.get('sma_20', 'N/A')}
-- Bollinger Bands:
-  - Upper: {indicators.get('upper_band', 'N/A')}
-  - Lower: {indicators.get('lower_band', 'N/A')}
-
-CURRENT PRICE: {market_data.get('current_price', 'N/A')}
-SUPPORT LEVEL: {market_data.get('support', 'N/A')}
-RESISTANCE LEVEL: {market_data.get('resistance', 'N/A')}
-
-Consider relevant forex factors like interest rate differentials, economic data releases, central bank policies, and geopolitical events.
-
-Based on this data, provide your analysis in the following JSON format:
-{{
-  "trend": "bullish|bearish|neutral",
-  "strength": "value between 0-100",
-  "recommendation": "buy|sell|hold",
-  "confidence": "value between 0-100",
-  "reasoning": "brief explanation",
-  "key_factors": ["factor1", "factor2"],
-  "risk_assessment": "brief risk analysis",
-  "timeframe": "short_term|medium_term|long_term"
-}}
-Only respond with the JSON object, no other text.
-"""
-        elif asset_class == "crypto":
-            prompt = f"""
-As a cryptocurrency trading expert, analyze the following market data for {currency_pair} and provide a detailed trading recommendation.
-
-TECHNICAL INDICATORS:
-- RSI: {indicators.get('rsi', 'N/A')}
-- MACD: {indicators.get('macd', 'N/A')}
-- MACD Signal: {indicators.get('macd_signal', 'N/A')}
-- SMA 20: {indicators.get('sma_20', 'N/A')}
-- Bollinger Bands:
-  - Upper: {indicators.get('upper_band', 'N/A')}
-  - Lower: {indicators.get('lower_band', 'N/A')}
-
-CURRENT PRICE: {market_data.get('current_price', 'N/A')}
-SUPPORT LEVEL: {market_data.get('support', 'N/A')}
-RESISTANCE LEVEL: {market_data.get('resistance', 'N/A')}
-
-Consider relevant crypto factors like market sentiment, adoption trends, regulation news, technological developments, and network metrics.
-
-Based on this data, provide your analysis in the following JSON format:
-{{
-  "trend": "bullish|bearish|neutral",
-  "strength": "value between 0-100",
-  "recommendation": "buy|sell|hold",
-  "confidence": "value between 0-100",
-  "reasoning": "brief explanation focused on crypto-specific factors",
-  "key_factors": ["factor1", "factor2"],
-  "risk_assessment": "brief risk analysis including volatility considerations",
-  "timeframe": "short_term|medium_term|long_term",
-  "volatility_risk": "low|medium|high"
-}}
-Only respond with the JSON object, no other text.
-"""
-        elif asset_class == "commodity":
-            prompt = f"""
-As a commodities trading expert, analyze the following market data for Gold (XAUUSD) and provide a detailed trading recommendation.
-
-TECHNICAL INDICATORS:
-- RSI: {indicators.get('rsi', 'N/A')}
-- MACD: {indicators.get('macd', 'N/A')}
-- MACD Signal: {indicators.get('macd_signal', 'N/A')}
-- SMA 20: {indicators.get('sma_20', 'N/A')}
-- Bollinger Bands:
-  - Upper: {indicators.get('upper_band', 'N/A')}
-  - Lower: {indicators.get('lower_band', 'N/A')}
-
-CURRENT PRICE: {market_data.get('current_price', 'N/A')}
-SUPPORT LEVEL: {market_data.get('support', 'N/A')}
-RESISTANCE LEVEL: {market_data.get('resistance', 'N/A')}
-
-Consider relevant gold factors like inflation expectations, US dollar strength, interest rates, market uncertainty, geopolitical risks, and physical demand.
-
-Based on this data, provide your analysis in the following JSON format:
-{{
-  "trend": "bullish|bearish|neutral",
-  "strength": "value between 0-100",
-  "recommendation": "buy|sell|hold",
-  "confidence": "value between 0-100",
-  "reasoning": "brief explanation focused on gold-specific factors",
-  "key_factors": ["factor1", "factor2"],
-  "risk_assessment": "brief risk analysis",
-  "timeframe": "short_term|medium_term|long_term",
-  "correlation_to_market_uncertainty": "strong_positive|positive|neutral|negative"
-}}
-Only respond with the JSON object, no other text.
-"""
-        else:
-            # Generic fallback
-            prompt = f"""
-As a financial trading expert, analyze the following market data for {currency_pair} and provide a detailed trading recommendation.
-
-TECHNICAL INDICATORS:
-- RSI: {indicators.get('rsi', 'N/A')}
-- MACD: {indicators.get('macd', 'N/A')}
-- MACD Signal: {indicators.get('macd_signal', 'N/A')}
-- SMA 20: {indicators.get('sma_20', 'N/A')}
-- Bollinger Bands:
-  - Upper: {indicators.get('upper_band', 'N/A')}
-  - Lower: {indicators.get('lower_band', 'N/A')}
-
-CURRENT PRICE: {market_data.get('current_price', 'N/A')}
-SUPPORT LEVEL: {market_data.get('support', 'N/A')}
-RESISTANCE LEVEL: {market_data.get('resistance', 'N/A')}
-
-Based on this data, provide your analysis in the following JSON format:
-{{
-  "trend": "bullish|bearish|neutral",
-  "strength": "value between 0-100",
-  "recommendation": "buy|sell|hold",
-  "confidence": "value between 0-100",
-  "reasoning": "brief explanation",
-  "key_factors": ["factor1", "factor2"],
-  "risk_assessment": "brief risk analysis",
-  "timeframe": "short_term|medium_term|long_term"
-}}
-Only respond with the JSON object, no other text.
-"""
+        system_message, prompt = _market_analysis_prompt(market_data, currency_pair)
 
         # Call Groq API
         logger.info(f"Calling Groq AI for market analysis of {currency_pair}")
-        # Set the appropriate system message based on asset class
-        if asset_class == "forex":
-            system_message = "You are a financial expert specializing in forex trading and technical analysis with deep knowledge of currency markets, central bank policies, and macroeconomic factors."
-        elif asset_class == "crypto":
-            system_message = "You are a cryptocurrency trading expert with deep knowledge of blockchain technology, market cycles, on-chain metrics, and crypto-specific technical analysis."
-        elif asset_class == "commodity":
-            system_message = "You are a commodities trading expert specializing in gold markets with knowledge of inflation impacts, monetary policy, geopolitical factors, and precious metals market dynamics."
-        else:
-            system_message = "You are a financial expert specializing in trading and technical analysis."
-            
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",  # Or "mixtral-8x7b-32768" for more advanced analysis
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,  # Low temperature for more consistent responses
-            max_tokens=1024
-        )
+        def run(model):
+            return _completion_json('analyze_market_with_ai', system_message, prompt, model=model, currency_pair=currency_pair)
         
-        # Extract the response content
-        ai_response = response.choices[0].message.content
-        if ai_response:
-            ai_response = ai_response.strip()
-        else:
-            ai_response = "{}"
-        
-        # Parse JSON response
+        # Parse JSON response (fast model first, escalated by model_router if needed)
         try:
-            analysis = json.loads(ai_response)
+            analysis = _route('analyze_market_with_ai', run, local_decision=market_data.get('recommendation'))
             
             # Validate required fields
-            required_fields = ['trend', 'strength', 'recommendation', 'confidence']
-            for field in required_fields:
-                if field not in analysis:
-                    logger.warning(f"AI analysis missing required field: {field}")
-                    analysis[field] = "neutral" if field == 'trend' else (
-                                     "hold" if field == 'recommendation' else 50)
+            _fill_market_analysis_defaults(analysis)
             
             # Log successful analysis
             logger.info(f"Groq AI analysis complete for {currency_pair}: {analysis['recommendation']} ({analysis['confidence']}%)")
             return analysis
             
         except json.JSONDecodeError:
-            logger.error(f"Failed to parse AI response as JSON: {ai_response[:100]}...")
             # Return default analysis
             return {
                 "trend": "neutral",
@@ -262,15 +372,241 @@ Only respond with the JSON object, no other text.
     except Exception as e:
         logger.error(f"Error in Groq AI market analysis: {str(e)}")
         # Return default conservative recommendation
-        return {
-            "trend": "neutral",
-            "strength": 50,
-            "recommendation": "hold",
-            "confidence": 50,
-            "reasoning": f"Error in AI analysis: {str(e)}",
-            "ai_error": True
-        }
+        return _market_analysis_fallback(f"Error in AI analysis: {str(e)}")
+
+def _na(value):
+    return 'N/A' if value is None else value
+
+def _market_mtf_prompt(mtf_data, currency_pair):
+    """Build the system message and user prompt for a multi-timeframe analysis request."""
+    lines = []
+    for timeframe, result in mtf_data.get('timeframes', {}).items():
+        indicators = result.get('indicators', {})
+        lines.append(
+            f"- {timeframe}: trend {result['trend']} (strength {result['strength']}), "
+            f"local {result['recommendation']} ({result['confidence']}%), "
+            f"RSI {_na(indicators.get('rsi'))}, MACD {_na(indicators.get('macd'))}/{_na(indicators.get('macd_signal'))}, "
+            f"ADX {_na(indicators.get('adx'))}, Stochastic %K {_na(indicators.get('stoch_k'))}, "
+            f"ATR {_na(indicators.get('atr'))}, support {result['support']}, resistance {result['resistance']}"
+        )
+    values = {
+        'timeframes': '\n'.join(lines) or 'N/A',
+        'current_price': mtf_data.get('current_price', 'N/A'),
+        'confluence_score': mtf_data.get('confluence_score', 'N/A'),
+        'recommendation': mtf_data.get('recommendation', 'N/A'),
+        'confidence': mtf_data.get('confidence', 'N/A'),
+        'support': mtf_data.get('support', 'N/A'),
+        'resistance': mtf_data.get('resistance', 'N/A'),
+        'key_levels': _key_levels(mtf_data)
+    }
+    return prompt_templates.render('analyze_market_mtf_with_ai', currency_pair, values)
+
+@circuit_guarded('analyze_market_mtf_with_ai', _market_analysis_fallback)
+@rate_limited
+def analyze_market_mtf_with_ai(mtf_data, currency_pair):
+    """
+    Use Groq AI to analyze several timeframes of a currency pair in one call.
+    
+    Args:
+        mtf_data (dict): Confluence score, local recommendation, levels and the
+            per-timeframe results (see market_analysis.analyze_market_mtf)
+        currency_pair (str): The currency pair being analyzed (e.g., 'EURUSD')
+        
+    Returns:
+        dict: AI-generated market analysis, in the format of analyze_market_with_ai
+            plus 'timeframe_alignment'
+    """
+    try:
+        system_message, prompt = _market_mtf_prompt(mtf_data, currency_pair)
+
+        logger.info(f"Calling Groq AI for multi-timeframe analysis of {currency_pair}")
+        def run(model):
+            return _completion_json('analyze_market_mtf_with_ai', system_message, prompt, model=model,
+                                    currency_pair=currency_pair)
+        
+        try:
+            analysis = _route('analyze_market_mtf_with_ai', run, local_decision=mtf_data.get('recommendation'))
+            _fill_market_analysis_defaults(analysis)
+            logger.info(f"Groq AI multi-timeframe analysis complete for {currency_pair}: {analysis['recommendation']} ({analysis['confidence']}%)")
+            return analysis
+            
+        except json.JSONDecodeError:
+            return _market_analysis_fallback("Error parsing AI response")
+            
+    except Exception as e:
+        logger.error(f"Error in Groq AI multi-timeframe analysis: {str(e)}")
+        return _market_analysis_fallback(f"Error in AI analysis: {str(e)}")
+
+# Thread pool consuming streamed completions in the background
+_STREAM_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='groq-stream')
+
+class StreamingAnalysis:
+    """
+    Handle for a streamed AI analysis.
+
+    `decision` resolves as soon as the required fields have been streamed, and
+    `result` resolves with the complete analysis (including the reasoning)
+    once the response has finished. Both futures always resolve with a dict;
+    on errors that is the same fallback analysis analyze_market_with_ai returns.
+    A stream failing after its decision is not retried: `result` then keeps
+    the decision, marked with ai_error. When the streamed decision fields
+    call for escalation (see model_router), the stream is stopped and both
+    futures resolve with the strong model's answer instead.
+    """
+
+    def __init__(self, required_fields):
+        self.required_fields = list(required_fields)
+        self.decision = Future()
+        self.result = Future()
+        self.started_at = time.monotonic()
+        self.time_to_decision = None
+
+    @classmethod
+    def resolved(cls, analysis, required_fields=MARKET_ANALYSIS_REQUIRED_FIELDS):
+        """Create a handle that is already resolved with the given analysis."""
+        streaming = cls(required_fields)
+        streaming._resolve(analysis)
+        return streaming
+
+    def _resolve_decision(self, fields):
+        if not self.decision.done():
+            self.time_to_decision = time.monotonic() - self.started_at
+            self.decision.set_result(dict(fields))
+
+    def _resolve(self, analysis):
+        self._resolve_decision(analysis)
+        if not self.result.done():
+            self.result.set_result(analysis)
 
+@rate_limited
+def _consume_market_analysis_stream(streaming, market_data, currency_pair):
+    """Stream a market analysis from Groq, resolving `streaming` as fields arrive."""
+    try:
+        system_message, prompt = _market_analysis_prompt(market_data, currency_pair)
+
+        # Call Groq API with a streamed response
+        logger.info(f"Streaming Groq AI market analysis of {currency_pair}")
+        model = model_router.get_policy('analyze_market_with_ai').fast_model
+        breaker = circuit_breaker.get_breaker('analyze_market_with_ai', model)
+        local_decision = market_data.get('recommendation')
+        parser = None
+        usage = None
+        escalation = None  # Why the strong model makes the decision instead, if it does
+
+        def decide(fields):
+            # The streamed fields are the decision unless they have to be escalated
+            nonlocal escalation
+            escalation = model_router.escalation(
+                'analyze_market_with_ai', fields, local_decision,
+                can_escalate=lambda strong_model: _can_escalate('analyze_market_with_ai', strong_model))
+            if not escalation:
+                streaming._resolve_decision(fields)
+
+        def consume():
+            nonlocal parser, usage
+            # Start from a clean parser on every (re)try
+            parser = IncrementalJSONParser()
+            stream = _create_completion(model, system_message, prompt, stream=True)
+            for chunk in stream:
+                # Groq reports usage on the final chunk
+                x_groq = getattr(chunk, 'x_groq', None)
+                if x_groq is not None and getattr(x_groq, 'usage', None):
+                    usage = x_groq.usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if (content and parser.feed(content) and not streaming.decision.done()
+                        and parser.has_fields(streaming.required_fields)):
+                    decide(parser.fields)
+                    if escalation:
+                        # The rest of the fast answer is not needed
+                        stream.close()
+                        return
+
+        def retry_on(error):
+            # The caller may already have acted on the decision, and a retry could answer differently
+            return not streaming.decision.done() and _is_retryable(error)
+
+        start = time.monotonic()
+        try:
+            circuit_breaker.call(breaker, consume, retry_on=retry_on,
+                                 max_retries=GROQ_MAX_RETRIES, retry_after=_retry_after)
+        except Exception as e:
+            decision = streaming.decision.result() if streaming.decision.done() else None
+            ai_decision_log.record('analyze_market_with_ai', model, system_message, prompt, time.monotonic() - start,
+                                   result=decision, error=str(e), currency_pair=currency_pair,
+                                   raw_response=parser.text if parser else None, stream=True)
+            if decision is None:
+                raise
+            # Keep the decision, but the complete analysis is an error
+            logger.error(f"Streamed Groq AI analysis of {currency_pair} failed after its decision: {str(e)}")
+            analysis = _fill_market_analysis_defaults(dict(decision))
+            analysis.update({'reasoning': f"AI response interrupted: {str(e)}", 'ai_error': True, 'ai_model': model})
+            streaming._resolve(analysis)
+            return
+        latency = time.monotonic() - start
+        _record_usage('analyze_market_with_ai', model, usage,
+                      prompt_templates.estimate_tokens(system_message) + prompt_templates.estimate_tokens(prompt))
+
+        if not parser.fields:
+            logger.error(f"Failed to parse streamed AI response as JSON: {parser.text[:100]}...")
+            ai_decision_log.record('analyze_market_with_ai', model, system_message, prompt, latency, usage=usage,
+                                   error="Error parsing AI response", currency_pair=currency_pair,
+                                   raw_response=parser.text, stream=True)
+            streaming._resolve(_market_analysis_fallback("Error parsing AI response"))
+            return
+        ai_decision_log.record('analyze_market_with_ai', model, system_message, prompt, latency, usage=usage,
+                               result=dict(parser.fields), currency_pair=currency_pair, stream=True)
+        model_router.record_call('analyze_market_with_ai', parser.fields, latency, local_decision)
+        if not streaming.decision.done() and not escalation:
+            # The stream ended without all of the decision fields
+            decide(parser.fields)
+
+        # Validate required fields
+        analysis = _fill_market_analysis_defaults(dict(parser.fields))
+        analysis['ai_model'] = model
+        if escalation:
+            # Decided by the strong model, in one non-streamed call
+            def run(strong_model):
+                return _completion_json('analyze_market_with_ai', system_message, prompt, model=strong_model,
+                                        currency_pair=currency_pair)
+            analysis = _fill_market_analysis_defaults(
+                model_router.escalate('analyze_market_with_ai', analysis, run, escalation, local_decision))
+        streaming._resolve(analysis)
+
+        logger.info(f"Groq AI streamed analysis complete for {currency_pair}: {analysis['recommendation']} "
+                    f"({analysis['confidence']}%), decision after {streaming.time_to_decision:.2f}s, "
+                    f"full response after {time.monotonic() - streaming.started_at:.2f}s")
+
+    except Exception as e:
+        logger.error(f"Error in streamed Groq AI market analysis: {str(e)}")
+        streaming._resolve(_market_analysis_fallback(f"Error in AI analysis: {str(e)}"))
+
+@circuit_guarded('analyze_market_with_ai',
+                 lambda reason: StreamingAnalysis.resolved(_market_analysis_fallback(reason)))
+def analyze_market_with_ai_stream(market_data, currency_pair, required_fields=None):
+    """
+    Streaming variant of analyze_market_with_ai.
+
+    The completion is parsed incrementally in a background thread, so callers
+    can act on the decision fields (trend, strength, recommendation,
+    confidence) as soon as the AI has generated them, without waiting for the
+    reasoning text.
+    
+    Args:
+        market_data (dict): Historical market data and technical indicators
+        currency_pair (str): The currency pair being analyzed (e.g., 'EURUSD')
+        required_fields (list): Fields that must be present before `decision`
+            resolves (defaults to MARKET_ANALYSIS_REQUIRED_FIELDS)
+        
+    Returns:
+        StreamingAnalysis: Handle with `decision` and `result` futures
+    """
+    streaming = StreamingAnalysis(required_fields or MARKET_ANALYSIS_REQUIRED_FIELDS)
+    _STREAM_EXECUTOR.submit(_consume_market_analysis_stream, streaming, market_data, currency_pair)
+    return streaming
+
+@circuit_guarded('evaluate_trade_opportunity', _trade_plan_fallback)
 @rate_limited
 def evaluate_trade_opportunity(market_data, currency_pair, risk_level="medium"):
     """
@@ -287,165 +623,27 @@ def evaluate_trade_opportunity(market_data, currency_pair, risk_level="medium"):
     try:
         # Format market data for the AI prompt
         current_price = market_data.get('current_price', 0)
-        support = market_data.get('support', 0)
-        resistance = market_data.get('resistance', 0)
-        
-        # Determine the asset class based on currency pair
-        asset_class = "forex"  # Default
-        
-        if currency_pair in ["BTCUSD", "ETHUSD"]:
-            asset_class = "crypto"
-        elif currency_pair == "XAUUSD":
-            asset_class = "commodity"
-        
-        # Create detailed prompt based on asset class
-        if asset_class == "forex":
-            prompt = f"""
-As a professional forex trader, evaluate this trading opportunity for {currency_pair} with a {risk_level} risk tolerance.
-
-MARKET DATA:
-- Current price: {current_price}
-- Support level: {support}
-- Resistance level: {resistance}
-- Market trend: {market_data.get('trend', 'unknown')}
-- Recommendation: {market_data.get('recommendation', 'unknown')}
-
-Consider interest rate differentials, economic calendar events, and forex-specific volatility patterns.
-
-Provide specific trade execution details in the following JSON format:
-{{
-  "execute_trade": true|false,
-  "trade_type": "buy"|"sell",
-  "entry_price": "recommended entry price",
-  "stop_loss": "stop loss price",
-  "take_profit": "take profit price",
-  "leverage": "recommended leverage 1-3",
-  "position_size_percentage": "percentage of available capital to risk",
-  "expected_risk_reward": "calculated risk-reward ratio",
-  "reasoning": "brief explanation",
-  "confidence": "value between 0-100"
-}}
-Only respond with the JSON object, no other text.
-"""
-        elif asset_class == "crypto":
-            prompt = f"""
-As a professional cryptocurrency trader, evaluate this trading opportunity for {currency_pair} with a {risk_level} risk tolerance.
-
-MARKET DATA:
-- Current price: {current_price}
-- Support level: {support}
-- Resistance level: {resistance}
-- Market trend: {market_data.get('trend', 'unknown')}
-- Recommendation: {market_data.get('recommendation', 'unknown')}
-
-Consider network metrics, market sentiment, upcoming protocol changes, and crypto-specific volatility patterns.
-
-Provide specific trade execution details in the following JSON format:
-{{
-  "execute_trade": true|false,
-  "trade_type": "buy"|"sell",
-  "entry_price": "recommended entry price",
-  "stop_loss": "stop loss price with extra margin for crypto volatility",
-  "take_profit": "take profit price",
-  "leverage": "recommended leverage 1-5",
-  "position_size_percentage": "percentage of available capital to risk",
-  "expected_risk_reward": "calculated risk-reward ratio",
-  "reasoning": "brief explanation",
-  "confidence": "value between 0-100",
-  "hold_duration": "expected holding period"
-}}
-Only respond with the JSON object, no other text.
-"""
-        elif asset_class == "commodity":
-            prompt = f"""
-As a professional gold trader, evaluate this trading opportunity for Gold (XAUUSD) with a {risk_level} risk tolerance.
-
-MARKET DATA:
-- Current price: {current_price}
-- Support level: {support}
-- Resistance level: {resistance}
-- Market trend: {market_data.get('trend', 'unknown')}
-- Recommendation: {market_data.get('recommendation', 'unknown')}
-
-Consider inflation data, USD strength, geopolitical events, central bank gold purchases, and seasonal patterns.
-
-Provide specific trade execution details in the following JSON format:
-{{
-  "execute_trade": true|false,
-  "trade_type": "buy"|"sell",
-  "entry_price": "recommended entry price",
-  "stop_loss": "stop loss price",
-  "take_profit": "take profit price",
-  "leverage": "recommended leverage 1-3",
-  "position_size_percentage": "percentage of available capital to risk",
-  "expected_risk_reward": "calculated risk-reward ratio",
-  "reasoning": "brief explanation with focus on gold market factors",
-  "confidence": "value between 0-100",
-  "portfolio_hedging_value": "value as a portfolio hedge (high|medium|low)"
-}}
-Only respond with the JSON object, no other text.
-"""
-        else:
-            # Generic fallback
-            prompt = f"""
-As a professional trader, evaluate this trading opportunity for {currency_pair} with a {risk_level} risk tolerance.
-
-MARKET DATA:
-- Current price: {current_price}
-- Support level: {support}
-- Resistance level: {resistance}
-- Market trend: {market_data.get('trend', 'unknown')}
-- Recommendation: {market_data.get('recommendation', 'unknown')}
-
-Provide specific trade execution details in the following JSON format:
-{{
-  "execute_trade": true|false,
-  "trade_type": "buy"|"sell",
-  "entry_price": "recommended entry price",
-  "stop_loss": "stop loss price",
-  "take_profit": "take profit price",
-  "leverage": "recommended leverage 1-3",
-  "position_size_percentage": "percentage of available capital to risk",
-  "expected_risk_reward": "calculated risk-reward ratio",
-  "reasoning": "brief explanation",
-  "confidence": "value between 0-100"
-}}
-Only respond with the JSON object, no other text.
-"""
+        values = {
+            'current_price': current_price,
+            'support': market_data.get('support', 0),
+            'resistance': market_data.get('resistance', 0),
+            'trend': market_data.get('trend', 'unknown'),
+            'recommendation': market_data.get('recommendation', 'unknown'),
+            'key_levels': _key_levels(market_data),
+            'atr': (market_data.get('indicators') or {}).get('atr') or 'N/A',
+            'risk_level': risk_level
+        }
+        system_message, prompt = prompt_templates.render('evaluate_trade_opportunity', currency_pair, values)
 
         # Call Groq API
         logger.info(f"Calling Groq AI for trade opportunity evaluation on {currency_pair}")
+
+        def run(model):
+            return _completion_json('evaluate_trade_opportunity', system_message, prompt, model=model, currency_pair=currency_pair)
         
-        # Set the appropriate system message based on asset class
-        if asset_class == "forex":
-            system_message = "You are a professional forex trader with expertise in risk management, trade execution, and deep knowledge of currency market dynamics and central bank policies."
-        elif asset_class == "crypto":
-            system_message = "You are a professional cryptocurrency trader with expertise in volatility management, blockchain technology, and crypto-specific trading strategies including leverage considerations."
-        elif asset_class == "commodity":
-            system_message = "You are a professional gold trader with expertise in precious metals markets, macro-economic factors affecting gold, and safe-haven asset trading strategies."
-        else:
-            system_message = "You are a professional trader with expertise in risk management and trade execution."
-            
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=1024
-        )
-        
-        # Extract the response content
-        ai_response = response.choices[0].message.content
-        if ai_response:
-            ai_response = ai_response.strip()
-        else:
-            ai_response = "{}"
-        
-        # Parse JSON response
+        # Parse JSON response (fast model first, escalated by model_router if needed)
         try:
-            trade_plan = json.loads(ai_response)
+            trade_plan = _route('evaluate_trade_opportunity', run, local_decision=market_data.get('recommendation'))
             
             # Validate required fields
             required_fields = ['execute_trade', 'trade_type', 'entry_price', 'stop_loss', 'take_profit']
@@ -468,7 +666,6 @@ Only respond with the JSON object, no other text.
             return trade_plan
             
         except json.JSONDecodeError:
-            logger.error(f"Failed to parse AI trade plan as JSON: {ai_response[:100]}...")
             # Return default trade plan (don't execute)
             return {
                 "execute_trade": False,
@@ -480,13 +677,9 @@ Only respond with the JSON object, no other text.
     except Exception as e:
         logger.error(f"Error in Groq AI trade evaluation: {str(e)}")
         # Return default conservative recommendation
-        return {
-            "execute_trade": False,
-            "trade_type": "hold",
-            "reasoning": f"Error in AI analysis: {str(e)}",
-            "ai_error": True
-        }
+        return _trade_plan_fallback(f"Error in AI analysis: {str(e)}")
 
+@circuit_guarded('analyze_trade_risk', _risk_analysis_fallback)
 @rate_limited
 def analyze_trade_risk(trade_details, market_data, currency_pair, portfolio_info=None):
     """
@@ -510,259 +703,73 @@ def analyze_trade_risk(trade_details, market_data, currency_pair, portfolio_info
         stop_loss = trade_details.get('stop_loss', 0)
         take_profit = trade_details.get('take_profit', 0)
         
+        # Stop loss just beyond the nearest key level protecting the trade
+        level_stop_loss = levels.suggest_stop_loss({'levels': market_data.get('levels') or []}, trade_type, entry_price)
+        
         # Calculate notional value and max risk if provided
         notional_value = amount * leverage
         max_risk_amount = "Not specified" if not stop_loss else f"${(entry_price - stop_loss) * amount * leverage if trade_type.lower() == 'buy' else (stop_loss - entry_price) * amount * leverage}"
         
-        # Extract market data for the AI prompt
-        current_price = market_data.get('current_price', 0)
-        market_volatility = market_data.get('volatility', 'medium')
-        market_trend = market_data.get('trend', 'neutral')
-        
-        # Determine if portfolio info is available
-        has_portfolio_info = portfolio_info is not None
-        portfolio_balance = portfolio_info.get('balance', 0) if has_portfolio_info else "Not provided"
-        open_trades = portfolio_info.get('open_trades', []) if has_portfolio_info else []
-        
-        # Determine the asset class based on currency pair
-        asset_class = "forex"  # Default
+        values = {
+            'trade_type': trade_type.upper(),
+            'entry_price': entry_price,
+            'amount': amount,
+            'leverage': leverage,
+            'notional_value': notional_value,
+            'stop_loss': stop_loss if stop_loss else "Not specified",
+            'take_profit': take_profit if take_profit else "Not specified",
+            'max_risk_amount': max_risk_amount,
+            'current_price': market_data.get('current_price', 0),
+            'trend': market_data.get('trend', 'neutral'),
+            'support': market_data.get('support', 'N/A'),
+            'resistance': market_data.get('resistance', 'N/A'),
+            'key_levels': _key_levels(market_data),
+            'level_stop_loss': level_stop_loss if level_stop_loss else "N/A",
+            'atr': (market_data.get('indicators') or {}).get('atr') or 'N/A',
+            'volatility': market_data.get('volatility', 'medium')
+        }
         
-        if currency_pair in ["BTCUSD", "ETHUSD"]:
-            asset_class = "crypto"
-        elif currency_pair == "XAUUSD":
-            asset_class = "commodity"
+        # Portfolio context is optional: open positions are included only as far
+        # as they fit in the prompt token budget
+        portfolio_header = ''
+        open_trade_lines = []
+        if portfolio_info is not None:
+            open_trades = portfolio_info.get('open_trades', [])
+            portfolio_header = (
+                f"\nPORTFOLIO INFORMATION:\n"
+                f"- Account balance: ${portfolio_info.get('balance', 0)}\n"
+                f"- Number of open trades: {len(open_trades)}\n"
+            )
+            correlations = portfolio_info.get('correlations') or {}
+            if 'correlated_exposure' in portfolio_info:
+                portfolio_header += (
+                    f"- Correlated exposure: ${portfolio_info['correlated_exposure']} "
+                    f"(open positions moving with this trade, weighted by correlation)\n"
+                )
+            if open_trades:
+                portfolio_header += "- Open positions:\n"
+                open_trade_lines = [
+                    f"  - {str(t.get('type', t.get('trade_type', ''))).upper()} {t.get('currency_pair', '')} "
+                    f"${t.get('amount', 0)} @ {t.get('price', 'N/A')} ({t.get('leverage', 1)}x)"
+                    + (f", correlation {correlations[t.get('currency_pair')]}"
+                       if t.get('currency_pair') in correlations else "")
+                    for t in open_trades
+                ]
         
-        # Create detailed prompt based on asset class
-        if asset_class == "forex":
-            prompt = f"""
-As a risk management specialist in forex trading, analyze the following trade for {currency_pair} and provide a comprehensive risk assessment.
-
-TRADE DETAILS:
-- Trade type: {trade_type.upper()}
-- Entry price: {entry_price}
-- Trade amount: ${amount}
-- Leverage: {leverage}x
-- Notional value: ${notional_value}
-- Stop loss: {stop_loss if stop_loss else "Not specified"}
-- Take profit: {take_profit if take_profit else "Not specified"}
-- Maximum risk amount: {max_risk_amount}
-
-MARKET CONDITIONS:
-- Current price: {current_price}
-- Market trend: {market_trend}
-- Support level: {market_data.get('support', 'N/A')}
-- Resistance level: {market_data.get('resistance', 'N/A')}
-- Market volatility: {market_volatility}
-
-{"PORTFOLIO INFORMATION:" if has_portfolio_info else ""}
-{"- Account balance: $" + str(portfolio_balance) if has_portfolio_info else ""}
-{"- Number of open trades: " + str(len(open_trades)) if has_portfolio_info else ""}
-
-Consider forex-specific risks including spread costs, overnight financing, slippage during high volatility, weekend gaps, and central bank announcements.
-
-Analyze both macro and micro risk factors and provide a comprehensive risk assessment in the following JSON format:
-{
-  "risk_score": "value between 1-100, higher means riskier",
-  "risk_level": "low|moderate|high|extreme",
-  "maximum_drawdown_percent": "estimated maximum drawdown as percentage",
-  "maximum_loss_amount": "estimated maximum loss in dollars",
-  "probability_of_stop_loss_hit": "percentage chance of hitting stop loss",
-  "probability_of_take_profit_hit": "percentage chance of hitting take profit",
-  "risk_reward_ratio": "calculated risk:reward ratio",
-  "risk_factors": [
-    {"factor": "name of risk factor", "impact": "high|medium|low", "description": "brief description"}
-  ],
-  "position_sizing_recommendation": "recommendation on appropriate position size",
-  "leverage_recommendation": "recommendation on appropriate leverage",
-  "missing_risk_controls": ["stop loss", "take profit", etc.] (if any),
-  "market_specific_risks": ["spread widening", "interest rate announcement", etc.],
-  "protective_measures": ["recommended actions to reduce risk"],
-  "overall_assessment": "brief overall risk assessment",
-  "confidence_level": "confidence in this risk assessment (0-100)"
-}
-Only respond with the JSON object, no other text.
-"""
-        elif asset_class == "crypto":
-            prompt = f"""
-As a risk management specialist in cryptocurrency trading, analyze the following trade for {currency_pair} and provide a comprehensive risk assessment.
-
-TRADE DETAILS:
-- Trade type: {trade_type.upper()}
-- Entry price: {entry_price}
-- Trade amount: ${amount}
-- Leverage: {leverage}x
-- Notional value: ${notional_value}
-- Stop loss: {stop_loss if stop_loss else "Not specified"}
-- Take profit: {take_profit if take_profit else "Not specified"}
-- Maximum risk amount: {max_risk_amount}
-
-MARKET CONDITIONS:
-- Current price: {current_price}
-- Market trend: {market_trend}
-- Support level: {market_data.get('support', 'N/A')}
-- Resistance level: {market_data.get('resistance', 'N/A')}
-- Market volatility: {market_volatility}
-
-{"PORTFOLIO INFORMATION:" if has_portfolio_info else ""}
-{"- Account balance: $" + str(portfolio_balance) if has_portfolio_info else ""}
-{"- Number of open trades: " + str(len(open_trades)) if has_portfolio_info else ""}
-
-Consider crypto-specific risks including extreme volatility, flash crashes, regulatory announcements, security breaches, fork events, and liquidity issues.
-
-Analyze both macro and micro risk factors and provide a comprehensive risk assessment in the following JSON format:
-{
-  "risk_score": "value between 1-100, higher means riskier",
-  "risk_level": "low|moderate|high|extreme",
-  "maximum_drawdown_percent": "estimated maximum drawdown as percentage",
-  "maximum_loss_amount": "estimated maximum loss in dollars",
-  "probability_of_stop_loss_hit": "percentage chance of hitting stop loss",
-  "probability_of_take_profit_hit": "percentage chance of hitting take profit",
-  "risk_reward_ratio": "calculated risk:reward ratio",
-  "risk_factors": [
-    {"factor": "name of risk factor", "impact": "high|medium|low", "description": "brief description"}
-  ],
-  "position_sizing_recommendation": "recommendation on appropriate position size",
-  "leverage_recommendation": "recommendation on appropriate leverage",
-  "missing_risk_controls": ["stop loss", "take profit", etc.] (if any),
-  "market_specific_risks": ["high volatility", "liquidity issues", "regulatory announcements", etc.],
-  "protective_measures": ["recommended actions to reduce risk"],
-  "overall_assessment": "brief overall risk assessment",
-  "confidence_level": "confidence in this risk assessment (0-100)",
-  "volatility_adjustment": "percentage to widen stop loss to account for crypto volatility"
-}
-Only respond with the JSON object, no other text.
-"""
-        elif asset_class == "commodity":
-            prompt = f"""
-As a risk management specialist in commodity trading, analyze the following Gold (XAUUSD) trade and provide a comprehensive risk assessment.
-
-TRADE DETAILS:
-- Trade type: {trade_type.upper()}
-- Entry price: {entry_price}
-- Trade amount: ${amount}
-- Leverage: {leverage}x
-- Notional value: ${notional_value}
-- Stop loss: {stop_loss if stop_loss else "Not specified"}
-- Take profit: {take_profit if take_profit else "Not specified"}
-- Maximum risk amount: {max_risk_amount}
-
-MARKET CONDITIONS:
-- Current price: {current_price}
-- Market trend: {market_trend}
-- Support level: {market_data.get('support', 'N/A')}
-- Resistance level: {market_data.get('resistance', 'N/A')}
-- Market volatility: {market_volatility}
-
-{"PORTFOLIO INFORMATION:" if has_portfolio_info else ""}
-{"- Account balance: $" + str(portfolio_balance) if has_portfolio_info else ""}
-{"- Number of open trades: " + str(len(open_trades)) if has_portfolio_info else ""}
-
-Consider gold-specific risks including inflation reports, Fed interest rate decisions, USD strength, geopolitical events, and changes in physical demand.
-
-Analyze both macro and micro risk factors and provide a comprehensive risk assessment in the following JSON format:
-{
-  "risk_score": "value between 1-100, higher means riskier",
-  "risk_level": "low|moderate|high|extreme",
-  "maximum_drawdown_percent": "estimated maximum drawdown as percentage",
-  "maximum_loss_amount": "estimated maximum loss in dollars",
-  "probability_of_stop_loss_hit": "percentage chance of hitting stop loss",
-  "probability_of_take_profit_hit": "percentage chance of hitting take profit",
-  "risk_reward_ratio": "calculated risk:reward ratio",
-  "risk_factors": [
-    {"factor": "name of risk factor", "impact": "high|medium|low", "description": "brief description"}
-  ],
-  "position_sizing_recommendation": "recommendation on appropriate position size",
-  "leverage_recommendation": "recommendation on appropriate leverage",
-  "missing_risk_controls": ["stop loss", "take profit", etc.] (if any),
-  "market_specific_risks": ["Fed announcements", "inflation data", "geopolitical events", etc.],
-  "protective_measures": ["recommended actions to reduce risk"],
-  "portfolio_diversification_effect": "effect on portfolio diversification",
-  "overall_assessment": "brief overall risk assessment",
-  "confidence_level": "confidence in this risk assessment (0-100)"
-}
-Only respond with the JSON object, no other text.
-"""
-        else:
-            # Generic fallback
-            prompt = f"""
-As a risk management specialist in financial trading, analyze the following trade for {currency_pair} and provide a comprehensive risk assessment.
-
-TRADE DETAILS:
-- Trade type: {trade_type.upper()}
-- Entry price: {entry_price}
-- Trade amount: ${amount}
-- Leverage: {leverage}x
-- Notional value: ${notional_value}
-- Stop loss: {stop_loss if stop_loss else "Not specified"}
-- Take profit: {take_profit if take_profit else "Not specified"}
-- Maximum risk amount: {max_risk_amount}
-
-MARKET CONDITIONS:
-- Current price: {current_price}
-- Market trend: {market_trend}
-- Support level: {market_data.get('support', 'N/A')}
-- Resistance level: {market_data.get('resistance', 'N/A')}
-- Market volatility: {market_volatility}
-
-{"PORTFOLIO INFORMATION:" if has_portfolio_info else ""}
-{"- Account balance: $" + str(portfolio_balance) if has_portfolio_info else ""}
-{"- Number of open trades: " + str(len(open_trades)) if has_portfolio_info else ""}
-
-Analyze both macro and micro risk factors and provide a comprehensive risk assessment in the following JSON format:
-{
-  "risk_score": "value between 1-100, higher means riskier",
-  "risk_level": "low|moderate|high|extreme",
-  "maximum_drawdown_percent": "estimated maximum drawdown as percentage",
-  "maximum_loss_amount": "estimated maximum loss in dollars",
-  "probability_of_stop_loss_hit": "percentage chance of hitting stop loss",
-  "probability_of_take_profit_hit": "percentage chance of hitting take profit",
-  "risk_reward_ratio": "calculated risk:reward ratio",
-  "risk_factors": [
-    {"factor": "name of risk factor", "impact": "high|medium|low", "description": "brief description"}
-  ],
-  "position_sizing_recommendation": "recommendation on appropriate position size",
-  "leverage_recommendation": "recommendation on appropriate leverage",
-  "missing_risk_controls": ["stop loss", "take profit", etc.] (if any),
-  "protective_measures": ["recommended actions to reduce risk"],
-  "overall_assessment": "brief overall risk assessment",
-  "confidence_level": "confidence in this risk assessment (0-100)"
-}
-Only respond with the JSON object, no other text.
-"""
+        system_message, prompt, estimated_tokens = prompt_templates.render_within_budget(
+            'analyze_trade_risk', currency_pair, values,
+            'portfolio_section', open_trade_lines, header=portfolio_header
+        )
 
         # Call Groq API
-        logger.info(f"Calling Groq AI for trade risk analysis on {currency_pair}")
-        
-        # Set the appropriate system message based on asset class
-        if asset_class == "forex":
-            system_message = "You are a risk management expert specializing in forex markets with deep understanding of technical and fundamental risk factors, position sizing, and risk-reward optimization."
-        elif asset_class == "crypto":
-            system_message = "You are a risk management expert specializing in cryptocurrency markets with understanding of the unique volatility patterns, liquidity risks, and regulatory impacts on digital assets."
-        elif asset_class == "commodity":
-            system_message = "You are a risk management expert specializing in gold and commodity markets with understanding of how macroeconomic factors, inflation, and geopolitical events impact risk profiles."
-        else:
-            system_message = "You are a risk management expert specializing in financial markets."
-            
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",  # Or "mixtral-8x7b-32768" for more advanced analysis
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,  # Low temperature for more consistent responses
-            max_tokens=1024
-        )
-        
-        # Extract the response content
-        ai_response = response.choices[0].message.content
-        if ai_response:
-            ai_response = ai_response.strip()
-        else:
-            ai_response = "{}"
+        logger.info(f"Calling Groq AI for trade risk analysis on {currency_pair} (~{estimated_tokens} prompt tokens)")
+
+        def run(model):
+            return _completion_json('analyze_trade_risk', system_message, prompt, model=model, currency_pair=currency_pair)
         
-        # Parse JSON response
+        # Parse JSON response (fast model first, escalated by model_router if needed)
         try:
-            risk_analysis = json.loads(ai_response)
+            risk_analysis = _route('analyze_trade_risk', run)
             
             # Validate required fields
             required_fields = ['risk_score', 'risk_level', 'risk_factors', 'overall_assessment']
@@ -778,12 +785,15 @@ Only respond with the JSON object, no other text.
                     elif field == 'overall_assessment':
                         risk_analysis[field] = "Insufficient data for complete risk assessment"
             
+            # Fall back to the level-based stop loss if the AI did not suggest one
+            if level_stop_loss and not risk_analysis.get('suggested_stop_loss'):
+                risk_analysis['suggested_stop_loss'] = level_stop_loss
+            
             # Log successful analysis
             logger.info(f"Groq AI risk analysis complete for {currency_pair} trade: {risk_analysis['risk_level']} risk (score: {risk_analysis['risk_score']})")
             return risk_analysis
             
         except json.JSONDecodeError:
-            logger.error(f"Failed to parse AI risk analysis as JSON: {ai_response[:100]}...")
             # Return default risk analysis
             return {
                 "risk_score": 75,  # Conservative high risk score by default
@@ -798,12 +808,4 @@ Only respond with the JSON object, no other text.
     except Exception as e:
         logger.error(f"Error in Groq AI risk analysis: {str(e)}")
         # Return default conservative risk assessment
-        return {
-            "risk_score": 80,  # Highest risk due to error
-            "risk_level": "extreme",
-            "risk_factors": [
-                {"factor": "Analysis Failure", "impact": "high", "description": f"Error in risk analysis: {str(e)}"}
-            ],
-            "overall_assessment": "Risk analysis failed. Consider this an extremely high-risk trade until proper assessment is completed.",
-            "ai_error": True
-        }
\ No newline at end of file
+        return _risk_analysis_fallback(f"Error in risk analysis: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,507 @@
+import os
+import logging
+from collections import deque
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# numba is optional: when it is installed the loop kernels are compiled,
+# otherwise they run on the NumPy/pandas fallbacks
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_ENABLED = njit is not None and os.environ.get("INDICATORS_NUMBA", "1") != "0"
+
+# Default indicator periods
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+ADX_PERIOD = 14
+STOCHASTIC_PERIOD = 14
+STOCHASTIC_SMOOTHING = 3
+VWAP_PERIOD = 20
+ICHIMOKU_PERIODS = (9, 26, 52)  # Tenkan, kijun and senkou span B; the cloud is shifted by the kijun period
+
+
+def float_array(values):
+    """
+    Values as a float array in the precision the kernels compute in.
+
+    float32 input (compact mode) stays float32, anything else becomes
+    float64. Kernels return arrays of their input's precision; recursive
+    averages are accumulated in float64 either way.
+    """
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values
+    return values.astype(np.float64, copy=False)
+
+
+def _compiled(func):
+    """Compile a loop kernel with numba if it is available."""
+    if NUMBA_ENABLED:
+        return njit(cache=True, nogil=True)(func)
+    return None
+
+
+def _wilder_loop(values, period, start, out):
+    end = start + period
+    if len(values) < end:
+        return out
+    average = 0.0
+    for i in range(start, end):
+        average += values[i]
+    average /= period
+    out[end - 1] = average
+    for i in range(end, len(values)):
+        average += (values[i] - average) / period
+        out[i] = average
+    return out
+
+
+_wilder_compiled = _compiled(_wilder_loop)
+
+
+def wilder(values, period, start=0):
+    """
+    Wilder's smoothing (an EMA with alpha = 1 / period).
+
+    The first value, at index start + period - 1, is the simple average of the
+    preceding `period` values; earlier values are NaN.
+    """
+    values = float_array(values)
+    out = np.full(len(values), np.nan, dtype=values.dtype)
+    if _wilder_compiled is not None:
+        return _wilder_compiled(values, period, start, out)
+    end = start + period
+    if len(values) < end:
+        return out
+    # Without numba the recursion runs in pandas' compiled ewm
+    seeded = values[end - 1:].astype(np.float64)
+    seeded[0] = values[start:end].mean(dtype=np.float64)
+    out[end - 1:] = pd.Series(seeded).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    return out
+
+
+def _rsi_loop(close, period, use_wilder, out):
+    # One pass over the closes, writing into the preallocated output
+    if len(close) <= period:
+        return out
+    avg_gain = 0.0
+    avg_loss = 0.0
+    gains = 0  # Gains and losses in the window (simple smoothing)
+    losses = 0
+    for i in range(1, period + 1):
+        change = close[i] - close[i - 1]
+        if change > 0:
+            avg_gain += change
+            gains += 1
+        elif change < 0:
+            avg_loss -= change
+            losses += 1
+    avg_gain /= period
+    avg_loss /= period
+    for i in range(period, len(close)):
+        if i > period:
+            change = close[i] - close[i - 1]
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            if use_wilder:
+                avg_gain += (gain - avg_gain) / period
+                avg_loss += (loss - avg_loss) / period
+            else:
+                # Drop the change that left the window; once a side has no
+                # changes left its average is exactly 0 (no rounding residue)
+                dropped = close[i - period] - close[i - period - 1]
+                avg_gain += (gain - (dropped if dropped > 0 else 0.0)) / period
+                avg_loss += (loss - (-dropped if dropped < 0 else 0.0)) / period
+                gains += int(change > 0) - int(dropped > 0)
+                losses += int(change < 0) - int(dropped < 0)
+                if gains == 0:
+                    avg_gain = 0.0
+                if losses == 0:
+                    avg_loss = 0.0
+        if avg_loss > 0:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        else:
+            out[i] = 100.0 if avg_gain > 0 else 50.0
+    return out
+
+
+_rsi_compiled = _compiled(_rsi_loop)
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    """RSI from average gains and losses: 100 without losses, 50 on a flat window."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    rsi[avg_loss <= 0] = 100.0
+    rsi[(avg_loss <= 0) & (avg_gain <= 0)] = 50.0
+    rsi[np.isnan(avg_gain)] = np.nan
+    return rsi
+
+
+def rolling_mean(values, period):
+    """Simple moving average; the first period - 1 values are NaN."""
+    values = float_array(values)
+    out = np.full(len(values), np.nan, dtype=values.dtype)
+    if len(values) >= period:
+        out[period - 1:] = sliding_window_view(values, period).mean(axis=1)
+    return out
+
+
+def _rolling_extreme(values, period, combine, fill):
+    """
+    Rolling maximum or minimum in O(n) (van Herk/Gil-Werman).
+
+    The series is split into blocks of `period` values; the extreme of a
+    window is the extreme of the suffix of the block it starts in and the
+    prefix of the block it ends in.
+    """
+    values = float_array(values)
+    n = len(values)
+    out = np.full(n, np.nan, dtype=values.dtype)
+    if n < period:
+        return out
+    blocks = -(-n // period)
+    padded = np.full(blocks * period, fill, dtype=values.dtype)
+    padded[:n] = values
+    padded = padded.reshape(blocks, period)
+    prefix = combine.accumulate(padded, axis=1).ravel()
+    suffix = combine.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    out[period - 1:] = combine(suffix[:n - period + 1], prefix[period - 1:n])
+    return out
+
+
+def rolling_max(values, period):
+    """Highest value over `period` bars; the first period - 1 values are NaN."""
+    return _rolling_extreme(values, period, np.maximum, -np.inf)
+
+
+def rolling_min(values, period):
+    """Lowest value over `period` bars; the first period - 1 values are NaN."""
+    return _rolling_extreme(values, period, np.minimum, np.inf)
+
+
+def _midpoint(high, low, period):
+    """Midpoint of the highest high and lowest low over `period` bars."""
+    return (rolling_max(high, period) + rolling_min(low, period)) / 2
+
+
+def _shift(values, periods):
+    """Shift values forward by `periods` bars, filling with NaN."""
+    out = np.full(len(values), np.nan, dtype=values.dtype)
+    if periods < len(values):
+        out[periods:] = values[:len(values) - periods]
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class Indicator:
+    """
+    A registered indicator kernel.
+
+    `inputs` name either price columns (high, low, close, volume) or other
+    indicators; the kernel is called with the input arrays in that order and
+    returns one array, or a tuple of arrays matching `outputs`.
+    """
+
+    def __init__(self, name, func, inputs, outputs):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+
+# Indicators by name
+INDICATORS = {}
+
+
+def indicator(name, inputs, outputs=None):
+    """Register an indicator kernel."""
+    def decorator(func):
+        INDICATORS[name] = Indicator(name, func, inputs, outputs or (name,))
+        return func
+    return decorator
+
+
+def resolve(names):
+    """
+    Order the indicators needed for `names` so dependencies come first.
+
+    Every indicator appears once, however many of the requested indicators
+    depend on it.
+    """
+    order = []
+    done = set()
+    visiting = set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name not in INDICATORS:
+            raise KeyError(f"Unknown indicator '{name}'")
+        if name in visiting:
+            raise ValueError(f"Circular indicator dependency on '{name}'")
+        visiting.add(name)
+        for dependency in INDICATORS[name].inputs:
+            if dependency in INDICATORS:
+                visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+def data_inputs(names):
+    """The price columns the indicators in `names` (and their dependencies) read."""
+    return {column for name in resolve(names) for column in INDICATORS[name].inputs
+            if column not in INDICATORS}
+
+
+def supported(names, columns):
+    """The indicators in `names` that can be computed from `columns`."""
+    return [name for name in names if data_inputs([name]) <= set(columns)]
+
+
+def output_columns(names):
+    """The output columns of the indicators in `names`."""
+    return [column for name in names for column in INDICATORS[name].outputs]
+
+
+def compute(data, names, params=None, dtype=np.float64):
+    """
+    Compute indicators and everything they depend on, each exactly once.
+
+    Args:
+        data: Mapping of price columns to arrays (a DataFrame works)
+        names (iterable): Indicators to compute
+        params (dict): Keyword arguments per indicator name, e.g.
+            {'atr': {'period': 20}}
+        dtype: Precision the price columns are read and the indicators
+            computed in (np.float32 for compact frames)
+
+    Returns:
+        dict: Output column -> array for the requested indicators
+    """
+    names = list(names)
+    params = params or {}
+    results = {}
+    arrays = {}
+    for name in resolve(names):
+        spec = INDICATORS[name]
+        args = []
+        for source in spec.inputs:
+            if source in INDICATORS:
+                args.append(results[source])
+            else:
+                if source not in arrays:
+                    arrays[source] = np.asarray(data[source], dtype=dtype)
+                args.append(arrays[source])
+        results[name] = spec.func(*args, **params.get(name, {}))
+
+    columns = {}
+    for name in names:
+        outputs = INDICATORS[name].outputs
+        if len(outputs) == 1:
+            columns[outputs[0]] = results[name]
+        else:
+            columns.update(zip(outputs, results[name]))
+    return columns
+
+
+# ---------------------------------------------------------------------------
+# Kernels
+# ---------------------------------------------------------------------------
+
+@indicator('rsi', inputs=('close',))
+def rsi(close, period=RSI_PERIOD, smoothing='wilder'):
+    """
+    Relative strength index.
+
+    Args:
+        close (array): Closing prices
+        period (int): Averaging period
+        smoothing (str): 'wilder' (Wilder's smoothing, the standard RSI) or
+            'simple' (rolling mean of the last `period` changes)
+
+    Returns:
+        array: RSI values; the first `period` values are NaN. A window without
+            losses is 100, a flat window 50.
+    """
+    if smoothing not in ('wilder', 'simple'):
+        raise ValueError(f"Unknown RSI smoothing: {smoothing}")
+    close = float_array(close)
+    out = np.full(len(close), np.nan, dtype=close.dtype)
+    if _rsi_compiled is not None:
+        return _rsi_compiled(close, period, smoothing == 'wilder', out)
+
+    # Without numba a Python loop would be slow, so the same averages are
+    # computed with array operations
+    if len(close) <= period:
+        return out
+    change = np.diff(close)
+    gain = np.maximum(change, 0.0)
+    loss = np.maximum(-change, 0.0)
+    average = wilder if smoothing == 'wilder' else rolling_mean
+    out[1:] = _rsi_from_averages(average(gain, period), average(loss, period))
+    return out
+
+
+class IncrementalRSI:
+    """
+    RSI updated one close at a time, matching rsi() on the same closes.
+
+    Wilder smoothing keeps only the two averages; simple smoothing also keeps
+    the last `period` changes.
+    """
+
+    def __init__(self, period=RSI_PERIOD, smoothing='wilder'):
+        if smoothing not in ('wilder', 'simple'):
+            raise ValueError(f"Unknown RSI smoothing: {smoothing}")
+        self.period = period
+        self.smoothing = smoothing
+        self.value = None
+        self._last_close = None
+        self._changes = deque(maxlen=period)
+        self._count = 0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+
+    def update(self, close):
+        """Add the next close and return the RSI (None during the warm-up)."""
+        close = float(close)
+        if self._last_close is None:
+            self._last_close = close
+            return None
+        change = close - self._last_close
+        self._last_close = close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        self._count += 1
+
+        if self._count <= self.period:
+            # Warm-up: sum the first `period` changes
+            self._avg_gain += gain
+            self._avg_loss += loss
+            self._changes.append(change)
+            if self._count < self.period:
+                return None
+            self._avg_gain /= self.period
+            self._avg_loss /= self.period
+        elif self.smoothing == 'wilder':
+            self._avg_gain += (gain - self._avg_gain) / self.period
+            self._avg_loss += (loss - self._avg_loss) / self.period
+        else:
+            dropped = self._changes[0]
+            self._changes.append(change)
+            self._avg_gain += (gain - (dropped if dropped > 0 else 0.0)) / self.period
+            self._avg_loss += (loss - (-dropped if dropped < 0 else 0.0)) / self.period
+            # No rounding residue once a side has no changes left in the window
+            if all(value <= 0 for value in self._changes):
+                self._avg_gain = 0.0
+            if all(value >= 0 for value in self._changes):
+                self._avg_loss = 0.0
+
+        if self._avg_loss > 0:
+            self.value = 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss)
+        else:
+            self.value = 100.0 if self._avg_gain > 0 else 50.0
+        return self.value
+
+
+@indicator('true_range', inputs=('high', 'low', 'close'))
+def true_range(high, low, close):
+    """True range; the first bar, without a previous close, uses high - low."""
+    tr = high - low
+    previous_close = close[:-1]
+    tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - previous_close),
+                                           np.abs(low[1:] - previous_close)))
+    return tr
+
+
+@indicator('directional_movement', inputs=('high', 'low'), outputs=('plus_dm', 'minus_dm'))
+def directional_movement(high, low):
+    """Wilder's +DM and -DM (0 on the first bar and on ties)."""
+    up = np.zeros(len(high), dtype=high.dtype)
+    down = np.zeros(len(low), dtype=low.dtype)
+    up[1:] = high[1:] - high[:-1]
+    down[1:] = low[:-1] - low[1:]
+    # Moves within rounding error of each other are a tie (neither counts),
+    # so float32 rounding of tied prices does not flip a bar's movement
+    tie = 4 * np.finfo(high.dtype).eps * np.abs(high)
+    plus_dm = np.where((up - down > tie) & (up > 0), up, 0.0)
+    minus_dm = np.where((down - up > tie) & (down > 0), down, 0.0)
+    return plus_dm, minus_dm
+
+
+@indicator('atr', inputs=('true_range',))
+def atr(tr, period=ATR_PERIOD):
+    """Average true range (Wilder)."""
+    return wilder(tr, period)
+
+
+@indicator('adx', inputs=('true_range', 'directional_movement'), outputs=('adx', 'plus_di', 'minus_di'))
+def adx(tr, dm, period=ADX_PERIOD):
+    """Average directional index with the +DI and -DI lines."""
+    plus_dm, minus_dm = dm
+    smoothed_tr = wilder(tr, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = np.where(smoothed_tr > 0, 100 * wilder(plus_dm, period) / smoothed_tr, 0.0)
+        minus_di = np.where(smoothed_tr > 0, 100 * wilder(minus_dm, period) / smoothed_tr, 0.0)
+        total = plus_di + minus_di
+        dx = np.where(total > 0, 100 * np.abs(plus_di - minus_di) / total, 0.0)
+    # The DI lines are NaN until the first smoothed true range
+    plus_di[:period - 1] = np.nan
+    minus_di[:period - 1] = np.nan
+    return wilder(dx, period, start=period - 1), plus_di, minus_di
+
+
+@indicator('stochastic', inputs=('high', 'low', 'close'), outputs=('stoch_k', 'stoch_d'))
+def stochastic(high, low, close, period=STOCHASTIC_PERIOD, smoothing=STOCHASTIC_SMOOTHING):
+    """Stochastic oscillator %K and its moving average %D (50 in flat ranges)."""
+    highest = rolling_max(high, period)
+    lowest = rolling_min(low, period)
+    price_range = highest - lowest
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.where(price_range > 0, 100 * (close - lowest) / price_range, 50.0)
+    k[np.isnan(price_range)] = np.nan
+    return k, rolling_mean(k, smoothing)
+
+
+@indicator('vwap', inputs=('high', 'low', 'close', 'volume'))
+def vwap(high, low, close, volume, period=VWAP_PERIOD):
+    """Rolling volume-weighted average of the typical price over `period` bars."""
+    typical = (high + low + close) / 3
+    traded = rolling_mean(typical * volume, period)
+    total = rolling_mean(volume, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total > 0, traded / total, np.nan)
+
+
+@indicator('ichimoku', inputs=('high', 'low'), outputs=('tenkan', 'kijun', 'senkou_a', 'senkou_b'))
+def ichimoku(high, low, periods=ICHIMOKU_PERIODS):
+    """
+    Ichimoku conversion (tenkan) and base (kijun) lines, and the cloud.
+
+    The senkou spans are shifted forward by the kijun period, so the values at
+    a bar are the cloud that bar trades against.
+    """
+    tenkan_period, kijun_period, span_b_period = periods
+    tenkan = _midpoint(high, low, tenkan_period)
+    kijun = _midpoint(high, low, kijun_period)
+    senkou_a = _shift((tenkan + kijun) / 2, kijun_period)
+    senkou_b = _shift(_midpoint(high, low, span_b_period), kijun_period)
+    return tenkan, kijun, senkou_a, senkou_b
@@ -0,0 +1,98 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally parse a JSON object as its text arrives in chunks.
+
+    Top-level members are decoded as soon as they are complete (i.e. once the
+    comma or closing brace that ends them has been received), so callers can
+    act on early fields before the rest of the object has been generated.
+    Any text before the opening brace (such as a markdown code fence) is
+    ignored, as is anything after the closing brace.
+
+    Each character is scanned once, so feeding a response costs O(n) overall.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.complete = False
+        self._text = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member = []
+
+    def feed(self, chunk):
+        """
+        Feed the next chunk of text.
+
+        Returns:
+            list: Names of the top-level fields completed by this chunk
+        """
+        completed = []
+        if not chunk or self.complete:
+            return completed
+        self._text.append(chunk)
+
+        member = self._member
+        for char in chunk:
+            if self.complete:
+                break
+            if self._depth == 0:
+                # Skip anything before the opening brace
+                if char == '{':
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                member.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._close_member())
+                    self.complete = True
+                    continue
+            elif char == ',' and self._depth == 1:
+                completed.extend(self._close_member())
+                continue
+            member.append(char)
+
+        return completed
+
+    def _close_member(self):
+        text = ''.join(self._member).strip()
+        self._member.clear()
+        if not text:
+            return []
+        try:
+            decoded = json.loads('{' + text + '}')
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping malformed JSON member: {text[:80]}")
+            return []
+        self.fields.update(decoded)
+        return list(decoded)
+
+    def has_fields(self, names):
+        """Return True once all of the given top-level fields have been parsed."""
+        return all(name in self.fields for name in names)
+
+    @property
+    def text(self):
+        """The raw text received so far."""
+        return ''.join(self._text)
@@ -0,0 +1,159 @@
+import os
+import glob
+import gzip
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class CompressedJSONLWriter:
+    """
+    Append-only, gzip-compressed, newline-delimited JSON log.
+
+    Records are queued by write() and written by a background thread in
+    batches, so callers never wait on file I/O. Each batch is appended to the
+    current segment as its own gzip member (gzip readers transparently
+    concatenate members). Segments are rotated once they exceed `max_bytes`,
+    and the oldest segments are removed beyond `max_segments` (0 keeps all).
+    Pending records are flushed when the process exits cleanly.
+    """
+
+    def __init__(self, directory, prefix, max_bytes=16 * 1024 * 1024, max_segments=0,
+                 flush_interval=1.0, max_batch=500):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._segment = None
+        self._segment_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"jsonl-{prefix}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        """Queue a record (a JSON-serializable dict) for writing."""
+        if self._closed:
+            logger.warning(f"Dropping record written to closed log {self.prefix}")
+            return
+        self._queue.put(record)
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        self._queue.join()
+
+    def rotate(self):
+        """
+        Start a new segment for the next batch.
+
+        Returns:
+            list: The segments written before the rotation, oldest first. They
+                receive no further records and can be consumed or moved.
+        """
+        with self._segment_lock:
+            self._segment = None
+            return list_segments(self.directory, self.prefix)
+
+    def close(self):
+        """Flush pending records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = []
+            stop = record is None
+            if not stop:
+                batch.append(record)
+            # Drain whatever else is already queued, up to the batch size
+            while not stop and len(batch) < self.max_batch:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                else:
+                    batch.append(record)
+
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error writing {len(batch)} records to {self.prefix} log: {str(e)}")
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        data = ''.join(json.dumps(record, default=str) + '\n' for record in batch).encode('utf-8')
+        with self._segment_lock:
+            path = self._current_segment()
+            with open(path, 'ab') as f:
+                f.write(gzip.compress(data))
+
+    def _current_segment(self):
+        if self._segment is None or not os.path.exists(self._segment) or \
+                os.path.getsize(self._segment) >= self.max_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{self.prefix}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.jsonl.gz"
+            self._segment = os.path.join(self.directory, name)
+            self._prune()
+        return self._segment
+
+    def _prune(self):
+        if not self.max_segments:
+            return
+        segments = list_segments(self.directory, self.prefix)
+        # Keep room for the segment about to be created
+        for path in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            try:
+                os.remove(path)
+                logger.info(f"Removed old log segment {path}")
+            except OSError as e:
+                logger.warning(f"Could not remove old log segment {path}: {str(e)}")
+
+
+def list_segments(directory, prefix):
+    """Return the log segments for `prefix`, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*.jsonl.gz")))
+
+
+def read_records(directory, prefix):
+    """Yield every record from the log segments for `prefix`, oldest first."""
+    for path in list_segments(directory, prefix):
+        yield from read_segment(path)
+
+
+def read_segment(path):
+    """Yield every record of one log segment."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    except (OSError, EOFError, json.JSONDecodeError) as e:
+        # A segment may be truncated if the process was killed mid-write
+        logger.warning(f"Stopped reading damaged log segment {path}: {str(e)}")
@@ -0,0 +1,288 @@
+import bisect
+import logging
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Detection settings
+PIVOT_WINDOW = 3  # A swing pivot is the highest high / lowest low within this many bars on each side
+LEVEL_TOLERANCE = 0.003  # Prices within 0.3% of each other form one level
+PROFILE_BINS = 40  # Price bins of the volume profile
+MAX_LEVELS = 6  # Strongest levels reported
+MIN_TOUCHES = 3  # Touches a level needs to count as the nearest support/resistance
+
+# Weights of the level score: touches + PIVOT_WEIGHT * pivots + VOLUME_WEIGHT * volume share
+PIVOT_WEIGHT = 2.0
+VOLUME_WEIGHT = 10.0
+
+
+def find_pivots(high, low, window=PIVOT_WINDOW):
+    """
+    Find swing pivots.
+
+    A bar is a pivot high if its high is the highest of the `window` bars on
+    either side (and likewise for pivot lows). Runs in O(n * window).
+
+    Returns:
+        tuple: (indices of pivot highs, indices of pivot lows)
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    span = 2 * window + 1
+    if len(high) < span:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    pivot_highs = np.flatnonzero(high[window:len(high) - window] >= sliding_window_view(high, span).max(axis=1))
+    pivot_lows = np.flatnonzero(low[window:len(low) - window] <= sliding_window_view(low, span).min(axis=1))
+    return pivot_highs + window, pivot_lows + window
+
+
+def volume_nodes(prices, volumes, bins=PROFILE_BINS):
+    """
+    High-volume nodes of the volume profile.
+
+    Volume is binned by price; bins that are local maxima with at least the
+    average volume are nodes.
+
+    Returns:
+        tuple: (node prices, share of total volume traded at each node)
+    """
+    prices = np.asarray(prices, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    total = volumes.sum()
+    if len(prices) == 0 or total <= 0:
+        return np.array([]), np.array([])
+    profile, edges = np.histogram(prices, bins=bins, weights=volumes)
+    padded = np.concatenate(([-1.0], profile, [-1.0]))
+    peaks = (profile >= padded[:-2]) & (profile >= padded[2:]) & (profile >= profile.mean()) & (profile > 0)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return centers[peaks], profile[peaks] / total
+
+
+def _cluster(prices, pivots, volume_shares, tolerance):
+    """
+    Merge candidate prices that lie within `tolerance` of their neighbour.
+
+    Sorting dominates, so clustering is O(m log m) in the number of candidates.
+
+    Returns:
+        tuple: (level prices, pivot counts, volume shares) per cluster
+    """
+    if len(prices) == 0:
+        return np.array([]), np.array([]), np.array([])
+    order = np.argsort(prices, kind='stable')
+    prices = prices[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(prices) > tolerance * prices[:-1]) + 1))
+    counts = np.diff(np.append(starts, len(prices)))
+    return (np.add.reduceat(prices, starts) / counts,
+            np.add.reduceat(pivots[order], starts),
+            np.add.reduceat(volume_shares[order], starts))
+
+
+def _count_touches(level, tolerance, sorted_lows, sorted_highs):
+    """Bars whose low-high range comes within `tolerance` of `level`."""
+    band = level * tolerance
+    # A bar misses the level if its low is above the band or its high below it
+    above = len(sorted_lows) - bisect.bisect_right(sorted_lows, level + band)
+    below = bisect.bisect_left(sorted_highs, level - band)
+    return len(sorted_lows) - above - below
+
+
+def _rank_levels(candidates, sorted_lows, sorted_highs, price, tolerance, max_levels):
+    """Cluster candidate levels, count touches, score and classify them."""
+    pivot_prices, node_prices, node_shares = candidates
+    prices = np.concatenate((pivot_prices, node_prices))
+    pivots = np.concatenate((np.ones(len(pivot_prices)), np.zeros(len(node_prices))))
+    shares = np.concatenate((np.zeros(len(pivot_prices)), node_shares))
+    level_prices, level_pivots, level_shares = _cluster(prices, pivots, shares, tolerance)
+
+    levels = []
+    for level, pivot_count, share in zip(level_prices, level_pivots, level_shares):
+        touches = _count_touches(level, tolerance, sorted_lows, sorted_highs)
+        levels.append({
+            'price': round(float(level), 5),
+            'type': 'support' if level < price else 'resistance',
+            'touches': int(touches),
+            'pivots': int(pivot_count),
+            'volume_share': round(float(share), 4),
+            'score': round(float(touches + PIVOT_WEIGHT * pivot_count + VOLUME_WEIGHT * share), 2)
+        })
+
+    # The nearest well-tested levels on either side of the price
+    tested = [level for level in levels if level['touches'] >= MIN_TOUCHES]
+    supports = [level for level in tested if level['type'] == 'support']
+    resistances = [level for level in tested if level['type'] == 'resistance']
+    support = max(supports, key=lambda level: level['price']) if supports else None
+    resistance = min(resistances, key=lambda level: level['price']) if resistances else None
+
+    # Report the nearest levels plus the strongest others
+    selected = [level for level in (support, resistance) if level]
+    for level in sorted(levels, key=lambda level: level['score'], reverse=True):
+        if len(selected) >= max_levels:
+            break
+        if level is not support and level is not resistance:
+            selected.append(level)
+
+    return {
+        'levels': sorted(selected, key=lambda level: level['price']),
+        'support': support['price'] if support else None,
+        'resistance': resistance['price'] if resistance else None
+    }
+
+
+def detect_levels(high, low, close, volume=None, window=PIVOT_WINDOW, tolerance=LEVEL_TOLERANCE,
+                  bins=PROFILE_BINS, max_levels=MAX_LEVELS):
+    """
+    Detect support and resistance levels in a price history.
+
+    Candidate levels are swing pivots and high-volume nodes of the volume
+    profile. Candidates within `tolerance` are merged, then every level is
+    scored by how many bars touched it, how many pivots formed it and how much
+    volume traded there. The whole detection is vectorized and runs in
+    O(n log n).
+
+    Args:
+        high, low, close (array-like): Bar highs, lows and closes
+        volume (array-like): Bar volumes (volume nodes are skipped without them)
+        window (int): Pivot window, in bars on each side
+        tolerance (float): Relative distance within which prices form one level
+        bins (int): Number of volume profile bins
+        max_levels (int): Maximum number of levels returned
+
+    Returns:
+        dict: 'levels' (the nearest and strongest levels sorted by price, each
+            with price, type, touches, pivots, volume_share and score), and the
+            nearest 'support' below and 'resistance' above the last close with
+            at least MIN_TOUCHES touches (or None)
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    if len(close) == 0:
+        return {'levels': [], 'support': None, 'resistance': None}
+
+    pivot_highs, pivot_lows = find_pivots(high, low, window)
+    pivot_prices = np.concatenate((high[pivot_highs], low[pivot_lows]))
+    if volume is not None:
+        node_prices, node_shares = volume_nodes((high + low + close) / 3, volume, bins)
+    else:
+        node_prices, node_shares = np.array([]), np.array([])
+
+    return _rank_levels((pivot_prices, node_prices, node_shares), np.sort(low), np.sort(high),
+                        close[-1], tolerance, max_levels)
+
+
+def suggest_stop_loss(detected, trade_type, entry_price, buffer=LEVEL_TOLERANCE):
+    """
+    Suggest a stop loss just beyond the nearest level protecting a trade.
+
+    Buys are protected by the nearest support below the entry, sells by the
+    nearest resistance above it. Returns None if there is no such level.
+    """
+    try:
+        entry_price = float(entry_price)
+    except (TypeError, ValueError):
+        return None
+    prices = [level['price'] for level in detected.get('levels', [])]
+    if str(trade_type).lower() in ('buy', 'call'):
+        below = [price for price in prices if price < entry_price]
+        return round(max(below) * (1 - buffer), 5) if below else None
+    above = [price for price in prices if price > entry_price]
+    return round(min(above) * (1 + buffer), 5) if above else None
+
+
+class LevelDetector:
+    """
+    Incrementally maintained support and resistance levels.
+
+    Feed bars one at a time with update(); levels() ranks the current levels
+    the same way detect_levels does. Pivots are confirmed `window` bars after
+    they form, lows, highs and pivots are kept in sorted lists (bisect) and
+    the volume profile uses fixed-width bins, so an update costs O(log n)
+    comparisons plus list insertion. Only the last `max_bars` bars are kept.
+    """
+
+    def __init__(self, window=PIVOT_WINDOW, tolerance=LEVEL_TOLERANCE, max_bars=5000, max_levels=MAX_LEVELS):
+        self.window = window
+        self.tolerance = tolerance
+        self.max_bars = max_bars
+        self.max_levels = max_levels
+        self.bin_size = None  # Set from the first price
+
+        self.bars = 0
+        self._recent = deque(maxlen=2 * window + 1)  # (index, high, low)
+        self._history = deque()  # (index, high, low, bin, volume) of kept bars
+        self._sorted_lows = []
+        self._sorted_highs = []
+        self._pivots = []  # Sorted pivot prices
+        self._pivot_bars = deque()  # (index, price) in bar order, for expiry
+        self._profile = {}  # bin -> volume
+        self._volume = 0.0
+        self.last_close = None
+
+    def update(self, high, low, close, volume=0.0):
+        """Add the next bar."""
+        index = self.bars
+        self.bars += 1
+        self.last_close = close
+        if self.bin_size is None:
+            self.bin_size = max(close * self.tolerance, 1e-12)
+
+        price_bin = int(((high + low + close) / 3) // self.bin_size)
+        self._history.append((index, high, low, price_bin, volume))
+        bisect.insort(self._sorted_lows, low)
+        bisect.insort(self._sorted_highs, high)
+        self._profile[price_bin] = self._profile.get(price_bin, 0.0) + volume
+        self._volume += volume
+
+        # The middle bar of the window is a pivot once `window` bars followed it
+        self._recent.append((index, high, low))
+        if len(self._recent) == self._recent.maxlen:
+            middle_index, middle_high, middle_low = self._recent[self.window]
+            if middle_high >= max(bar[1] for bar in self._recent):
+                self._add_pivot(middle_index, middle_high)
+            if middle_low <= min(bar[2] for bar in self._recent):
+                self._add_pivot(middle_index, middle_low)
+
+        while len(self._history) > self.max_bars:
+            self._expire(self._history.popleft())
+
+    def _add_pivot(self, index, price):
+        bisect.insort(self._pivots, price)
+        self._pivot_bars.append((index, price))
+
+    def _expire(self, bar):
+        index, high, low, price_bin, volume = bar
+        del self._sorted_lows[bisect.bisect_left(self._sorted_lows, low)]
+        del self._sorted_highs[bisect.bisect_left(self._sorted_highs, high)]
+        self._profile[price_bin] -= volume
+        if self._profile[price_bin] <= 0:
+            del self._profile[price_bin]
+        self._volume -= volume
+        while self._pivot_bars and self._pivot_bars[0][0] <= index:
+            _, price = self._pivot_bars.popleft()
+            del self._pivots[bisect.bisect_left(self._pivots, price)]
+
+    def _volume_nodes(self):
+        if self._volume <= 0 or not self._profile:
+            return np.array([]), np.array([])
+        average = self._volume / len(self._profile)
+        nodes = [(price_bin, volume) for price_bin, volume in self._profile.items()
+                 if volume >= average
+                 and volume >= self._profile.get(price_bin - 1, 0.0)
+                 and volume >= self._profile.get(price_bin + 1, 0.0)]
+        return (np.array([(price_bin + 0.5) * self.bin_size for price_bin, _ in nodes]),
+                np.array([volume / self._volume for _, volume in nodes]))
+
+    def levels(self):
+        """Return the current levels, in the format of detect_levels."""
+        if self.last_close is None:
+            return {'levels': [], 'support': None, 'resistance': None}
+        node_prices, node_shares = self._volume_nodes()
+        return _rank_levels((np.array(self._pivots), node_prices, node_shares),
+                            self._sorted_lows, self._sorted_highs, self.last_close,
+                            self.tolerance, self.max_levels)
@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import Future
+from rate_limit import TokenBucket
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Live status settings
+LIVE_STATUS_INTERVAL = float(os.environ.get("LIVE_STATUS_INTERVAL", "10"))  # Seconds between refreshes
+LIVE_STATUS_DURATION = float(os.environ.get("LIVE_STATUS_DURATION", "900"))  # Seconds a live message keeps updating
+LIVE_STATUS_EDIT_RATE = float(os.environ.get("LIVE_STATUS_EDIT_RATE", "20"))  # Edits per second across all chats (Telegram allows ~30 sends/s)
+LIVE_STATUS_MAX_WATCHERS = int(os.environ.get("LIVE_STATUS_MAX_WATCHERS", "5000"))  # Chats with a live message at once
+
+
+class _Watch:
+    __slots__ = ('chat_id', 'transport', 'message', 'text', 'updated', 'expires_at', 'pending')
+
+    def __init__(self, chat_id, transport, message, text, expires_at):
+        self.chat_id = chat_id
+        self.transport = transport
+        self.message = message
+        self.text = text  # As last delivered
+        self.updated = time.monotonic()
+        self.expires_at = expires_at
+        self.pending = None  # asyncio.Task of the edit being sent
+
+    def busy(self):
+        return self.pending is not None and not self.pending.done()
+
+
+class LiveBoard:
+    """
+    One message per chat, edited on a schedule to show a live view.
+
+    Every `interval` seconds one ticker fetches the view once for all
+    watching chats (`fetch`, an async function) and renders it
+    (`render(state, live)` returns the text and keyboard). A chat's message
+    is edited only if its text changed, and not while its previous edit is
+    still waiting to be sent, so a chat never has more than one edit
+    queued. Edits start at most `edit_rate` per second across all chats,
+    least recently updated first; the others wait for the next tick. With
+    many watchers the refresh slows down instead of exceeding Telegram's
+    limits or crowding out replies.
+
+    Messages stop updating after `duration` seconds, when stopped, when a
+    newer live message is started in the chat, or when an edit fails (e.g.
+    the message was deleted). They are then edited once more with
+    render(state, live=False).
+
+    The ticker runs on the event loop of the first watch() call and stops
+    while nobody is watching.
+    """
+
+    def __init__(self, name, fetch, render, interval=LIVE_STATUS_INTERVAL, duration=LIVE_STATUS_DURATION,
+                 edit_rate=LIVE_STATUS_EDIT_RATE, max_watchers=LIVE_STATUS_MAX_WATCHERS):
+        self.name = name
+        self.fetch = fetch
+        self.render = render
+        self.interval = interval
+        self.duration = duration
+        self.max_watchers = max_watchers
+        self._bucket = TokenBucket(edit_rate)
+        self._watches = {}  # chat_id -> _Watch
+        self._state = None  # Last fetched view
+        self._task = None
+        self._stats = {
+            'watched': 0,
+            'ticks': 0,
+            'edits': 0,
+            'unchanged': 0,
+            'busy': 0,
+            'deferred': 0,
+            'failed': 0,
+            'expired': 0,
+            'fetch_errors': 0
+        }
+
+    def has_room(self, chat_id):
+        """Whether a live message can be started in the chat."""
+        return chat_id in self._watches or len(self._watches) < self.max_watchers
+
+    async def watch(self, chat_id, transport, message, text, state=None):
+        """
+        Keep a message updated; it replaces the chat's previous live message.
+
+        Args:
+            chat_id: Chat of the message
+            transport: The command's Transport (see bot_commands), used for edit_sent
+            message: Handle of the sent message, as returned by reply or edit
+            text (str): Its current text
+            state: The view it shows, if just fetched
+
+        Returns:
+            bool: False if the board is full
+        """
+        if not self.has_room(chat_id):
+            return False
+        if state is not None:
+            self._state = state
+        previous = self._watches.pop(chat_id, None)
+        if previous is not None:
+            self._finish(previous)
+        self._watches[chat_id] = _Watch(chat_id, transport, message, text, time.monotonic() + self.duration)
+        self._stats['watched'] += 1
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return True
+
+    async def stop(self, chat_id):
+        """Stop the chat's live message; returns False if it had none."""
+        watch = self._watches.pop(chat_id, None)
+        if watch is None:
+            return False
+        self._finish(watch)
+        return True
+
+    def _finish(self, watch):
+        # Show the last view without the live controls
+        if self._state is None:
+            return
+        text, keyboard = self.render(self._state, live=False)
+        if watch.pending is not None:
+            watch.pending.cancel()
+        watch.pending = asyncio.ensure_future(self._edit(watch, text, keyboard))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._watches:
+                started = loop.time()
+                await self._tick()
+                await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+        except Exception as e:
+            logger.error(f"{self.name} live board stopped: {str(e)}")
+        finally:
+            self._task = None
+
+    async def _tick(self):
+        self._stats['ticks'] += 1
+        now = time.monotonic()
+        for chat_id, watch in list(self._watches.items()):
+            if watch.expires_at <= now:
+                del self._watches[chat_id]
+                self._stats['expired'] += 1
+                self._finish(watch)
+        if not self._watches:
+            return
+
+        try:
+            self._state = await self.fetch()
+        except Exception as e:
+            self._stats['fetch_errors'] += 1
+            logger.error(f"Error fetching the {self.name} live view: {str(e)}")
+            return
+        text, keyboard = self.render(self._state, live=True)
+
+        due = []
+        for watch in self._watches.values():
+            if watch.busy():
+                self._stats['busy'] += 1
+            elif watch.text == text:
+                self._stats['unchanged'] += 1
+            else:
+                due.append(watch)
+        due.sort(key=lambda watch: watch.updated)
+        for index, watch in enumerate(due):
+            if self._bucket.reserve():
+                self._stats['deferred'] += len(due) - index
+                break
+            watch.pending = asyncio.ensure_future(self._edit(watch, text, keyboard))
+
+    async def _edit(self, watch, text, keyboard):
+        try:
+            result = await watch.transport.edit_sent(watch.message, text, keyboard)
+            if isinstance(result, Future):
+                # The adapter queued the edit; done once it is delivered
+                await asyncio.wrap_future(result)
+            watch.text = text
+            watch.updated = time.monotonic()
+            self._stats['edits'] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats['failed'] += 1
+            logger.warning(f"Stopped a {self.name} live message after a failed edit: {str(e)}")
+            if self._watches.get(watch.chat_id) is watch:
+                del self._watches[watch.chat_id]
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            'watchers': len(self._watches),
+            'max_watchers': self.max_watchers,
+            'interval': self.interval,
+            'running': self._task is not None
+        })
+        return stats
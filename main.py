@@ -1,7 +1,7 @@
 import os
 import logging
 from app import app  # noqa: F401
-# Import the simplified Telegram bot instead
+# The python-telegram-bot 13 adapter of the bot commands (telegram_bot.py is the 20+ one)
 import telegram_bot_simple as telegram_bot
 import threading
 
@@ -22,7 +22,14 @@ def start_telegram_bot():
 
 if __name__ == "__main__":
     # Check if we have a Telegram token
-    if os.environ.get("TELEGRAM_TOKEN"):
+    if os.environ.get("TELEGRAM_TOKEN") and os.environ.get("TELEGRAM_WEBHOOK_URL"):
+        # Webhook mode: updates arrive on the web app's /telegram/webhook route, no polling loop
+        logger.info("TELEGRAM_WEBHOOK_URL found, receiving Telegram updates on the web app")
+        telegram_bot.set_webhook()
+        # Broadcasts run in this process only, scheduled now rather than on the first update
+        telegram_bot.start_broadcasts()
+        start_web_app()
+    elif os.environ.get("TELEGRAM_TOKEN"):
         logger.info("TELEGRAM_TOKEN found, starting both web app and Telegram bot")
         # Start web app in a separate thread
         web_thread = threading.Thread(target=start_web_app)
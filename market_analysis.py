@@ -6,12 +6,40 @@ from sklearn.ensemble import RandomForestClassifier
 import random
 import json
 import os
+import copy
+import glob
+import shutil
+import threading
+import concurrent.futures
+from analysis_pipeline import AnalysisContext, Pipeline, Stage
+import indicator_kernels
+from jsonl_log import CompressedJSONLWriter, read_segment
+import correlation
+import levels
+from single_flight import SingleFlight
+from write_behind import WriteBehindBuffer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('MarketAnalysis')
 
+# Write-behind persistence of analyses (batched off the request path)
+ANALYSIS_FLUSH_INTERVAL = float(os.environ.get("ANALYSIS_FLUSH_INTERVAL", "2"))  # Seconds between flushes
+ANALYSIS_FLUSH_BATCH = int(os.environ.get("ANALYSIS_FLUSH_BATCH", "50"))  # Pending saves that trigger a flush
+ANALYSIS_UPSERT_WINDOW = datetime.timedelta(minutes=10)  # Recent analyses are updated instead of duplicated
+
+# Analyses that could not be saved are appended to this log (see import_analysis_backup)
+ANALYSIS_BACKUP_DIR = os.environ.get("ANALYSIS_BACKUP_DIR", os.path.join("logs", "analysis_backup"))
+
+# Compact analysis frames (float32 prices and indicators, datetime64 dates),
+# see price_frame()
+ANALYSIS_COMPACT = os.environ.get("ANALYSIS_COMPACT", "0") == "1"
+
+# Concurrent and repeated requests for the same analysis share one run,
+# see shared_analysis()
+ANALYSIS_FRESHNESS = float(os.environ.get("ANALYSIS_FRESHNESS", "15"))  # Seconds a shared analysis is reused
+
 def get_historical_data(currency_pair, timeframe='1d', periods=100):
     """
     Get historical data for the specified currency pair and timeframe.
@@ -114,65 +142,156 @@ def get_historical_data(currency_pair, timeframe='1d', periods=100):
     logger.info(f"Generated {periods} periods of simulated data for {currency_pair}")
     return data
 
+# Indicator columns the analysis reads; rows are usable once all are set
+INDICATOR_COLUMNS = ['sma_5', 'sma_20', 'rsi', 'macd', 'macd_signal', 'upper_band', 'lower_band']
+
+# RSI settings ('wilder' smoothing is the standard RSI; 'simple' averages the
+# last RSI_PERIOD changes)
+RSI_PERIOD = 14
+RSI_SMOOTHING = 'wilder'
+
+# Indicators from indicator_kernels added to the analysis. They are not
+# needed by the ML features, so their longer warm-up (up to 77 bars for the
+# Ichimoku cloud) does not drop rows from the analysis.
+ANALYSIS_INDICATORS = ('atr', 'adx', 'stochastic', 'vwap', 'ichimoku')
+
+def price_frame(historical_data, compact=None):
+    """
+    Build the analysis DataFrame from get_historical_data() rows.
+
+    In compact mode prices are float32, volumes the smallest integer type
+    that holds them and dates datetime64[s], which roughly halves the memory
+    of a pair's history (more with string dates) and packs twice as many
+    values per cache line into the indicator kernels. calculate_indicators
+    keeps the indicators of a compact frame in float32 too.
+
+    Precision bounds in compact mode: float32 holds about 7 significant
+    digits, so prices are rounded to within 6e-8 of their value (under
+    0.01 pip for forex, about 0.004 for BTCUSD at 60000). Price-level
+    indicators (SMA, MACD, bands, ATR, VWAP, Ichimoku) stay within 1e-6 of
+    the price of the float64 values and oscillators (RSI, Stochastic, ADX)
+    within 0.001 points; recursive averages are accumulated in float64
+    (measured with `python benchmark.py compact`).
+
+    Args:
+        historical_data (list): Rows with date, open, high, low, close, volume
+        compact (bool): Use compact dtypes (defaults to ANALYSIS_COMPACT)
+    """
+    df = pd.DataFrame(historical_data)
+    if compact is None:
+        compact = ANALYSIS_COMPACT
+    if not compact:
+        return df
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d %H:%M:%S').astype('datetime64[s]')
+    for column in ('open', 'high', 'low', 'close'):
+        if column in df:
+            df[column] = df[column].astype(np.float32)
+    if 'volume' in df:
+        df['volume'] = pd.to_numeric(df['volume'], downcast='integer' if df['volume'].dtype.kind in 'iu' else 'float')
+    return df
+
+def is_compact(df):
+    """Whether `df` is a compact (float32) analysis frame."""
+    return df['close'].dtype == np.float32
+
 def calculate_indicators(df):
     """Calculate technical indicators on the price data."""
+    close = df['close']
+    compact = is_compact(df)
+    
     # Short and long moving averages
-    df['sma_5'] = df['close'].rolling(window=5).mean()
-    df['sma_20'] = df['close'].rolling(window=20).mean()
+    df['sma_5'] = close.rolling(window=5).mean()
+    sma_20 = close.rolling(window=20).mean()
+    df['sma_20'] = sma_20
     
     # Relative Strength Index (RSI)
-    delta = df['close'].diff()
-    gain = delta.where(delta > 0, 0).fillna(0)
-    loss = -delta.where(delta < 0, 0).fillna(0)
+    df['rsi'] = indicator_kernels.rsi(close.to_numpy(), RSI_PERIOD, RSI_SMOOTHING)
     
-    avg_gain = gain.rolling(window=14).mean()
-    avg_loss = loss.rolling(window=14).mean()
+    # Moving Average Convergence Divergence (MACD)
+    ema_12 = close.ewm(span=12, adjust=False).mean()
+    ema_26 = close.ewm(span=26, adjust=False).mean()
+    macd = ema_12 - ema_26
+    macd_signal = macd.ewm(span=9, adjust=False).mean()
+    df['macd'] = macd
+    df['macd_signal'] = macd_signal
+    df['macd_hist'] = macd - macd_signal
     
-    rs = avg_gain / avg_loss
-    df['rsi'] = 100 - (100 / (1 + rs))
+    # Bollinger Bands (reusing the 20-period SMA)
+    std_20 = close.rolling(window=20).std()
+    df['upper_band'] = sma_20 + (std_20 * 2)
+    df['lower_band'] = sma_20 - (std_20 * 2)
     
-    # Moving Average Convergence Divergence (MACD)
-    df['ema_12'] = df['close'].ewm(span=12, adjust=False).mean()
-    df['ema_26'] = df['close'].ewm(span=26, adjust=False).mean()
-    df['macd'] = df['ema_12'] - df['ema_26']
-    df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
-    df['macd_hist'] = df['macd'] - df['macd_signal']
-    
-    # Bollinger Bands
-    df['sma_20'] = df['close'].rolling(window=20).mean()
-    df['std_20'] = df['close'].rolling(window=20).std()
-    df['upper_band'] = df['sma_20'] + (df['std_20'] * 2)
-    df['lower_band'] = df['sma_20'] - (df['std_20'] * 2)
+    # ATR, ADX, Stochastic, VWAP and Ichimoku (shared inputs are computed once)
+    names = indicator_kernels.supported(ANALYSIS_INDICATORS, df.columns)
+    dtype = np.float32 if compact else np.float64
+    for column, values in indicator_kernels.compute(df, names, dtype=dtype).items():
+        df[column] = values
+    
+    # pandas rolling and ewm compute in float64; store them in float32 too
+    if compact:
+        for column in ('sma_5', 'sma_20', 'macd', 'macd_signal', 'macd_hist', 'upper_band', 'lower_band'):
+            df[column] = df[column].astype(np.float32)
     
     return df
 
 def prepare_features(df):
-    """Prepare features for the ML model."""
-    # Calculate price changes
-    df['price_change'] = df['close'].pct_change()
-    df['price_change_1d'] = df['close'].pct_change(periods=1)
-    df['price_change_5d'] = df['close'].pct_change(periods=5)
-    
-    # Calculate indicator-based features
-    df['above_sma_20'] = (df['close'] > df['sma_20']).astype(int)
-    df['sma_cross'] = ((df['sma_5'] > df['sma_20']) & 
-                      (df['sma_5'].shift(1) <= df['sma_20'].shift(1))).astype(int)
-    
-    df['rsi_overbought'] = (df['rsi'] > 70).astype(int)
-    df['rsi_oversold'] = (df['rsi'] < 30).astype(int)
-    
-    df['macd_cross_up'] = ((df['macd'] > df['macd_signal']) & 
-                          (df['macd'].shift(1) <= df['macd_signal'].shift(1))).astype(int)
-    df['macd_cross_down'] = ((df['macd'] < df['macd_signal']) & 
-                            (df['macd'].shift(1) >= df['macd_signal'].shift(1))).astype(int)
-    
-    # Volatility features
-    df['volatility'] = df['std_20'] / df['sma_20']
+    """
+    Drop the rows whose indicators are not yet defined.
+
+    The leading rows (before the indicator windows fill up) are sliced off
+    without copying the frame. The ML features are only needed for the
+    latest row, see latest_features().
+    """
+    valid = df[INDICATOR_COLUMNS].notna().all(axis=1).to_numpy()
+    if valid.all():
+        return df
+    first = int(valid.argmax())
+    if valid[first:].all():
+        return df.iloc[first:]
+    return df[valid]
+
+def native_float(value):
+    """
+    Convert a NumPy scalar to a Python float.
+
+    float32 values (compact frames) go through their shortest decimal form,
+    so 1.1 stays 1.1 instead of becoming 1.100000023841858.
+    """
+    if isinstance(value, np.float32):
+        return float(str(value))
+    return float(value)
+
+def latest_values(df, columns=('close', 'high', 'low') + tuple(INDICATOR_COLUMNS)):
+    """Return the latest row's values for `columns` as native floats."""
+    return {column: native_float(df[column].iat[-1]) for column in columns}
+
+def latest_features(df):
+    """Compute the ML features for the latest row only."""
+    close = df['close'].to_numpy()
+    sma_5 = df['sma_5'].to_numpy()
+    sma_20 = df['sma_20'].to_numpy()
+    macd = df['macd'].to_numpy()
+    macd_signal = df['macd_signal'].to_numpy()
+    latest = latest_values(df)
     
-    # Clean up any NaN values
-    df = df.dropna()
+    # Calculate price changes
+    price_change = close[-1] / close[-2] - 1 if len(close) > 1 else 0.0
     
-    return df
+    return {
+        'price_change': price_change,
+        'price_change_1d': price_change,
+        'price_change_5d': close[-1] / close[-6] - 1 if len(close) > 5 else 0.0,
+        # Calculate indicator-based features
+        'above_sma_20': int(latest['close'] > latest['sma_20']),
+        'sma_cross': int(len(close) > 1 and sma_5[-1] > sma_20[-1] and sma_5[-2] <= sma_20[-2]),
+        'rsi_overbought': int(latest['rsi'] > 70),
+        'rsi_oversold': int(latest['rsi'] < 30),
+        'macd_cross_up': int(len(close) > 1 and macd[-1] > macd_signal[-1] and macd[-2] <= macd_signal[-2]),
+        'macd_cross_down': int(len(close) > 1 and macd[-1] < macd_signal[-1] and macd[-2] >= macd_signal[-2]),
+        # Volatility features (the bands are 2 standard deviations from the SMA)
+        'volatility': (latest['upper_band'] - latest['lower_band']) / 4 / latest['sma_20']
+    }
 
 def predict_market_direction(df):
     """
@@ -183,7 +302,7 @@ def predict_market_direction(df):
     # based on the technical indicators
     
     # Get the latest data point
-    latest = df.iloc[-1]
+    latest = latest_values(df)
     
     # Calculate a market sentiment score based on indicators
     sentiment_score = 0
@@ -230,7 +349,441 @@ def predict_market_direction(df):
         
     return prediction, confidence
 
-def analyze_market(currency_pair, timeframe='1d', use_ai=True):
+_analysis_writer = None
+_analysis_writer_lock = threading.Lock()
+_saved_analyses = {}  # (currency_pair, timeframe) -> Future of the latest save
+
+_backup_log = None
+
+def _create_backup_log():
+    # Called with _analysis_writer_lock held
+    global _backup_log
+    if _backup_log is None:
+        _backup_log = CompressedJSONLWriter(ANALYSIS_BACKUP_DIR, 'analyses')
+    return _backup_log
+
+def _get_backup_log():
+    with _analysis_writer_lock:
+        return _create_backup_log()
+
+def backup_analysis(analysis):
+    """Append an analysis to the backup log (written in the background)."""
+    _get_backup_log().write(analysis)
+
+def _parse_analysis_timestamp(value):
+    try:
+        return datetime.datetime.strptime(str(value), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return datetime.datetime.fromisoformat(str(value))
+
+def import_analysis_backup(legacy_dir='.'):
+    """
+    Replay backed-up analyses into the MarketAnalysis table.
+
+    Reads the closed segments of the backup log, plus any legacy
+    analysis_<pair>_<timestamp>.json files in `legacy_dir`. Analyses already
+    in the table (same pair, timeframe and timestamp) are skipped. Imported
+    files are moved to the `imported` folder of ANALYSIS_BACKUP_DIR.
+
+    Returns:
+        dict: Counts of imported and skipped analyses and processed files
+    """
+    from app import db, with_app_context
+    from models import MarketAnalysis
+
+    segments = _get_backup_log().rotate()
+    legacy_files = sorted(glob.glob(os.path.join(legacy_dir, 'analysis_*.json')))
+
+    analyses = []
+    for path in segments:
+        analyses.extend(read_segment(path))
+    for path in legacy_files:
+        try:
+            with open(path) as f:
+                analyses.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Skipping unreadable analysis file {path}: {str(e)}")
+
+    @with_app_context
+    def import_records():
+        records = {}
+        for analysis in analyses:
+            try:
+                key = (analysis['currency_pair'], analysis['timeframe'],
+                       _parse_analysis_timestamp(analysis['timestamp']))
+                records[key] = MarketAnalysis(
+                    currency_pair=analysis['currency_pair'],
+                    timeframe=analysis['timeframe'],
+                    trend=str(analysis['trend']),
+                    strength=float(analysis['strength']),
+                    support=float(analysis['support']),
+                    resistance=float(analysis['resistance']),
+                    recommendation=str(analysis['recommendation']),
+                    confidence=float(analysis['confidence']),
+                    current_price=float(analysis['current_price']),
+                    timestamp=key[2]
+                )
+                records[key].set_indicators(analysis.get('indicators', {}))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping invalid backed-up analysis: {str(e)}")
+
+        if records:
+            existing = MarketAnalysis.query.filter(
+                MarketAnalysis.currency_pair.in_({key[0] for key in records}),
+                MarketAnalysis.timestamp.in_({key[2] for key in records})
+            ).all()
+            for record in existing:
+                records.pop((record.currency_pair, record.timeframe, record.timestamp), None)
+
+        db.session.add_all(records.values())
+        db.session.commit()
+        # Invalid, duplicate and already imported analyses are skipped
+        return len(records), len(analyses) - len(records)
+
+    imported, skipped = import_records()
+
+    # Only move files once their analyses are committed
+    imported_dir = os.path.join(ANALYSIS_BACKUP_DIR, 'imported')
+    os.makedirs(imported_dir, exist_ok=True)
+    for path in segments + legacy_files:
+        shutil.move(path, os.path.join(imported_dir, os.path.basename(path)))
+
+    logger.info(f"Imported {imported} backed-up analyses ({skipped} skipped) from {len(segments) + len(legacy_files)} files")
+    return {
+        'imported': imported,
+        'skipped': skipped,
+        'files': len(segments) + len(legacy_files)
+    }
+
+def _write_analyses(batch):
+    """
+    Upsert a batch of analyses into the MarketAnalysis table in one transaction.
+
+    An analysis updates the most recent record for its pair and timeframe if
+    that record is less than ANALYSIS_UPSERT_WINDOW old, otherwise a new record
+    is created. Returns the record ids in batch order.
+    """
+    try:
+        from app import db, with_app_context
+        from models import MarketAnalysis
+
+        @with_app_context
+        def save_to_database():
+            oldest = min(payload['timestamp'] for _, payload in batch) - ANALYSIS_UPSERT_WINDOW
+            pairs = {currency_pair for (currency_pair, _), _ in batch}
+
+            # One query for the recent records of every pair in the batch
+            recent = MarketAnalysis.query.filter(
+                MarketAnalysis.currency_pair.in_(pairs),
+                MarketAnalysis.timestamp > oldest
+            ).order_by(
+                MarketAnalysis.timestamp.desc()
+            ).all()
+            latest = {}
+            for record in recent:
+                latest.setdefault((record.currency_pair, record.timeframe), record)
+
+            records = []
+            for (currency_pair, timeframe), payload in batch:
+                analysis = payload['analysis']
+                now = payload['timestamp']
+                analysis_record = latest.get((currency_pair, timeframe))
+                if analysis_record is None or analysis_record.timestamp <= now - ANALYSIS_UPSERT_WINDOW:
+                    analysis_record = MarketAnalysis(
+                        currency_pair=currency_pair,
+                        timeframe=timeframe
+                    )
+                    db.session.add(analysis_record)
+
+                analysis_record.trend = str(analysis['trend'])
+                analysis_record.strength = float(analysis['strength'])
+                analysis_record.support = analysis['support']
+                analysis_record.resistance = analysis['resistance']
+                analysis_record.recommendation = str(analysis['recommendation'])
+                analysis_record.confidence = float(analysis['confidence'])
+                analysis_record.current_price = analysis['current_price']
+                analysis_record.timestamp = now
+                analysis_record.set_indicators(analysis['indicators'])
+                records.append(analysis_record)
+
+            db.session.commit()
+            logger.info(f"Analytics data saved successfully to database ({len(records)} analyses)")
+            return [record.id for record in records]
+
+        return save_to_database()
+
+    except Exception as e:
+        logger.warning(f"Could not save analytics data to database: {str(e)}")
+        for _, payload in batch:
+            backup_analysis(payload['analysis'])
+        logger.info(f"Analytics data appended to backup log in {ANALYSIS_BACKUP_DIR}")
+        raise
+
+def _get_analysis_writer():
+    global _analysis_writer
+    with _analysis_writer_lock:
+        if _analysis_writer is None:
+            # The backup log is created first so it is closed last at exit
+            # (atexit runs in reverse order): the buffer's final flush can
+            # still fall back to it
+            _create_backup_log()
+            _analysis_writer = WriteBehindBuffer('market_analysis', _write_analyses,
+                                                 max_batch=ANALYSIS_FLUSH_BATCH,
+                                                 flush_interval=ANALYSIS_FLUSH_INTERVAL)
+        return _analysis_writer
+
+def save_analysis(analysis, timestamp):
+    """
+    Queue an analysis to be saved to the database in the background.
+
+    Repeated saves for the same pair and timeframe before the next flush are
+    coalesced into a single write.
+
+    Returns:
+        Future: Resolves with the MarketAnalysis record id
+    """
+    key = (analysis['currency_pair'], analysis['timeframe'])
+    future = _get_analysis_writer().submit(key, {'analysis': dict(analysis), 'timestamp': timestamp})
+    _saved_analyses[key] = future
+    return future
+
+def saved_analysis_id(currency_pair, timeframe='1d', timeout=5.0):
+    """
+    Return the database id of the latest analysis saved for a pair and timeframe.
+
+    Flushes the pending save if needed. Returns None if nothing was saved or
+    the save failed.
+    """
+    future = _saved_analyses.get((currency_pair, timeframe))
+    if future is None:
+        return None
+    if not future.done():
+        _get_analysis_writer().flush(wait=False)
+    try:
+        return future.result(timeout=timeout)
+    except Exception as e:
+        logger.warning(f"No saved analysis id for {currency_pair} {timeframe}: {str(e)}")
+        return None
+
+def analysis_writer_stats():
+    """Return statistics of the background analysis writer."""
+    return _get_analysis_writer().stats()
+
+# Analysis pipeline stages. Each stage reads the values earlier stages set on
+# the AnalysisContext and adds its own.
+
+def _stage_fetch_data(context):
+    """Get historical data."""
+    context.historical_data = get_historical_data(context.currency_pair, context.timeframe)
+    if context.timeframe == '1d':
+        # New daily closes keep the shared correlation matrix current
+        correlation.observe_daily_bars(context.currency_pair, context.historical_data)
+
+def _stage_indicators(context):
+    """Convert to DataFrame and calculate technical indicators."""
+    context.df = calculate_indicators(price_frame(context.historical_data, context.options.get('compact')))
+    # Keep the full history (features drop the warm-up rows)
+    context.prices = context.df
+
+def _stage_features(context):
+    """Prepare features for prediction."""
+    context.df = prepare_features(context.df)
+    context.features = latest_features(context.df)
+
+def _stage_predict(context):
+    """Make the local prediction and compile the latest indicator values."""
+    df = context.df
+    context.recommendation, context.confidence = predict_market_direction(df)
+    
+    # Latest price data
+    latest = latest_values(df)
+    context.latest = latest
+    context.current_price = latest['close']
+    
+    # Compile indicators
+    context.indicators = {
+        'rsi': round(latest['rsi'], 2),
+        'macd': round(latest['macd'], 5),
+        'macd_signal': round(latest['macd_signal'], 5),
+        'sma_20': round(latest['sma_20'], 5),
+        'upper_band': round(latest['upper_band'], 5),
+        'lower_band': round(latest['lower_band'], 5)
+    }
+    context.indicators.update(kernel_indicator_values(df))
+
+def kernel_indicator_values(df):
+    """
+    Latest values of the ANALYSIS_INDICATORS columns in `df`, rounded.
+
+    Oscillators (ADX, DI, Stochastic) are rounded to 2 decimals and price
+    levels to 5; values still in their warm-up period are None.
+    """
+    columns = [column for column in indicator_kernels.output_columns(ANALYSIS_INDICATORS) if column in df]
+    values = {}
+    for column, value in latest_values(df, columns).items():
+        if np.isnan(value):
+            values[column] = None
+        else:
+            values[column] = round(value, 2 if column in ('adx', 'plus_di', 'minus_di', 'stoch_k', 'stoch_d') else 5)
+    return values
+
+def _stage_trend(context):
+    """Determine trend and its strength."""
+    latest = context.latest
+    if latest['sma_5'] > latest['sma_20'] and latest['close'] > latest['sma_20']:
+        context.trend = 'bullish'
+        context.strength = min(50 + 10 * (latest['rsi'] - 50), 95) if latest['rsi'] > 50 else 50
+    elif latest['sma_5'] < latest['sma_20'] and latest['close'] < latest['sma_20']:
+        context.trend = 'bearish'
+        context.strength = min(50 + 10 * (50 - latest['rsi']), 95) if latest['rsi'] < 50 else 50
+    else:
+        context.trend = 'neutral'
+        context.strength = 50
+
+def detect_levels(df):
+    """Detect support and resistance levels in a price DataFrame (see levels.detect_levels)."""
+    return levels.detect_levels(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy(),
+                                df['volume'].to_numpy() if 'volume' in df else None)
+
+def _stage_levels(context):
+    """Support and resistance levels."""
+    detected = detect_levels(context.prices)
+    context.levels = detected['levels']
+    
+    # Without a tested level on one side, fall back to the recent extremes
+    recent_data = context.df.tail(20)
+    context.support = detected['support'] or recent_data['low'].min() * 0.998  # Slightly below recent lows
+    context.resistance = detected['resistance'] or recent_data['high'].max() * 1.002  # Slightly above recent highs
+
+def _stage_ai(context):
+    """Enhance the analysis with Groq AI if available."""
+    context.ai_analysis = None
+    try:
+        import groq_ai
+        
+        # Only proceed if we have a Groq API key
+        if not os.environ.get("GROQ_API_KEY"):
+            return
+        
+        # Create initial analysis dict for AI
+        initial_analysis = {
+            'currency_pair': context.currency_pair,
+            'timeframe': context.timeframe,
+            'current_price': float(context.current_price),
+            'trend': context.trend,
+            'strength': float(context.strength),
+            'support': float(round(context.support, 5)),
+            'resistance': float(round(context.resistance, 5)),
+            'recommendation': context.recommendation,
+            'confidence': float(context.confidence),
+            'indicators': context.indicators,
+            'levels': context.get('levels', [])
+        }
+        
+        # Get AI analysis
+        if context.options.get('ai_decision_only'):
+            streaming = groq_ai.analyze_market_with_ai_stream(initial_analysis, context.currency_pair)
+            try:
+                # Time for the streamed answer and an escalation to the strong model
+                ai_analysis = streaming.decision.result(timeout=2 * groq_ai.GROQ_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                # A stalled stream: keep the local analysis instead of holding this thread
+                logger.warning(f"AI decision for {context.currency_pair} timed out after {2 * groq_ai.GROQ_TIMEOUT:g}s")
+                ai_analysis = groq_ai._market_analysis_fallback("AI decision timed out")
+            else:
+                if not streaming.result.done():
+                    # Reasoning is still being generated
+                    ai_analysis['ai_partial'] = True
+        else:
+            ai_analysis = groq_ai.analyze_market_with_ai(initial_analysis, context.currency_pair)
+        context.ai_analysis = ai_analysis
+        
+        # Enhance our analysis with AI insights if available
+        if ai_analysis and not ai_analysis.get('ai_error', False):
+            # Update with AI recommendations if confidence is higher
+            if ai_analysis.get('confidence', 0) > context.confidence:
+                context.recommendation = ai_analysis.get('recommendation', context.recommendation)
+                context.confidence = ai_analysis.get('confidence', context.confidence)
+                context.trend = ai_analysis.get('trend', context.trend)
+                context.strength = ai_analysis.get('strength', context.strength)
+                
+            logger.info(f"Enhanced analysis with Groq AI: {context.recommendation} ({context.confidence}%)")
+        
+    except ImportError:
+        logger.warning("Groq AI module not available")
+    except Exception as ai_error:
+        logger.error(f"Error using Groq AI for analysis: {str(ai_error)}")
+
+def _historical_points(df, periods=30):
+    """The last `periods` dates and closes, converted to native types in bulk."""
+    tail = df.iloc[-periods:]
+    dates = tail['date']
+    if dates.dtype.kind == 'M':
+        # Compact frames keep datetime64 dates
+        dates = dates.dt.strftime('%Y-%m-%d %H:%M:%S')
+    closes = tail['close']
+    closes = [native_float(close) for close in closes.to_numpy()] if closes.dtype == np.float32 else closes.tolist()
+    return [{'date': date, 'close': close}
+            for date, close in zip(dates.tolist(), closes)]
+
+def _stage_serialize(context):
+    """Compile the analysis result."""
+    ai_analysis = context.get('ai_analysis')
+    
+    # Indicator values are already native floats (see latest_values)
+    clean_indicators = dict(context.indicators)
+    
+    # Add AI insights to indicators if available
+    if ai_analysis:
+        clean_indicators['ai_reasoning'] = ai_analysis.get('reasoning', '')
+        clean_indicators['ai_risk_assessment'] = ai_analysis.get('risk_assessment', '')
+        clean_indicators['ai_timeframe'] = ai_analysis.get('timeframe', '')
+        if 'key_factors' in ai_analysis:
+            clean_indicators['ai_key_factors'] = str(ai_analysis['key_factors'])
+    
+    # Compile analysis results for return
+    context.saved_at = datetime.datetime.utcnow().replace(microsecond=0)
+    analysis = {
+        'currency_pair': context.currency_pair,
+        'timeframe': context.timeframe,
+        'timestamp': context.saved_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'current_price': float(context.current_price),
+        'trend': context.trend,
+        'strength': float(context.strength),
+        'support': float(round(context.support, 5)),
+        'resistance': float(round(context.resistance, 5)),
+        'recommendation': context.recommendation,
+        'confidence': float(context.confidence),
+        'indicators': clean_indicators,
+        'levels': context.get('levels', []),
+        'historical_data': _historical_points(context.df)
+    }
+    
+    # Add AI analysis if available
+    if ai_analysis:
+        analysis['ai_analysis'] = ai_analysis
+    context.analysis = analysis
+
+def _stage_persist(context):
+    """Save the analysis to the database in the background (see saved_analysis_id)."""
+    context.saved = save_analysis(context.analysis, context.saved_at)
+
+# The analyze_market pipeline. Stages can be swapped with
+# ANALYSIS_PIPELINE.replace(name, func), cached with
+# ANALYSIS_PIPELINE.configure(name, cache_ttl=...) and skipped per call.
+ANALYSIS_PIPELINE = Pipeline('analyze_market', [
+    Stage('fetch_data', _stage_fetch_data, provides=('historical_data',)),
+    Stage('indicators', _stage_indicators, provides=('df', 'prices')),
+    Stage('features', _stage_features, provides=('df', 'features')),
+    Stage('predict', _stage_predict, provides=('recommendation', 'confidence', 'latest', 'current_price', 'indicators')),
+    Stage('trend', _stage_trend, provides=('trend', 'strength')),
+    Stage('levels', _stage_levels, provides=('levels', 'support', 'resistance')),
+    Stage('ai', _stage_ai, skip_if=lambda context: not context.options.get('use_ai')),
+    Stage('serialize', _stage_serialize),
+    Stage('persist', _stage_persist)
+])
+
+def analyze_market(currency_pair, timeframe='1d', use_ai=True, ai_decision_only=False, skip=(), compact=None):
     """
     Analyze the market for the specified currency pair and timeframe.
     Returns a comprehensive analysis including trend, support/resistance, and recommendations.
@@ -239,239 +792,268 @@ def analyze_market(currency_pair, timeframe='1d', use_ai=True):
         currency_pair (str): The currency pair to analyze (e.g., 'EURUSD')
         timeframe (str): The timeframe for analysis (e.g., '1d', '4h', '1h')
         use_ai (bool): Whether to use Groq AI for enhanced analysis
+        ai_decision_only (bool): Stream the AI response and return as soon as its
+            decision fields arrive, without waiting for the reasoning text
+        skip (iterable): Names of ANALYSIS_PIPELINE stages to skip (e.g. 'persist')
+        compact (bool): Analyze a compact float32 frame (see price_frame);
+            defaults to ANALYSIS_COMPACT
         
     Returns:
-        dict: A comprehensive market analysis
+        dict: A comprehensive market analysis. It is saved to the database in
+            the background; use saved_analysis_id() for its record id.
     """
     logger.info(f"Analyzing market for {currency_pair} on {timeframe} timeframe")
     
     try:
-        # Get historical data
-        historical_data = get_historical_data(currency_pair, timeframe)
-        
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(historical_data)
-        
-        # Calculate technical indicators
-        df = calculate_indicators(df)
+        context = AnalysisContext(currency_pair, timeframe, use_ai=use_ai, ai_decision_only=ai_decision_only,
+                                  compact=compact)
+        ANALYSIS_PIPELINE.run(context, skip=skip)
+        return context.analysis
         
-        # Prepare features for prediction
-        df = prepare_features(df)
-        
-        # Make prediction
-        recommendation, confidence = predict_market_direction(df)
-        
-        # Latest price data
-        latest = df.iloc[-1]
-        current_price = latest['close']
-        
-        # Determine trend
-        if latest['sma_5'] > latest['sma_20'] and latest['close'] > latest['sma_20']:
-            trend = 'bullish'
-            strength = min(50 + 10 * (latest['rsi'] - 50), 95) if latest['rsi'] > 50 else 50
-        elif latest['sma_5'] < latest['sma_20'] and latest['close'] < latest['sma_20']:
-            trend = 'bearish'
-            strength = min(50 + 10 * (50 - latest['rsi']), 95) if latest['rsi'] < 50 else 50
-        else:
-            trend = 'neutral'
-            strength = 50
-            
-        # Support and resistance levels
-        # In a real system, these would be calculated using more sophisticated methods
-        # For this demo, we'll use a simplified approach based on recent highs/lows
-        recent_data = df.tail(20)
-        
-        # Support: a level where price has bounced up multiple times
-        # We'll use a simple calculation based on recent lows
-        support = recent_data['low'].min() * 0.998  # Slightly below recent lows
+    except Exception as e:
+        logger.error(f"Error in market analysis: {str(e)}")
+        raise Exception(f"Market analysis failed: {str(e)}")
+
+# Multi-timeframe analysis: (timeframe, hours per bar) from lowest to highest.
+# Every timeframe is resampled from one series of base (hourly) bars.
+MTF_TIMEFRAMES = (('1h', 1), ('4h', 4), ('1d', 24))
+MTF_WEIGHTS = {'1h': 1, '4h': 2, '1d': 3}  # Higher timeframes weigh more in the confluence score
+MTF_BARS = 100  # Bars of the highest timeframe
+MTF_THRESHOLD = 30  # Confluence score needed for a buy or sell
+
+SIGNAL_DIRECTIONS = {'buy': 1, 'sell': -1, 'bullish': 1, 'bearish': -1}
+
+def resample_frame(df, hours):
+    """
+    Aggregate hourly price bars into bars of `hours` hours.
+
+    A leading partial bar is dropped; the last (still forming) bar is kept,
+    as it is for the base timeframe.
+    """
+    if hours == 1:
+        return df
+    dates = df['date'] if df['date'].dtype.kind == 'M' else pd.to_datetime(df['date'], format='%Y-%m-%d %H:%M:%S')
+    grouped = df.drop(columns='date').set_index(dates.rename('bar')).resample(f"{hours}h")
+    bars = grouped.agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    counts = grouped['close'].count()
+    bars = bars[counts > 0]
+    if len(bars) > 1 and counts[counts > 0].iloc[0] < hours:
+        bars = bars.iloc[1:]
+    bars.insert(0, 'date', bars.index if df['date'].dtype.kind == 'M' else bars.index.strftime('%Y-%m-%d %H:%M:%S'))
+    return bars.reset_index(drop=True)
+
+def confluence(results, weights=None, threshold=MTF_THRESHOLD):
+    """
+    Combine per-timeframe results into one score and recommendation.
+
+    Each timeframe's signal is the average of its recommendation (buy +1,
+    sell -1, hold 0, times its confidence) and its trend (bullish +1,
+    bearish -1, neutral 0, times its strength). The confluence score is the
+    weighted average of the signals, from -100 (all bearish) to +100.
+
+    Args:
+        results (dict): timeframe -> dict with trend, strength, recommendation
+            and confidence
+        weights (dict): timeframe -> weight (defaults to MTF_WEIGHTS)
+        threshold (float): Score needed for a buy or sell
+
+    Returns:
+        dict: score, recommendation, confidence, trend, strength and whether
+            the trends of all timeframes are aligned
+    """
+    weights = weights or MTF_WEIGHTS
+    total = 0.0
+    weight_sum = 0.0
+    for timeframe, result in results.items():
+        recommendation = SIGNAL_DIRECTIONS.get(result['recommendation'], 0) * float(result['confidence']) / 100
+        trend = SIGNAL_DIRECTIONS.get(result['trend'], 0) * float(result['strength']) / 100
+        weight = weights.get(timeframe, 1)
+        total += weight * (recommendation + trend) / 2
+        weight_sum += weight
+    score = round(100 * total / weight_sum, 1) if weight_sum else 0.0
+
+    trends = {result['trend'] for result in results.values()}
+    aligned = len(trends) == 1 and trends != {'neutral'}
+    strength = min(50 + abs(score) / 2, 95)
+    if score >= threshold:
+        recommendation, trend = 'buy', 'bullish'
+    elif score <= -threshold:
+        recommendation, trend = 'sell', 'bearish'
+    else:
+        recommendation, trend = 'hold', 'neutral'
+    return {
+        'score': score,
+        'recommendation': recommendation,
+        # Agreement across all timeframes adds confidence
+        'confidence': round(min(strength + (10 if aligned and recommendation != 'hold' else 0), 95), 1),
+        'trend': trend,
+        'strength': round(strength, 1),
+        'aligned': aligned
+    }
+
+def _stage_mtf_fetch_data(context):
+    """Get the base (hourly) series covering MTF_BARS bars of the highest timeframe."""
+    base_hours = MTF_TIMEFRAMES[0][1]
+    periods = MTF_BARS * MTF_TIMEFRAMES[-1][1] // base_hours
+    context.base = price_frame(get_historical_data(context.currency_pair, MTF_TIMEFRAMES[0][0], periods),
+                               context.options.get('compact'))
+
+# Single-timeframe stages run for every timeframe of a multi-timeframe analysis
+TIMEFRAME_STAGES = (_stage_indicators, _stage_features, _stage_predict, _stage_trend, _stage_levels)
+
+def _stage_mtf_timeframes(context):
+    """Resample the base series and analyze every timeframe."""
+    context.timeframes = {}
+    for timeframe, hours in MTF_TIMEFRAMES:
+        sub = AnalysisContext(context.currency_pair, timeframe, **context.options)
+        sub.historical_data = resample_frame(context.base, hours)
+        for stage in TIMEFRAME_STAGES:
+            stage(sub)
+        context.timeframes[timeframe] = sub
+
+def _stage_mtf_confluence(context):
+    """Combine the timeframes into the confluence score and recommendation."""
+    results = {
+        timeframe: {
+            'trend': sub.trend,
+            'strength': float(sub.strength),
+            'recommendation': sub.recommendation,
+            'confidence': float(sub.confidence),
+            'support': float(round(sub.support, 5)),
+            'resistance': float(round(sub.resistance, 5)),
+            'indicators': sub.indicators
+        }
+        for timeframe, sub in context.timeframes.items()
+    }
+    context.timeframe_results = results
+    combined = confluence(results)
+    context.confluence = combined
+    context.recommendation = combined['recommendation']
+    context.confidence = combined['confidence']
+    context.trend = combined['trend']
+    context.strength = combined['strength']
+
+    # Price from the base timeframe, levels and indicators from the highest
+    base = context.timeframes[MTF_TIMEFRAMES[0][0]]
+    primary = context.timeframes[MTF_TIMEFRAMES[-1][0]]
+    context.current_price = base.current_price
+    context.support = primary.support
+    context.resistance = primary.resistance
+    context.levels = primary.levels
+    context.indicators = primary.indicators
+    context.df = primary.df
+
+def _stage_mtf_ai(context):
+    """Ask Groq about all timeframes in one call."""
+    context.ai_analysis = None
+    try:
+        import groq_ai
         
-        # Resistance: a level where price has bounced down multiple times
-        # We'll use a simple calculation based on recent highs
-        resistance = recent_data['high'].max() * 1.002  # Slightly above recent highs
+        if not os.environ.get("GROQ_API_KEY"):
+            return
         
-        # Compile indicators
-        indicators_dict = {
-            'rsi': round(latest['rsi'], 2),
-            'macd': round(latest['macd'], 5),
-            'macd_signal': round(latest['macd_signal'], 5),
-            'sma_20': round(latest['sma_20'], 5),
-            'upper_band': round(latest['upper_band'], 5),
-            'lower_band': round(latest['lower_band'], 5)
+        mtf_data = {
+            'currency_pair': context.currency_pair,
+            'current_price': float(context.current_price),
+            'support': float(round(context.support, 5)),
+            'resistance': float(round(context.resistance, 5)),
+            'levels': context.levels,
+            'recommendation': context.recommendation,
+            'confidence': float(context.confidence),
+            'confluence_score': context.confluence['score'],
+            'timeframes': context.timeframe_results
         }
+        ai_analysis = groq_ai.analyze_market_mtf_with_ai(mtf_data, context.currency_pair)
+        context.ai_analysis = ai_analysis
         
-        # Try to enhance analysis with Groq AI if available and requested
-        ai_analysis = None
-        if use_ai:
-            try:
-                import groq_ai
-                import os
-                
-                # Only proceed if we have a Groq API key
-                if os.environ.get("GROQ_API_KEY"):
-                    # Create initial analysis dict for AI
-                    initial_analysis = {
-                        'currency_pair': currency_pair,
-                        'timeframe': timeframe,
-                        'current_price': float(current_price),
-                        'trend': trend,
-                        'strength': float(strength),
-                        'support': float(round(support, 5)),
-                        'resistance': float(round(resistance, 5)),
-                        'recommendation': recommendation,
-                        'confidence': float(confidence),
-                        'indicators': indicators_dict
-                    }
-                    
-                    # Get AI analysis
-                    ai_analysis = groq_ai.analyze_market_with_ai(initial_analysis, currency_pair)
-                    
-                    # Enhance our analysis with AI insights if available
-                    if ai_analysis and not ai_analysis.get('ai_error', False):
-                        # Update with AI recommendations if confidence is higher
-                        if ai_analysis.get('confidence', 0) > confidence:
-                            recommendation = ai_analysis.get('recommendation', recommendation)
-                            confidence = ai_analysis.get('confidence', confidence)
-                            trend = ai_analysis.get('trend', trend)
-                            strength = ai_analysis.get('strength', strength)
-                            
-                        logger.info(f"Enhanced analysis with Groq AI: {recommendation} ({confidence}%)")
-                
-            except ImportError:
-                logger.warning("Groq AI module not available")
-            except Exception as ai_error:
-                logger.error(f"Error using Groq AI for analysis: {str(ai_error)}")
+        # Same rule as single-timeframe analyses: the AI wins if it is more confident
+        if ai_analysis and not ai_analysis.get('ai_error', False):
+            if ai_analysis.get('confidence', 0) > context.confidence:
+                context.recommendation = ai_analysis.get('recommendation', context.recommendation)
+                context.confidence = ai_analysis.get('confidence', context.confidence)
+                context.trend = ai_analysis.get('trend', context.trend)
+                context.strength = ai_analysis.get('strength', context.strength)
+            logger.info(f"Enhanced multi-timeframe analysis with Groq AI: {context.recommendation} ({context.confidence}%)")
         
-        # Save analysis to database
-        try:
-            from app import db, with_app_context
-            from models import MarketAnalysis
-            
-            # Ensure we have an app context for database operations
-            @with_app_context
-            def save_to_database():
-                # Check if we have a recent analysis (less than 10 minutes old)
-                now = datetime.datetime.utcnow()
-                ten_minutes_ago = now - datetime.timedelta(minutes=10)
-                
-                # Try to find recent analysis
-                existing_analysis = MarketAnalysis.query.filter_by(
-                    currency_pair=currency_pair,
-                    timeframe=timeframe
-                ).filter(
-                    MarketAnalysis.timestamp > ten_minutes_ago
-                ).order_by(
-                    MarketAnalysis.timestamp.desc()
-                ).first()
-                
-                if existing_analysis:
-                    # Update existing analysis
-                    analysis_record = existing_analysis
-                else:
-                    # Create new analysis
-                    analysis_record = MarketAnalysis(
-                        currency_pair=currency_pair,
-                        timeframe=timeframe
-                    )
-                
-                # Update fields - convert any numpy types to native Python types
-                analysis_record.trend = str(trend)
-                analysis_record.strength = float(strength)
-                analysis_record.support = float(round(support, 5))
-                analysis_record.resistance = float(round(resistance, 5))
-                analysis_record.recommendation = str(recommendation)
-                analysis_record.confidence = float(confidence)
-                analysis_record.current_price = float(current_price)
-                analysis_record.timestamp = now
-                
-                # Convert any numpy values in indicators to native Python types
-                clean_indicators = {}
-                for key, value in indicators_dict.items():
-                    if hasattr(value, 'item'):  # Check if it's a numpy type
-                        clean_indicators[key] = value.item()  # Convert to native Python type
-                    else:
-                        clean_indicators[key] = value
-                
-                # Add AI insights to indicators if available
-                if ai_analysis:
-                    clean_indicators['ai_reasoning'] = ai_analysis.get('reasoning', '')
-                    clean_indicators['ai_risk_assessment'] = ai_analysis.get('risk_assessment', '')
-                    clean_indicators['ai_timeframe'] = ai_analysis.get('timeframe', '')
-                    if 'key_factors' in ai_analysis:
-                        clean_indicators['ai_key_factors'] = str(ai_analysis['key_factors'])
-                        
-                analysis_record.set_indicators(clean_indicators)
-                
-                # Save to database
-                db.session.add(analysis_record)
-                db.session.commit()
-                
-                logger.info("Analytics data saved successfully to database")
-                return analysis_record, now, clean_indicators
-            
-            # Execute the database operation with proper context
-            analysis_record, now, clean_indicators = save_to_database()
-            
-            # Compile analysis results for return
-            analysis = {
-                'id': analysis_record.id,
-                'currency_pair': currency_pair,
-                'timeframe': timeframe,
-                'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
-                'current_price': float(current_price),
-                'trend': trend,
-                'strength': float(strength),
-                'support': float(round(support, 5)),
-                'resistance': float(round(resistance, 5)),
-                'recommendation': recommendation,
-                'confidence': float(confidence),
-                'indicators': clean_indicators,
-                'historical_data': [{
-                    'date': row['date'],
-                    'close': float(row['close'])
-                } for _, row in df.tail(30).iterrows()]
-            }
-            
-            # Add AI analysis if available
-            if ai_analysis:
-                analysis['ai_analysis'] = ai_analysis
-            
-        except Exception as e:
-            logger.warning(f"Could not save analytics data to database: {str(e)}")
-            
-            # If database save fails, still return analysis
-            analysis = {
-                'currency_pair': currency_pair,
-                'timeframe': timeframe,
-                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'current_price': float(current_price),
-                'trend': trend,
-                'strength': float(strength),
-                'support': float(round(support, 5)),
-                'resistance': float(round(resistance, 5)),
-                'recommendation': recommendation,
-                'confidence': float(confidence),
-                'indicators': indicators_dict,
-                'historical_data': [{
-                    'date': row['date'],
-                    'close': float(row['close'])
-                } for _, row in df.tail(30).iterrows()]
-            }
-            
-            # Add AI analysis if available
-            if ai_analysis:
-                analysis['ai_analysis'] = ai_analysis
-            
-            # Also try to save to file as backup
-            try:
-                filename = f"analysis_{currency_pair}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                with open(filename, 'w') as f:
-                    json.dump(analysis, f, indent=2)
-                logger.info("Analytics data saved to file as backup")
-            except Exception as file_error:
-                logger.warning(f"Could not save analytics data to file: {str(file_error)}")
+    except ImportError:
+        logger.warning("Groq AI module not available")
+    except Exception as ai_error:
+        logger.error(f"Error using Groq AI for multi-timeframe analysis: {str(ai_error)}")
+
+def _stage_mtf_serialize(context):
+    """Compile the multi-timeframe analysis result."""
+    _stage_serialize(context)
+    context.analysis['confluence'] = context.confluence
+    context.analysis['timeframes'] = context.timeframe_results
+
+# The analyze_market_mtf pipeline (see ANALYSIS_PIPELINE)
+MTF_PIPELINE = Pipeline('analyze_market_mtf', [
+    Stage('fetch_data', _stage_mtf_fetch_data, provides=('base',)),
+    Stage('timeframes', _stage_mtf_timeframes, provides=('timeframes',)),
+    Stage('confluence', _stage_mtf_confluence),
+    Stage('ai', _stage_mtf_ai, skip_if=lambda context: not context.options.get('use_ai')),
+    Stage('serialize', _stage_mtf_serialize),
+    Stage('persist', _stage_persist)
+])
+
+def analyze_market_mtf(currency_pair, use_ai=True, skip=(), compact=None):
+    """
+    Analyze a currency pair on all MTF_TIMEFRAMES at once.
+
+    The timeframes are resampled from one series of hourly bars instead of
+    being fetched and analyzed separately, combined into a confluence score
+    (see confluence()) and, with use_ai, sent to Groq in a single call.
+    
+    Args:
+        currency_pair (str): The currency pair to analyze (e.g., 'EURUSD')
+        use_ai (bool): Whether to use Groq AI for enhanced analysis
+        skip (iterable): Names of MTF_PIPELINE stages to skip (e.g. 'persist')
+        compact (bool): Analyze compact float32 frames (see price_frame)
         
-        return analysis
+    Returns:
+        dict: The analyze_market fields (timeframe 'mtf'; support, resistance,
+            levels and indicators of the highest timeframe) plus 'confluence'
+            and the per-timeframe results in 'timeframes'
+    """
+    logger.info(f"Analyzing market for {currency_pair} on {', '.join(tf for tf, _ in MTF_TIMEFRAMES)}")
+    
+    try:
+        context = AnalysisContext(currency_pair, 'mtf', use_ai=use_ai, compact=compact)
+        MTF_PIPELINE.run(context, skip=skip)
+        return context.analysis
         
     except Exception as e:
-        logger.error(f"Error in market analysis: {str(e)}")
-        raise Exception(f"Market analysis failed: {str(e)}")
+        logger.error(f"Error in multi-timeframe analysis: {str(e)}")
+        raise Exception(f"Multi-timeframe analysis failed: {str(e)}")
+
+_shared_analyses = SingleFlight('analysis', ttl=ANALYSIS_FRESHNESS)
+
+def shared_analysis(currency_pair, timeframe='1d', use_ai=True):
+    """
+    Analyze a pair like analyze_market (or analyze_market_mtf for timeframe
+    'mtf'), sharing the result between callers.
+
+    Callers that ask for the same (pair, timeframe, use_ai) while it is
+    being analyzed wait for that run instead of starting their own, and
+    for ANALYSIS_FRESHNESS seconds afterwards get its result from memory.
+    So ten users asking for EURUSD at once cost one analysis, one Groq call
+    and one saved record. Errors are not reused.
+    
+    Args:
+        currency_pair (str): The currency pair to analyze (e.g., 'EURUSD')
+        timeframe (str): The timeframe for analysis, or 'mtf'
+        use_ai (bool): Whether to use Groq AI for enhanced analysis
+        
+    Returns:
+        dict: A copy of the shared analysis, safe to modify
+    """
+    key = (currency_pair, timeframe, bool(use_ai))
+    if timeframe == 'mtf':
+        analysis = _shared_analyses.do(key, lambda: analyze_market_mtf(currency_pair, use_ai=use_ai))
+    else:
+        analysis = _shared_analyses.do(key, lambda: analyze_market(currency_pair, timeframe, use_ai=use_ai))
+    return copy.deepcopy(analysis)
+
+def shared_analysis_stats():
+    """Return how many shared analyses were computed, joined in flight and served from memory."""
+    return _shared_analyses.stats()
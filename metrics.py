@@ -0,0 +1,68 @@
+import threading
+
+# Default latency bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+
+    Observations cost O(number of buckets) and memory stays constant, so it
+    can be fed on every call. Percentiles are estimated by interpolating
+    within the bucket that contains them.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)  # Last bucket is +Inf
+            self._count = 0
+            self._sum = 0.0
+            self._max = 0.0
+
+    def observe(self, seconds):
+        with self._lock:
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    index = i
+                    break
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            self._max = max(self._max, seconds)
+
+    def _percentile(self, pct):
+        if not self._count:
+            return None
+        rank = pct / 100 * self._count
+        seen = 0
+        for i, count in enumerate(self._counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self._max
+                return min(lower + (upper - lower) * (rank - seen) / count, self._max)
+            seen += count
+        return self._max
+
+    def snapshot(self):
+        """Return count, sum, average, p50/p95/p99, max and bucket counts."""
+        with self._lock:
+            buckets = {f"<={bound:g}": count for bound, count in zip(self.buckets, self._counts)}
+            buckets['+Inf'] = self._counts[-1]
+            snapshot = {
+                'count': self._count,
+                'sum': round(self._sum, 4),
+                'avg': round(self._sum / self._count, 4) if self._count else None,
+                'max': round(self._max, 4)
+            }
+            for pct in (50, 95, 99):
+                value = self._percentile(pct)
+                snapshot[f"p{pct}"] = round(value, 4) if value is not None else None
+            snapshot['buckets'] = buckets
+            return snapshot
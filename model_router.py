@@ -0,0 +1,267 @@
+import os
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Model tiers
+FAST_MODEL = os.environ.get("GROQ_MODEL", "llama3-8b-8192")
+STRONG_MODEL = os.environ.get("GROQ_STRONG_MODEL", "llama3-70b-8192")
+
+# Auto-trade executes at or above this confidence (see TradingBot.auto_trade)
+AUTO_TRADE_CONFIDENCE = 70
+# Escalate when the fast model's confidence is within this many points of the threshold
+ESCALATION_BAND = float(os.environ.get("GROQ_ESCALATION_BAND", "10"))
+
+# Number of recent latencies kept per model for percentiles
+LATENCY_WINDOW = 200
+
+
+def as_number(value, default=None):
+    """Convert an AI-provided number ("75", "75%", 75.0) to a float."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).strip().rstrip('%'))
+    except (TypeError, ValueError):
+        return default
+
+
+class RoutingPolicy:
+    """
+    How calls for one AI function are routed between model tiers.
+
+    The first pass always goes to `fast_model`. The call is repeated on
+    `strong_model` when the fast answer disagrees with the local heuristic
+    (if `escalate_on_disagreement`), or when its confidence lies within
+    `confidence_band` points of the auto-trade threshold. A `strong_model` of
+    None disables escalation for the function.
+
+    `decision` and `confidence` extract the recommendation and confidence
+    from a parsed AI result.
+    """
+
+    def __init__(self, fast_model=FAST_MODEL, strong_model=STRONG_MODEL, escalate_on_disagreement=True,
+                 confidence_band=ESCALATION_BAND, threshold=AUTO_TRADE_CONFIDENCE,
+                 decision=None, confidence=None):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.escalate_on_disagreement = escalate_on_disagreement
+        self.confidence_band = confidence_band
+        self.threshold = threshold
+        self.decision = decision or (lambda result: result.get('recommendation'))
+        self.confidence = confidence or (lambda result: result.get('confidence'))
+
+    def escalation_reason(self, result, local_decision=None):
+        """Return why `result` should be escalated, or None if it shouldn't."""
+        if not self.strong_model or self.strong_model == self.fast_model:
+            return None
+        decision = self.decision(result)
+        if self.escalate_on_disagreement and local_decision and decision and decision != local_decision:
+            return f"disagrees with local heuristic ({decision} vs {local_decision})"
+        confidence = as_number(self.confidence(result))
+        if confidence is not None and self.confidence_band and abs(confidence - self.threshold) <= self.confidence_band:
+            return f"confidence {confidence:.0f}% near the {self.threshold}% threshold"
+        return None
+
+    def to_dict(self):
+        return {
+            'fast_model': self.fast_model,
+            'strong_model': self.strong_model,
+            'escalate_on_disagreement': self.escalate_on_disagreement,
+            'confidence_band': self.confidence_band,
+            'threshold': self.threshold
+        }
+
+
+# Routing policy per AI function
+POLICIES = {}
+# Per (function, model) statistics
+STATS = {}
+STATS_LOCK = threading.Lock()
+
+
+def _overrides(function):
+    """Per-function settings from the GROQ_ROUTING environment variable (JSON)."""
+    try:
+        return json.loads(os.environ.get("GROQ_ROUTING", "{}")).get(function, {})
+    except (json.JSONDecodeError, AttributeError):
+        logger.error("Invalid GROQ_ROUTING setting, expected a JSON object keyed by function name")
+        return {}
+
+
+def register(function, **settings):
+    """
+    Register the routing policy for an AI function.
+
+    Settings from GROQ_ROUTING (e.g. '{"analyze_trade_risk": {"strong_model": null}}')
+    take precedence over the ones given here.
+    """
+    settings.update(_overrides(function))
+    POLICIES[function] = RoutingPolicy(**settings)
+    return POLICIES[function]
+
+
+def configure(function, **settings):
+    """Change settings of a registered policy at runtime."""
+    policy = get_policy(function)
+    for key, value in settings.items():
+        if not hasattr(policy, key):
+            raise ValueError(f"Unknown routing setting: {key}")
+        setattr(policy, key, value)
+    return policy
+
+
+def get_policy(function):
+    policy = POLICIES.get(function)
+    if policy is None:
+        policy = register(function)
+    return policy
+
+
+def _stats(function, model):
+    # Must be called with STATS_LOCK held
+    return STATS.setdefault((function, model), {
+        'calls': 0,
+        'latencies': deque(maxlen=LATENCY_WINDOW),
+        'compared': 0,
+        'agreed': 0,
+        'escalations': 0,
+        'escalations_skipped': 0,
+        'escalations_compared': 0,
+        'tiers_agreed': 0
+    })
+
+
+def _record(function, model, latency, agrees=None, escalated=False, tiers_agree=None):
+    with STATS_LOCK:
+        stats = _stats(function, model)
+        stats['calls'] += 1
+        stats['latencies'].append(latency)
+        if agrees is not None:
+            stats['compared'] += 1
+            stats['agreed'] += int(agrees)
+        if escalated:
+            stats['escalations'] += 1
+        if tiers_agree is not None:
+            stats['escalations_compared'] += 1
+            stats['tiers_agreed'] += int(tiers_agree)
+
+
+def _record_skipped_escalation(function, model):
+    with STATS_LOCK:
+        _stats(function, model)['escalations_skipped'] += 1
+
+
+def record_call(function, result, latency, local_decision=None):
+    """Record a fast-model call made outside route() (e.g. a streamed one)."""
+    policy = get_policy(function)
+    decision = policy.decision(result)
+    _record(function, policy.fast_model, latency,
+            agrees=(decision == local_decision) if local_decision and decision else None)
+
+
+def escalation(function, result, local_decision=None, can_escalate=None):
+    """
+    Return why the fast model's `result` should be escalated, or None.
+
+    An escalation the policy asks for but `can_escalate(model)` refuses is
+    counted as skipped and None is returned.
+    """
+    policy = get_policy(function)
+    reason = policy.escalation_reason(result, local_decision)
+    if not reason:
+        return None
+    if can_escalate is not None and not can_escalate(policy.strong_model):
+        logger.info(f"Not escalating {function} to {policy.strong_model} ({reason}), keeping fast result")
+        _record_skipped_escalation(function, policy.fast_model)
+        return None
+    return reason
+
+
+def escalate(function, result, run, reason, local_decision=None):
+    """
+    Repeat a call on the function's strong model.
+
+    Returns:
+        dict: The strong model's result, or the fast `result` if the call failed
+    """
+    policy = get_policy(function)
+    logger.info(f"Escalating {function} to {policy.strong_model}: {reason}")
+    decision = policy.decision(result)
+    start = time.monotonic()
+    try:
+        strong_result = run(policy.strong_model)
+    except Exception as e:
+        # Keep the fast answer if the larger model is unavailable
+        logger.warning(f"Escalation of {function} to {policy.strong_model} failed, keeping fast result: {str(e)}")
+        return result
+
+    strong_decision = policy.decision(strong_result)
+    _record(function, policy.strong_model, time.monotonic() - start,
+            agrees=(strong_decision == local_decision) if local_decision and strong_decision else None,
+            escalated=True, tiers_agree=(strong_decision == decision) if strong_decision and decision else None)
+    strong_result['ai_model'] = policy.strong_model
+    strong_result['ai_escalated'] = reason
+    return strong_result
+
+
+def route(function, run, local_decision=None, can_escalate=None):
+    """
+    Run an AI call on the function's fast model and escalate if needed.
+
+    Args:
+        function (str): AI function name (used to look up the routing policy)
+        run (callable): run(model) performs the call and returns the parsed result dict
+        local_decision (str): The local heuristic's recommendation, if any
+        can_escalate (callable): can_escalate(model) is asked before an
+            escalation to `model` (e.g. for its circuit breaker and the rate
+            limit); if it returns False the fast result is kept
+
+    Returns:
+        dict: The fast model's result, or the strong model's if escalated.
+            `ai_model` records which model produced it.
+    """
+    policy = get_policy(function)
+
+    start = time.monotonic()
+    result = run(policy.fast_model)
+    record_call(function, result, time.monotonic() - start, local_decision)
+    result['ai_model'] = policy.fast_model
+
+    reason = escalation(function, result, local_decision, can_escalate)
+    if not reason:
+        return result
+    return escalate(function, result, run, reason, local_decision)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def snapshot():
+    """Return routing policies and per-model latency and agreement statistics."""
+    with STATS_LOCK:
+        stats = {key: dict(value, latencies=list(value['latencies'])) for key, value in STATS.items()}
+
+    result = {function: {'policy': policy.to_dict(), 'models': {}} for function, policy in POLICIES.items()}
+    for (function, model), value in stats.items():
+        latencies = value.pop('latencies')
+        p50 = _percentile(latencies, 50)
+        p95 = _percentile(latencies, 95)
+        value['p50_latency'] = round(p50, 3) if p50 is not None else None
+        value['p95_latency'] = round(p95, 3) if p95 is not None else None
+        value['agreement_rate'] = round(value['agreed'] / value['compared'], 3) if value['compared'] else None
+        value['tier_agreement_rate'] = (round(value['tiers_agreed'] / value['escalations_compared'], 3)
+                                        if value['escalations_compared'] else None)
+        result.setdefault(function, {'policy': None, 'models': {}})['models'][model] = value
+    return result
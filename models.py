@@ -182,3 +182,21 @@ class TelegramChat(db.Model):
     
     def __repr__(self):
         return f'<TelegramChat {self.chat_id}: {self.username}>'
+
+class TelegramSession(db.Model):
+    __tablename__ = 'telegram_session'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_key = db.Column(db.String(64), unique=True, nullable=False)  # "<chat_id>:<user_id>"
+    state = db.Column(db.Text, nullable=False, default='{}')  # JSON conversation state
+    version = db.Column(db.Integer, nullable=False, default=1)  # Incremented on every save
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            if hasattr(self.__class__, key):
+                setattr(self, key, value)
+    
+    def __repr__(self):
+        return f'<TelegramSession {self.session_key} v{self.version}>'
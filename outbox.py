@@ -0,0 +1,244 @@
+import time
+import heapq
+import random
+import atexit
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from metrics import LatencyHistogram
+from rate_limit import SendLimiter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _Message:
+    __slots__ = ('key', 'func', 'args', 'kwargs', 'future', 'queued_at', 'attempts')
+
+    def __init__(self, key, func, args, kwargs):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+
+def _chain(source, target):
+    """Resolve `target` with the outcome of `source` once it is done."""
+    def copy(done):
+        if done.exception() is not None:
+            target.set_exception(done.exception())
+        else:
+            target.set_result(done.result())
+    source.add_done_callback(copy)
+
+
+class OutboundQueue:
+    """
+    Queue outgoing Telegram calls and send them within the rate limits.
+
+    send(chat_id, func, *args, **kwargs) queues a call such as
+    message.reply_text and returns a Future with its result, so handler
+    threads never wait on Telegram. Calls go out in order per chat, one at a
+    time per chat, paced by a SendLimiter (about 30/s overall, 1/s per
+    chat), on `senders` threads.
+
+    Calls queued with the same `key` for a chat coalesce while they wait:
+    the latest call replaces the earlier one (keeping its place in the
+    queue), and both callers get the same Future. Use it for messages that
+    supersede each other, like repeated edits of a status message.
+
+    When Telegram asks to slow down (429) the call is retried after the
+    requested delay; network errors are retried with jittered exponential
+    backoff, up to `max_retries` times. Edits that do not change the message
+    count as delivered.
+    """
+
+    def __init__(self, name, limiter=None, senders=4, max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.name = name
+        self.limiter = limiter or SendLimiter()
+        self.senders = senders
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._chats = {}  # chat_id -> deque of waiting _Message
+        self._keys = {}  # (chat_id, key) -> waiting _Message, for coalescing
+        self._heap = []  # (due time, sequence, chat_id) of chats whose next call can go out
+        self._scheduled = set()  # chat_ids in the heap
+        self._in_flight = set()  # chat_ids with a call being sent
+        self._sequence = 0
+        self._closed = False
+        self._thread = None
+        self._executor = None
+        self._cond = threading.Condition()
+        self._stats = {
+            'queued': 0,
+            'coalesced': 0,
+            'sent': 0,
+            'retries': 0,
+            'failed': 0
+        }
+        self.delivery = LatencyHistogram()  # Queued until delivered, including waits and retries
+        self.api = LatencyHistogram()  # Duration of the Telegram API calls
+        atexit.register(self.close)
+
+    def send(self, chat_id, func, *args, key=None, **kwargs):
+        """Queue func(*args, **kwargs) for `chat_id` and return a Future with its result."""
+        with self._cond:
+            if self._closed:
+                future = Future()
+                future.set_exception(RuntimeError(f"{self.name} outbound queue is closed"))
+                return future
+            if self._thread is None:
+                self._start()
+            self._stats['queued'] += 1
+            if key is not None:
+                waiting = self._keys.get((chat_id, key))
+                if waiting is not None:
+                    # Superseded: send the new call in place of the waiting one
+                    waiting.func, waiting.args, waiting.kwargs = func, args, kwargs
+                    self._stats['coalesced'] += 1
+                    return waiting.future
+            message = _Message(key, func, args, kwargs)
+            self._chats.setdefault(chat_id, deque()).append(message)
+            if key is not None:
+                self._keys[(chat_id, key)] = message
+            self._schedule(chat_id, time.monotonic())
+        return message.future
+
+    def _start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.senders, thread_name_prefix=f"{self.name}-sender")
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-outbox", daemon=True)
+        self._thread.start()
+
+    def _schedule(self, chat_id, due):
+        # Called with the lock held; a chat is in the heap at most once
+        if chat_id in self._scheduled or chat_id in self._in_flight or not self._chats.get(chat_id):
+            return
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, chat_id))
+        self._scheduled.add(chat_id)
+        self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                if not self._heap:
+                    if self._closed and not self._in_flight:
+                        return
+                    self._cond.wait()
+                    continue
+                due, _, chat_id = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                self._scheduled.discard(chat_id)
+
+                wait = self.limiter.reserve(chat_id)
+                if wait:
+                    self._schedule(chat_id, now + wait)
+                    continue
+
+                message = self._chats[chat_id].popleft()
+                if message.key is not None:
+                    self._keys.pop((chat_id, message.key), None)
+                self._in_flight.add(chat_id)
+                self._executor.submit(self._deliver, chat_id, message)
+
+    def _retry_delay(self, error, attempts):
+        if attempts >= self.max_retries:
+            return None
+        if isinstance(error, RetryAfter):
+            return float(error.retry_after)
+        if isinstance(error, BadRequest):
+            return None
+        if isinstance(error, NetworkError):
+            return min(self.max_backoff, self.backoff * 2 ** attempts) * random.uniform(0.5, 1.0)
+        return None
+
+    def _deliver(self, chat_id, message):
+        start = time.monotonic()
+        result, error = None, None
+        try:
+            result = message.func(*message.args, **message.kwargs)
+        except BadRequest as e:
+            # An edit with unchanged text is already delivered
+            if 'not modified' not in str(e).lower():
+                error = e
+        except Exception as e:
+            error = e
+        now = time.monotonic()
+        self.api.observe(now - start)
+
+        delay = self._retry_delay(error, message.attempts) if error is not None else None
+        with self._cond:
+            self._in_flight.discard(chat_id)
+            if delay is not None:
+                message.attempts += 1
+                self._stats['retries'] += 1
+                newer = self._keys.get((chat_id, message.key)) if message.key is not None else None
+                if newer is not None:
+                    # A newer call replaced this one while it was being sent
+                    _chain(newer.future, message.future)
+                else:
+                    self._chats.setdefault(chat_id, deque()).appendleft(message)
+                    if message.key is not None:
+                        self._keys[(chat_id, message.key)] = message
+                    self._schedule(chat_id, now + delay)
+            elif error is not None:
+                self._stats['failed'] += 1
+            else:
+                self._stats['sent'] += 1
+            if self._chats.get(chat_id):
+                self._schedule(chat_id, now if delay is None else now + delay)
+            else:
+                self._chats.pop(chat_id, None)
+            self._cond.notify_all()
+
+        if delay is not None:
+            logger.warning(f"Retrying Telegram send to chat {chat_id} in {delay:.2f}s: {str(error)}")
+        elif error is not None:
+            logger.error(f"Telegram send to chat {chat_id} failed: {str(error)}")
+            message.future.set_exception(error)
+        else:
+            self.delivery.observe(now - message.queued_at)
+            message.future.set_result(result)
+
+    def flush(self, timeout=None):
+        """Block until every queued call has been sent (or has failed)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._chats and not self._in_flight, timeout=timeout)
+
+    def close(self, timeout=10.0):
+        """Send what is queued (waiting up to `timeout`) and stop."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self.flush(timeout)
+            self._executor.shutdown(wait=False)
+
+    def snapshot(self):
+        """Return counters, queue depth and delivery/API latency histograms."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'pending': sum(len(queue) for queue in self._chats.values()),
+                'chats': len(self._chats),
+                'in_flight': len(self._in_flight),
+                'senders': self.senders
+            })
+        snapshot['delivery'] = self.delivery.snapshot()
+        snapshot['api'] = self.api.snapshot()
+        return snapshot
@@ -0,0 +1,456 @@
+import os
+import logging
+import math
+from string import Formatter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Prompt budget settings
+PROMPT_TOKEN_BUDGET = int(os.environ.get("GROQ_PROMPT_TOKEN_BUDGET", "900"))  # Max estimated tokens per prompt
+CHARS_PER_TOKEN = 4  # Rough average for English text with numbers
+
+CRYPTO_PAIRS = ["BTCUSD", "ETHUSD"]
+COMMODITY_PAIRS = ["XAUUSD"]
+
+
+def asset_class_for(currency_pair):
+    """Determine the asset class based on currency pair (forex by default)."""
+    if currency_pair in CRYPTO_PAIRS:
+        return "crypto"
+    elif currency_pair in COMMODITY_PAIRS:
+        return "commodity"
+    return "forex"
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class PromptTemplate:
+    """
+    A prompt template compiled once into literal segments and field names.
+
+    Uses str.format placeholder syntax ({field}, with {{ and }} for literal
+    braces), but the template is parsed at construction time so rendering is
+    a single join over the precomputed segments.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.segments = []
+        self.fields = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            if format_spec or conversion:
+                raise ValueError(f"Unsupported placeholder in prompt template: {field_name}")
+            self.segments.append(literal)
+            self.segments.append(field_name)
+            if field_name is not None and field_name not in self.fields:
+                self.fields.append(field_name)
+        # Tokens used by the static text alone
+        self.static_tokens = estimate_tokens(''.join(s for s in self.segments[::2]))
+
+    def render(self, values):
+        parts = []
+        for index, segment in enumerate(self.segments):
+            if index % 2 == 0:
+                parts.append(segment)
+            elif segment is not None:
+                parts.append(str(values.get(segment, 'N/A')))
+        return ''.join(parts)
+
+
+def _literal(text):
+    """Escape text so it is used verbatim in a template."""
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def _json_format(lines):
+    """Build the literal JSON response format block from its field lines."""
+    return _literal("{\n" + ",\n".join(lines) + "\n}")
+
+
+# ---------------------------------------------------------------------------
+# Market analysis (analyze_market_with_ai)
+# ---------------------------------------------------------------------------
+
+_MARKET_ANALYSIS_BODY = """
+TECHNICAL INDICATORS:
+- RSI: {rsi}
+- MACD: {macd}
+- MACD Signal: {macd_signal}
+- SMA 20: {sma_20}
+- Bollinger Bands:
+  - Upper: {upper_band}
+  - Lower: {lower_band}
+- ATR (14): {atr}
+- ADX (14): {adx} (+DI {plus_di}, -DI {minus_di})
+- Stochastic (14, 3): %K {stoch_k}, %D {stoch_d}
+- VWAP (20): {vwap}
+- Ichimoku: Tenkan {tenkan}, Kijun {kijun}, Cloud {senkou_a} - {senkou_b}
+
+CURRENT PRICE: {current_price}
+SUPPORT LEVEL: {support}
+RESISTANCE LEVEL: {resistance}
+KEY LEVELS: {key_levels}
+"""
+
+_MARKET_ANALYSIS_SPECS = {
+    "forex": {
+        "system": "You are a financial expert specializing in forex trading and technical analysis with deep knowledge of currency markets, central bank policies, and macroeconomic factors.",
+        "header": "As a forex trading expert, analyze the following market data for {currency_pair} and provide a detailed trading recommendation.",
+        "consider": "Consider relevant forex factors like interest rate differentials, economic data releases, central bank policies, and geopolitical events.",
+        "reasoning": "brief explanation",
+        "risk_assessment": "brief risk analysis",
+        "extra": []
+    },
+    "crypto": {
+        "system": "You are a cryptocurrency trading expert with deep knowledge of blockchain technology, market cycles, on-chain metrics, and crypto-specific technical analysis.",
+        "header": "As a cryptocurrency trading expert, analyze the following market data for {currency_pair} and provide a detailed trading recommendation.",
+        "consider": "Consider relevant crypto factors like market sentiment, adoption trends, regulation news, technological developments, and network metrics.",
+        "reasoning": "brief explanation focused on crypto-specific factors",
+        "risk_assessment": "brief risk analysis including volatility considerations",
+        "extra": ['  "volatility_risk": "low|medium|high"']
+    },
+    "commodity": {
+        "system": "You are a commodities trading expert specializing in gold markets with knowledge of inflation impacts, monetary policy, geopolitical factors, and precious metals market dynamics.",
+        "header": "As a commodities trading expert, analyze the following market data for Gold (XAUUSD) and provide a detailed trading recommendation.",
+        "consider": "Consider relevant gold factors like inflation expectations, US dollar strength, interest rates, market uncertainty, geopolitical risks, and physical demand.",
+        "reasoning": "brief explanation focused on gold-specific factors",
+        "risk_assessment": "brief risk analysis",
+        "extra": ['  "correlation_to_market_uncertainty": "strong_positive|positive|neutral|negative"']
+    },
+    "generic": {
+        "system": "You are a financial expert specializing in trading and technical analysis.",
+        "header": "As a financial trading expert, analyze the following market data for {currency_pair} and provide a detailed trading recommendation.",
+        "consider": None,
+        "reasoning": "brief explanation",
+        "risk_assessment": "brief risk analysis",
+        "extra": []
+    }
+}
+
+
+def _market_analysis_source(spec):
+    response_format = _json_format([
+        '  "trend": "bullish|bearish|neutral"',
+        '  "strength": "value between 0-100"',
+        '  "recommendation": "buy|sell|hold"',
+        '  "confidence": "value between 0-100"',
+        f'  "reasoning": "{spec["reasoning"]}"',
+        '  "key_factors": ["factor1", "factor2"]',
+        f'  "risk_assessment": "{spec["risk_assessment"]}"',
+        '  "timeframe": "short_term|medium_term|long_term"'
+    ] + spec["extra"])
+    consider = f"\n{spec['consider']}\n" if spec["consider"] else ""
+    return (
+        f"\n{spec['header']}\n"
+        f"{_MARKET_ANALYSIS_BODY}"
+        f"{consider}"
+        f"\nBased on this data, provide your analysis in the following JSON format:\n"
+        f"{response_format}\n"
+        f"Only respond with the JSON object, no other text.\n"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Multi-timeframe market analysis (analyze_market_mtf_with_ai)
+# ---------------------------------------------------------------------------
+
+_MARKET_MTF_BODY = """
+TIMEFRAMES (lowest first):
+{timeframes}
+
+CURRENT PRICE: {current_price}
+CONFLUENCE SCORE: {confluence_score} (-100 = all timeframes bearish, +100 = all bullish)
+LOCAL RECOMMENDATION: {recommendation} ({confidence}%)
+SUPPORT LEVEL: {support}
+RESISTANCE LEVEL: {resistance}
+KEY LEVELS: {key_levels}
+"""
+
+
+def _market_mtf_source(spec):
+    response_format = _json_format([
+        '  "trend": "bullish|bearish|neutral"',
+        '  "strength": "value between 0-100"',
+        '  "recommendation": "buy|sell|hold"',
+        '  "confidence": "value between 0-100"',
+        f'  "reasoning": "{spec["reasoning"]}"',
+        '  "timeframe_alignment": "how the timeframes agree or conflict"',
+        '  "key_factors": ["factor1", "factor2"]',
+        f'  "risk_assessment": "{spec["risk_assessment"]}"',
+        '  "timeframe": "short_term|medium_term|long_term"'
+    ] + spec["extra"])
+    consider = f"\n{spec['consider']}\n" if spec["consider"] else ""
+    return (
+        f"\n{spec['header'].replace('market data', 'multi-timeframe market data')}\n"
+        f"{_MARKET_MTF_BODY}"
+        f"{consider}"
+        f"\nUse the higher timeframes for the trend and the lower ones for timing.\n"
+        f"\nBased on this data, provide your analysis in the following JSON format:\n"
+        f"{response_format}\n"
+        f"Only respond with the JSON object, no other text.\n"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Trade opportunity evaluation (evaluate_trade_opportunity)
+# ---------------------------------------------------------------------------
+
+_TRADE_OPPORTUNITY_BODY = """
+MARKET DATA:
+- Current price: {current_price}
+- Support level: {support}
+- Resistance level: {resistance}
+- Key levels: {key_levels}
+- ATR (14): {atr}
+- Market trend: {trend}
+- Recommendation: {recommendation}
+"""
+
+_TRADE_OPPORTUNITY_SPECS = {
+    "forex": {
+        "system": "You are a professional forex trader with expertise in risk management, trade execution, and deep knowledge of currency market dynamics and central bank policies.",
+        "header": "As a professional forex trader, evaluate this trading opportunity for {currency_pair} with a {risk_level} risk tolerance.",
+        "consider": "Consider interest rate differentials, economic calendar events, and forex-specific volatility patterns.",
+        "stop_loss": "stop loss price",
+        "leverage": "recommended leverage 1-3",
+        "reasoning": "brief explanation",
+        "extra": []
+    },
+    "crypto": {
+        "system": "You are a professional cryptocurrency trader with expertise in volatility management, blockchain technology, and crypto-specific trading strategies including leverage considerations.",
+        "header": "As a professional cryptocurrency trader, evaluate this trading opportunity for {currency_pair} with a {risk_level} risk tolerance.",
+        "consider": "Consider network metrics, market sentiment, upcoming protocol changes, and crypto-specific volatility patterns.",
+        "stop_loss": "stop loss price with extra margin for crypto volatility",
+        "leverage": "recommended leverage 1-5",
+        "reasoning": "brief explanation",
+        "extra": ['  "hold_duration": "expected holding period"']
+    },
+    "commodity": {
+        "system": "You are a professional gold trader with expertise in precious metals markets, macro-economic factors affecting gold, and safe-haven asset trading strategies.",
+        "header": "As a professional gold trader, evaluate this trading opportunity for Gold (XAUUSD) with a {risk_level} risk tolerance.",
+        "consider": "Consider inflation data, USD strength, geopolitical events, central bank gold purchases, and seasonal patterns.",
+        "stop_loss": "stop loss price",
+        "leverage": "recommended leverage 1-3",
+        "reasoning": "brief explanation with focus on gold market factors",
+        "extra": ['  "portfolio_hedging_value": "value as a portfolio hedge (high|medium|low)"']
+    },
+    "generic": {
+        "system": "You are a professional trader with expertise in risk management and trade execution.",
+        "header": "As a professional trader, evaluate this trading opportunity for {currency_pair} with a {risk_level} risk tolerance.",
+        "consider": None,
+        "stop_loss": "stop loss price",
+        "leverage": "recommended leverage 1-3",
+        "reasoning": "brief explanation",
+        "extra": []
+    }
+}
+
+
+def _trade_opportunity_source(spec):
+    response_format = _json_format([
+        '  "execute_trade": true|false',
+        '  "trade_type": "buy"|"sell"',
+        '  "entry_price": "recommended entry price"',
+        f'  "stop_loss": "{spec["stop_loss"]}"',
+        '  "take_profit": "take profit price"',
+        f'  "leverage": "{spec["leverage"]}"',
+        '  "position_size_percentage": "percentage of available capital to risk"',
+        '  "expected_risk_reward": "calculated risk-reward ratio"',
+        f'  "reasoning": "{spec["reasoning"]}"',
+        '  "confidence": "value between 0-100"'
+    ] + spec["extra"])
+    consider = f"\n{spec['consider']}\n" if spec["consider"] else ""
+    return (
+        f"\n{spec['header']}\n"
+        f"{_TRADE_OPPORTUNITY_BODY}"
+        f"{consider}"
+        f"\nProvide specific trade execution details in the following JSON format:\n"
+        f"{response_format}\n"
+        f"Only respond with the JSON object, no other text.\n"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Trade risk analysis (analyze_trade_risk)
+# ---------------------------------------------------------------------------
+
+_TRADE_RISK_BODY = """
+TRADE DETAILS:
+- Trade type: {trade_type}
+- Entry price: {entry_price}
+- Trade amount: ${amount}
+- Leverage: {leverage}x
+- Notional value: ${notional_value}
+- Stop loss: {stop_loss}
+- Take profit: {take_profit}
+- Maximum risk amount: {max_risk_amount}
+
+MARKET CONDITIONS:
+- Current price: {current_price}
+- Market trend: {trend}
+- Support level: {support}
+- Resistance level: {resistance}
+- Key levels: {key_levels}
+- Level-based stop loss: {level_stop_loss}
+- ATR (14): {atr}
+- Market volatility: {volatility}
+{portfolio_section}"""
+
+_TRADE_RISK_SPECS = {
+    "forex": {
+        "system": "You are a risk management expert specializing in forex markets with deep understanding of technical and fundamental risk factors, position sizing, and risk-reward optimization.",
+        "header": "As a risk management specialist in forex trading, analyze the following trade for {currency_pair} and provide a comprehensive risk assessment.",
+        "consider": "Consider forex-specific risks including spread costs, overnight financing, slippage during high volatility, weekend gaps, and central bank announcements.",
+        "market_risks": '["spread widening", "interest rate announcement", etc.]',
+        "before_assessment": [],
+        "extra": []
+    },
+    "crypto": {
+        "system": "You are a risk management expert specializing in cryptocurrency markets with understanding of the unique volatility patterns, liquidity risks, and regulatory impacts on digital assets.",
+        "header": "As a risk management specialist in cryptocurrency trading, analyze the following trade for {currency_pair} and provide a comprehensive risk assessment.",
+        "consider": "Consider crypto-specific risks including extreme volatility, flash crashes, regulatory announcements, security breaches, fork events, and liquidity issues.",
+        "market_risks": '["high volatility", "liquidity issues", "regulatory announcements", etc.]',
+        "before_assessment": [],
+        "extra": ['  "volatility_adjustment": "percentage to widen stop loss to account for crypto volatility"']
+    },
+    "commodity": {
+        "system": "You are a risk management expert specializing in gold and commodity markets with understanding of how macroeconomic factors, inflation, and geopolitical events impact risk profiles.",
+        "header": "As a risk management specialist in commodity trading, analyze the following Gold (XAUUSD) trade and provide a comprehensive risk assessment.",
+        "consider": "Consider gold-specific risks including inflation reports, Fed interest rate decisions, USD strength, geopolitical events, and changes in physical demand.",
+        "market_risks": '["Fed announcements", "inflation data", "geopolitical events", etc.]',
+        "before_assessment": ['  "portfolio_diversification_effect": "effect on portfolio diversification"'],
+        "extra": []
+    },
+    "generic": {
+        "system": "You are a risk management expert specializing in financial markets.",
+        "header": "As a risk management specialist in financial trading, analyze the following trade for {currency_pair} and provide a comprehensive risk assessment.",
+        "consider": None,
+        "market_risks": None,
+        "before_assessment": [],
+        "extra": []
+    }
+}
+
+
+def _trade_risk_source(spec):
+    lines = [
+        '  "risk_score": "value between 1-100, higher means riskier"',
+        '  "risk_level": "low|moderate|high|extreme"',
+        '  "maximum_drawdown_percent": "estimated maximum drawdown as percentage"',
+        '  "maximum_loss_amount": "estimated maximum loss in dollars"',
+        '  "probability_of_stop_loss_hit": "percentage chance of hitting stop loss"',
+        '  "probability_of_take_profit_hit": "percentage chance of hitting take profit"',
+        '  "risk_reward_ratio": "calculated risk:reward ratio"',
+        '  "risk_factors": [\n    {"factor": "name of risk factor", "impact": "high|medium|low", "description": "brief description"}\n  ]',
+        '  "position_sizing_recommendation": "recommendation on appropriate position size"',
+        '  "leverage_recommendation": "recommendation on appropriate leverage"',
+        '  "missing_risk_controls": ["stop loss", "take profit", etc.] (if any)',
+        '  "suggested_stop_loss": "stop loss price placed beyond the nearest key level protecting the trade"'
+    ]
+    if spec["market_risks"]:
+        lines.append(f'  "market_specific_risks": {spec["market_risks"]}')
+    lines.append('  "protective_measures": ["recommended actions to reduce risk"]')
+    lines += spec["before_assessment"]
+    lines += [
+        '  "overall_assessment": "brief overall risk assessment"',
+        '  "confidence_level": "confidence in this risk assessment (0-100)"'
+    ] + spec["extra"]
+    consider = f"\n{spec['consider']}\n" if spec["consider"] else ""
+    return (
+        f"\n{spec['header']}\n"
+        f"{_TRADE_RISK_BODY}"
+        f"{consider}"
+        f"\nAnalyze both macro and micro risk factors and provide a comprehensive risk assessment in the following JSON format:\n"
+        f"{_json_format(lines)}\n"
+        f"Only respond with the JSON object, no other text.\n"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+# (function, asset_class) -> (system message, compiled prompt template)
+TEMPLATES = {}
+
+
+def register(function, asset_class, system_message, source):
+    """Compile and register the prompt template for a function and asset class."""
+    TEMPLATES[(function, asset_class)] = (system_message, PromptTemplate(source))
+
+
+for _asset_class, _spec in _MARKET_ANALYSIS_SPECS.items():
+    register('analyze_market_with_ai', _asset_class, _spec["system"], _market_analysis_source(_spec))
+for _asset_class, _spec in _MARKET_ANALYSIS_SPECS.items():
+    register('analyze_market_mtf_with_ai', _asset_class, _spec["system"], _market_mtf_source(_spec))
+for _asset_class, _spec in _TRADE_OPPORTUNITY_SPECS.items():
+    register('evaluate_trade_opportunity', _asset_class, _spec["system"], _trade_opportunity_source(_spec))
+for _asset_class, _spec in _TRADE_RISK_SPECS.items():
+    register('analyze_trade_risk', _asset_class, _spec["system"], _trade_risk_source(_spec))
+
+
+def get_template(function, currency_pair):
+    """Return the (system message, template) pair for a function and currency pair."""
+    asset_class = asset_class_for(currency_pair)
+    return TEMPLATES.get((function, asset_class)) or TEMPLATES[(function, 'generic')]
+
+
+def render(function, currency_pair, values):
+    """
+    Render the prompt for a function and currency pair.
+
+    Returns:
+        tuple: (system message, prompt)
+    """
+    system_message, template = get_template(function, currency_pair)
+    values = dict(values, currency_pair=currency_pair)
+    return system_message, template.render(values)
+
+
+def render_within_budget(function, currency_pair, values, optional_field, optional_lines,
+                         header='', budget=None):
+    """
+    Render a prompt, including as many optional context lines as fit the budget.
+
+    `optional_field` is filled with `header` followed by the lines from
+    `optional_lines` (in order) that fit within the token budget; a summary
+    line notes how many were left out.
+
+    Returns:
+        tuple: (system message, prompt, estimated prompt tokens)
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    system_message, template = get_template(function, currency_pair)
+    values = dict(values, currency_pair=currency_pair)
+
+    values[optional_field] = header
+    base_prompt = template.render(values)
+    used = estimate_tokens(system_message) + estimate_tokens(base_prompt)
+
+    kept = []
+    for line in optional_lines:
+        cost = estimate_tokens(line) + 1  # Plus the newline
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+
+    if not kept and not optional_lines:
+        return system_message, base_prompt, used
+
+    dropped = len(optional_lines) - len(kept)
+    if dropped:
+        kept.append(f"  - ... and {dropped} more (omitted to fit the prompt budget)")
+        logger.info(f"Trimmed {dropped} optional context lines from {function} prompt to fit {budget} tokens")
+
+    values[optional_field] = header + ''.join(f"{line}\n" for line in kept)
+    prompt = template.render(values)
+    return system_message, prompt, estimate_tokens(system_message) + estimate_tokens(prompt)
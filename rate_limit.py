@@ -0,0 +1,116 @@
+import time
+import threading
+
+# Telegram Bot API send limits (messages per second)
+TELEGRAM_GLOBAL_RATE = 30.0  # Across all chats
+TELEGRAM_CHAT_RATE = 1.0  # Per chat
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per second, bursts of up to `capacity`.
+
+    reserve() takes a token if one is available and otherwise reports how
+    long until one will be, so callers can choose to wait or do something
+    else in the meantime.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens=1.0):
+        """Take `tokens` and return 0, or return the seconds until they are available."""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def refund(self, tokens=1.0):
+        """Return tokens taken for a send that did not happen."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def is_full(self):
+        with self._lock:
+            self._refill(self._clock())
+            return self._tokens >= self.capacity
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` are taken; return the seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self.reserve(tokens)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class SendLimiter:
+    """
+    Global plus per-chat send rate limits.
+
+    A send takes a token from the global bucket and from its chat's bucket.
+    Chat buckets are created on demand and dropped once they are full
+    again, so memory only grows with the chats sent to in the last second
+    or so, not with the number of subscribers.
+    """
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE, chat_burst=1.0):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chats = {}  # chat_id -> TokenBucket
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            # Full buckets carry no state
+            if now - self._last_prune > self.chat_burst / self.chat_rate:
+                idle = [key for key, bucket in self._chats.items() if bucket.is_full()]
+                for key in idle:
+                    del self._chats[key]
+                self._last_prune = now
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            return bucket
+
+    def reserve(self, chat_id):
+        """Take a send for `chat_id` and return 0, or return the seconds to wait before retrying."""
+        bucket = self._chat_bucket(chat_id)
+        wait = bucket.reserve()
+        if wait:
+            return wait
+        wait = self.global_bucket.reserve()
+        if wait:
+            # Give the chat token back, the send did not happen
+            bucket.refund()
+        return wait
+
+    def acquire(self, chat_id):
+        """Block until a send to `chat_id` is allowed; return the seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self.reserve(chat_id)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def tracked_chats(self):
+        with self._lock:
+            return len(self._chats)
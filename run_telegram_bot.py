@@ -4,7 +4,6 @@ import telegram_bot_simple
 import market_analysis
 import groq_ai
 import argparse
-import json
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -51,14 +50,12 @@ def test_analyze_all_pairs():
             except Exception as e:
                 logger.error(f"Error getting trade evaluation: {str(e)}")
         
-        # Save analysis to file
+        # Save analysis to the backup log
         try:
-            filename = f"analysis_{pair}_{analysis.get('timestamp', '').replace(' ', '_').replace(':', '')}.json"
-            with open(filename, 'w') as f:
-                json.dump(analysis, f, indent=2)
-            logger.info(f"  Analysis saved to {filename}")
+            market_analysis.backup_analysis(analysis)
+            logger.info(f"  Analysis appended to backup log in {market_analysis.ANALYSIS_BACKUP_DIR}")
         except Exception as e:
-            logger.error(f"Error saving analysis to file: {str(e)}")
+            logger.error(f"Error saving analysis to backup log: {str(e)}")
         
         logger.info("------------------------")
 
@@ -66,8 +63,18 @@ def main():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Run the trading bot Telegram interface")
     parser.add_argument("--test", action="store_true", help="Run tests on all currency pairs")
+    parser.add_argument("--import-backup", action="store_true",
+                        help="Import backed-up analyses into the database and exit")
+    parser.add_argument("--broadcasts", action="store_true",
+                        help="Run only the signal broadcasts (webhook mode under a WSGI server)")
     args = parser.parse_args()
     
+    # Replay analyses that could not be saved while the database was down
+    if args.import_backup:
+        result = market_analysis.import_analysis_backup()
+        logger.info(f"Imported {result['imported']} analyses ({result['skipped']} skipped) from {result['files']} files")
+        return
+    
     # If test mode, run analysis on all pairs
     if args.test:
         test_analyze_all_pairs()
@@ -78,6 +85,12 @@ def main():
         logger.error("No TELEGRAM_TOKEN provided. Please set the TELEGRAM_TOKEN environment variable.")
         return
     
+    # Webhook workers do not broadcast; one process does it for the deployment
+    if args.broadcasts:
+        logger.info("Starting Telegram signal broadcasts...")
+        telegram_bot_simple.run_broadcasts()
+        return
+    
     logger.info("Starting Telegram bot...")
     telegram_bot_simple.main()
 
@@ -0,0 +1,89 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Share one computation per key between concurrent and repeated callers.
+
+    do(key, func) runs func() once for all callers that ask for the same key
+    while it is running; they wait for it and get the same result. The
+    result is then served from memory for `ttl` seconds. Failures are
+    passed to every waiting caller but not cached. At most `max_entries`
+    results are kept (least recently used first out).
+    """
+
+    def __init__(self, name, ttl=0.0, max_entries=256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight = {}  # key -> Future
+        self._results = OrderedDict()  # key -> (expiry time, result)
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'computed': 0,
+            'shared': 0,
+            'fresh_hits': 0,
+            'errors': 0
+        }
+
+    def do(self, key, func):
+        """Return func()'s result for `key`, computing it at most once per in-flight window and ttl."""
+        with self._lock:
+            self._stats['calls'] += 1
+            entry = self._results.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._results.move_to_end(key)
+                    self._stats['fresh_hits'] += 1
+                    return entry[1]
+                del self._results[key]
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self._stats['computed'] += 1
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+                self._stats['errors'] += 1
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            if self.ttl > 0:
+                self._results[key] = (time.monotonic() + self.ttl, result)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def invalidate(self, key=None):
+        """Drop the cached result for `key` (or all results)."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'ttl': self.ttl,
+                'cached': len(self._results),
+                'in_flight': len(self._in_flight)
+            })
+        return stats
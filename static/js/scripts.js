@@ -24,14 +24,28 @@ function initializeMarketChart(chartEl) {
     const currencyPair = chartEl.getAttribute('data-currency') || 'EURUSD';
     const timeframe = chartEl.getAttribute('data-timeframe') || '1d';
     
-    // Fetch historical data from the API
-    fetch(`/api/market_data/${currencyPair}?timeframe=${timeframe}`)
+    // Fetch historical data and support/resistance levels from the API
+    fetch(`/api/market_data/${currencyPair}?timeframe=${timeframe}&levels=1`)
         .then(response => response.json())
-        .then(data => {
+        .then(result => {
+            const data = result.data;
+            
             // Extract dates and prices for the chart
             const dates = data.map(item => item.date);
             const prices = data.map(item => item.close);
             
+            // Draw each level as a dashed horizontal line
+            const levelDatasets = (result.levels || []).map(level => ({
+                label: `${level.type === 'support' ? 'Support' : 'Resistance'} ${level.price} (${level.touches} touches)`,
+                data: dates.map(() => level.price),
+                borderColor: level.type === 'support' ? 'rgba(40, 167, 69, 0.7)' : 'rgba(220, 53, 69, 0.7)',
+                borderWidth: 1,
+                borderDash: [6, 4],
+                pointRadius: 0,
+                pointHoverRadius: 0,
+                fill: false
+            }));
+            
             // Create chart
             const ctx = chartEl.getContext('2d');
             const marketChart = new Chart(ctx, {
@@ -49,7 +63,7 @@ function initializeMarketChart(chartEl) {
                         pointHoverBorderColor: '#fff',
                         fill: false,
                         tension: 0.1
-                    }]
+                    }].concat(levelDatasets)
                 },
                 options: {
                     responsive: true,
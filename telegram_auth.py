@@ -0,0 +1,150 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from write_behind import WriteBehindBuffer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Chat activity writer settings
+CHAT_FLUSH_INTERVAL = float(os.environ.get("TELEGRAM_CHAT_FLUSH_INTERVAL", "5"))  # Seconds between saves of chat activity
+CHAT_FLUSH_BATCH = 100  # Chats with pending activity that trigger an immediate save
+
+
+def parse_admin_users(value):
+    """Parse a comma-separated list of usernames and numeric IDs into a set."""
+    if isinstance(value, str):
+        value = value.split(",")
+    return frozenset(str(user).strip().lstrip("@") for user in value if str(user).strip())
+
+
+class AdminRegistry:
+    """
+    The set of Telegram usernames and numeric user IDs with admin access.
+
+    Lookups are O(1) set membership tests. reload() swaps in a new set
+    atomically, so the list can be changed while the bot is running.
+    """
+
+    def __init__(self, users=None):
+        self._users = frozenset()
+        self._lock = threading.Lock()
+        self.reload(users)
+
+    @property
+    def users(self):
+        return self._users
+
+    def reload(self, users=None):
+        """
+        Replace the admin set.
+
+        Args:
+            users: Usernames/IDs as a list or comma-separated string; None
+                reads TELEGRAM_ADMIN_USERS from the environment again
+
+        Returns:
+            int: Number of admins
+        """
+        if users is None:
+            users = os.environ.get("TELEGRAM_ADMIN_USERS", "")
+        parsed = parse_admin_users(users)
+        with self._lock:
+            self._users = parsed
+        if not parsed:
+            logger.warning("No TELEGRAM_ADMIN_USERS defined. Bot access will be restricted to admins only, but no admins are configured.")
+        else:
+            logger.info(f"Loaded {len(parsed)} Telegram admin users")
+        return len(parsed)
+
+    def is_admin(self, user_id, username=None):
+        users = self._users
+        return str(user_id) in users or bool(username and username in users)
+
+
+admins = AdminRegistry()
+
+
+def is_admin(user):
+    """Whether a Telegram user has admin access."""
+    return user is not None and admins.is_admin(user.id, user.username)
+
+
+def _write_chats(batch):
+    """
+    Register new chats and update the activity of known ones in one transaction.
+
+    Returns the TelegramChat ids in batch order.
+    """
+    from app import db, with_app_context
+    from models import TelegramChat
+
+    @with_app_context
+    def save_to_database():
+        # One query for every chat in the batch
+        known = {chat.chat_id: chat for chat in
+                 TelegramChat.query.filter(TelegramChat.chat_id.in_([chat_id for chat_id, _ in batch])).all()}
+        chats = []
+        new = 0
+        for chat_id, payload in batch:
+            chat = known.get(chat_id)
+            if chat is None:
+                chat = TelegramChat(
+                    chat_id=chat_id,
+                    username=payload['username'],
+                    first_name=payload['first_name'],
+                    last_name=payload['last_name'],
+                    is_active=True
+                )
+                db.session.add(chat)
+                new += 1
+            chat.last_activity = payload['last_activity']
+            chat.is_active = True
+            chats.append(chat)
+        db.session.commit()
+        if new:
+            logger.info(f"Registered {new} new admin chats")
+        return [chat.id for chat in chats]
+
+    return save_to_database()
+
+
+_chat_writer = None
+_chat_writer_lock = threading.Lock()
+
+
+def _get_chat_writer():
+    global _chat_writer
+    with _chat_writer_lock:
+        if _chat_writer is None:
+            _chat_writer = WriteBehindBuffer('telegram_chat', _write_chats,
+                                             max_batch=CHAT_FLUSH_BATCH,
+                                             flush_interval=CHAT_FLUSH_INTERVAL)
+        return _chat_writer
+
+
+def record_activity(update):
+    """
+    Queue registration / last activity of the chat of an update.
+
+    Returns immediately; activity of a chat is coalesced until the next
+    background save.
+    """
+    chat = update.effective_chat
+    if chat is None:
+        return None
+    user = update.effective_user
+    return _get_chat_writer().submit(str(chat.id), {
+        'username': user.username if user else None,
+        'first_name': user.first_name if user else None,
+        'last_name': user.last_name if user else None,
+        'last_activity': datetime.utcnow()
+    })
+
+
+def chat_writer_stats():
+    """Return statistics of the background chat activity writer."""
+    return _get_chat_writer().stats()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Session settings
+SESSION_TTL = float(os.environ.get("TELEGRAM_SESSION_TTL", "3600"))  # Seconds a conversation is kept after its last change
+SESSION_PURGE_INTERVAL = 300  # Seconds between deletions of expired sessions
+
+
+def session_key(chat_id, user_id):
+    """Key of the conversation of a user in a chat."""
+    return f"{chat_id}:{user_id}"
+
+
+class SessionStore:
+    """
+    Conversation state of a user in a chat, kept in the database.
+
+    The state survives restarts and is shared by every bot process, so
+    updates of one conversation can be handled by any of them. load()
+    returns the state with its version; save() writes it only if the
+    version is unchanged (another process did not save in between) and
+    pushes its expiry `ttl` seconds ahead. Expired sessions load as empty
+    and are deleted every SESSION_PURGE_INTERVAL seconds.
+    """
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._last_purge = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {
+            'loads': 0,
+            'saves': 0,
+            'conflicts': 0,
+            'expired': 0,
+            'purged': 0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def load(self, key):
+        """
+        Load a session.
+
+        Returns:
+            tuple: (state dict, version); version 0 if there is no session yet
+        """
+        from app import with_app_context
+        from models import TelegramSession
+
+        @with_app_context
+        def query():
+            return TelegramSession.query.filter_by(session_key=key).first()
+
+        session = query()
+        self._count('loads')
+        if session is None:
+            return {}, 0
+        if session.expires_at <= datetime.utcnow():
+            self._count('expired')
+            return {}, session.version
+        return json.loads(session.state), session.version
+
+    def save(self, key, state, version):
+        """
+        Save a session loaded at `version`.
+
+        Returns:
+            bool: False if another process saved the session since it was
+                loaded (its state is kept)
+        """
+        from sqlalchemy.exc import IntegrityError
+        from app import db, with_app_context
+        from models import TelegramSession
+
+        @with_app_context
+        def write():
+            now = datetime.utcnow()
+            values = {
+                'state': json.dumps(state, separators=(',', ':')),
+                'version': version + 1,
+                'updated_at': now,
+                'expires_at': now + timedelta(seconds=self.ttl)
+            }
+            if version == 0:
+                db.session.add(TelegramSession(session_key=key, **values))
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                    return False
+                return True
+            updated = TelegramSession.query.filter_by(session_key=key, version=version).update(
+                values, synchronize_session=False)
+            db.session.commit()
+            return updated == 1
+
+        saved = write()
+        self._count('saves' if saved else 'conflicts')
+        if not saved:
+            logger.warning(f"Telegram session {key} was changed by another process, discarding this change")
+        self._purge_if_due()
+        return saved
+
+    def _purge_if_due(self):
+        with self._lock:
+            if time.monotonic() - self._last_purge < SESSION_PURGE_INTERVAL:
+                return
+            self._last_purge = time.monotonic()
+        self.purge()
+
+    def purge(self):
+        """Delete expired sessions; returns how many."""
+        from app import db, with_app_context
+        from models import TelegramSession
+
+        @with_app_context
+        def delete():
+            deleted = TelegramSession.query.filter(TelegramSession.expires_at <= datetime.utcnow()).delete(
+                synchronize_session=False)
+            db.session.commit()
+            return deleted
+
+        deleted = delete()
+        self._count('purged', deleted)
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['ttl'] = self.ttl
+        return stats
+
+
+store = SessionStore()
@@ -0,0 +1,135 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ["AI_DECISION_LOG"] = "0"
+
+import groq
+import httpx
+import circuit_breaker
+import groq_ai
+import model_router
+
+MARKET_DATA = {'current_price': 1.1, 'support': 1.09, 'resistance': 1.11, 'recommendation': 'buy',
+               'indicators': {'rsi': 55.0}}
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], x_groq=None)
+
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def _server_error():
+    return groq.InternalServerError("upstream failed", body=None,
+                                    response=httpx.Response(500, request=httpx.Request('POST', 'http://groq')))
+
+
+class StreamFailureAfterDecisionTest(unittest.TestCase):
+    """A stream failing after its decision fields keeps the decision the caller may have acted on."""
+
+    def setUp(self):
+        circuit_breaker.reset_all()
+        groq_ai.API_CALLS.clear()
+
+    def test_failure_after_decision_is_not_retried(self):
+        attempts = []
+
+        def create_completion(model, system_message, prompt, stream=False):
+            attempts.append(model)
+            if len(attempts) > 1:
+                # A retry would answer differently
+                yield _chunk('{"trend": "bearish", "strength": 80, "recommendation": "sell", "confidence": 90}')
+                return
+            yield _chunk('{"trend": "bullish", "strength": 80, ')
+            yield _chunk('"recommendation": "buy", "confidence": 85, "reasoning": "Momentum')
+            raise _server_error()
+
+        with mock.patch.object(groq_ai, '_create_completion', create_completion):
+            streaming = groq_ai.analyze_market_with_ai_stream(MARKET_DATA, 'EURUSD')
+            decision = streaming.decision.result(timeout=5)
+            result = streaming.result.result(timeout=5)
+
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(decision['recommendation'], 'buy')
+        self.assertEqual(result['recommendation'], 'buy')
+        self.assertEqual(result['confidence'], 85)
+        self.assertTrue(result['ai_error'])
+
+    def test_failure_before_decision_is_retried(self):
+        attempts = []
+
+        def create_completion(model, system_message, prompt, stream=False):
+            attempts.append(model)
+            if len(attempts) == 1:
+                yield _chunk('{"trend": "bullish", ')
+                raise _server_error()
+            yield _chunk('{"trend": "bearish", "strength": 80, "recommendation": "sell", "confidence": 90, '
+                         '"reasoning": "Breakdown"}')
+
+        with mock.patch.object(groq_ai, '_create_completion', create_completion), \
+                mock.patch('circuit_breaker.time.sleep'):
+            streaming = groq_ai.analyze_market_with_ai_stream(MARKET_DATA, 'EURUSD')
+            result = streaming.result.result(timeout=5)
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(streaming.decision.result()['recommendation'], 'sell')
+        self.assertFalse(result.get('ai_error', False))
+
+
+class StreamEscalationTest(unittest.TestCase):
+    """Streamed decisions near the auto-trade threshold are made by the strong model."""
+
+    def setUp(self):
+        circuit_breaker.reset_all()
+        groq_ai.API_CALLS.clear()
+        model_router.STATS.clear()
+        self.policy = model_router.get_policy('analyze_market_with_ai')
+        self.calls = []
+
+    def create_completion(self, model, system_message, prompt, stream=False):
+        self.calls.append((model, stream))
+        if not stream:
+            return _response('{"trend": "bearish", "strength": 60, "recommendation": "hold", "confidence": 55, '
+                             '"reasoning": "Strong model"}')
+
+        def chunks():
+            yield _chunk('{"trend": "bullish", "strength": 70, "recommendation": "buy", "confidence": 72, ')
+            yield _chunk('"reasoning": "Fast model"}')
+        return chunks()
+
+    def analyze(self):
+        with mock.patch.object(groq_ai, '_create_completion', self.create_completion):
+            streaming = groq_ai.analyze_market_with_ai_stream(MARKET_DATA, 'EURUSD')
+            return streaming.decision.result(timeout=5), streaming.result.result(timeout=5)
+
+    def test_escalated_before_the_decision(self):
+        decision, result = self.analyze()
+
+        self.assertEqual(self.calls, [(self.policy.fast_model, True), (self.policy.strong_model, False)])
+        self.assertEqual(decision['recommendation'], 'hold')
+        self.assertEqual(result['ai_model'], self.policy.strong_model)
+        self.assertIn('threshold', result['ai_escalated'])
+        self.assertEqual(model_router.STATS[('analyze_market_with_ai', self.policy.fast_model)]['calls'], 1)
+        self.assertEqual(model_router.STATS[('analyze_market_with_ai', self.policy.strong_model)]['escalations'], 1)
+
+    def test_not_escalated_while_the_strong_breaker_is_open(self):
+        breaker = circuit_breaker.get_breaker('analyze_market_with_ai', self.policy.strong_model)
+        with breaker._lock:
+            breaker._trip("test")
+
+        decision, result = self.analyze()
+
+        self.assertEqual(self.calls, [(self.policy.fast_model, True)])
+        self.assertEqual(decision['recommendation'], 'buy')
+        self.assertEqual(result['reasoning'], 'Fast model')
+        self.assertEqual(
+            model_router.STATS[('analyze_market_with_ai', self.policy.fast_model)]['escalations_skipped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
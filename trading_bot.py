@@ -3,7 +3,7 @@ import datetime
 import random
 import numpy as np
 import pandas as pd
-from market_analysis import analyze_market
+from market_analysis import analyze_market, saved_analysis_id
 from datetime import datetime
 
 # Configure logging
@@ -11,6 +11,14 @@ logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('TradingBot')
 
+AUTO_TRADE_MIN_CONFIDENCE = 70  # Technical confidence (%) an auto-trade needs without an AI trade plan
+
+def calculate_profit_loss(trade_type, entry_price, current_price, amount, leverage=1):
+    """Profit/loss of a trade at `current_price` (buys gain when the price rises, other trades when it falls)."""
+    if trade_type == 'buy':
+        return (current_price - entry_price) * amount * leverage
+    return (entry_price - current_price) * amount * leverage
+
 class TradingBot:
     def __init__(self):
         self.logger = logger
@@ -45,6 +53,20 @@ class TradingBot:
         
         # Round to 5 decimal places for FX pairs
         return round(self.current_prices[currency_pair], 5)
+
+    def price_snapshot(self, currency_pairs):
+        """Current prices of several pairs in one read.
+        
+        In a real system this would be one batched quote request instead of
+        a request per pair.
+        
+        Args:
+            currency_pairs (iterable): Pairs to price
+            
+        Returns:
+            dict: Pair to current price
+        """
+        return {pair: self.get_current_price(pair) for pair in sorted(set(currency_pairs))}
     
     def execute_trade(self, currency_pair, trade_type, amount, user_id=None, source='web', leverage=1, expiry_minutes=None, pocket_option=False):
         """Execute a trade based on user input.
@@ -150,8 +172,8 @@ class TradingBot:
         """Execute a trade based on AI analysis."""
         try:
             if not analysis:
-                # Get market analysis if not provided
-                analysis = analyze_market(currency_pair, '1d')
+                # Get market analysis if not provided (only the AI decision is needed)
+                analysis = analyze_market(currency_pair, '1d', ai_decision_only=True)
                 
             self.last_analysis[currency_pair] = analysis
             
@@ -160,7 +182,7 @@ class TradingBot:
             confidence = analysis['confidence']
             
             # Only trade if confidence is high enough
-            if confidence < 70:
+            if confidence < AUTO_TRADE_MIN_CONFIDENCE:
                 self.logger.info(f"Not trading {currency_pair} - confidence too low ({confidence}%)")
                 return {
                     'status': 'skipped',
@@ -168,19 +190,25 @@ class TradingBot:
                     'recommendation': recommendation
                 }
                 
+            # Shrink the position by the open exposure correlated with it
+            if recommendation in ('buy', 'sell'):
+                amount, sizing = self.size_position(currency_pair, recommendation, amount, user_id)
+                
             # Execute the recommended trade
             if recommendation == 'buy':
                 result = self.execute_trade(currency_pair, 'buy', amount, user_id, 'auto')
+                result['sizing'] = sizing
                 
                 # Try to update the trade with analysis_id if available
-                if result['status'] == 'success' and 'id' in analysis and result['trade_id'] > 0:
+                if result['status'] == 'success' and result['trade_id'] > 0:
                     try:
                         from app import db
                         from models import Trade
                         
-                        trade = Trade.query.get(result['trade_id'])
+                        analysis_id = analysis.get('id') or saved_analysis_id(currency_pair, analysis.get('timeframe', '1d'))
+                        trade = Trade.query.get(result['trade_id']) if analysis_id else None
                         if trade:
-                            trade.analysis_id = analysis['id']
+                            trade.analysis_id = analysis_id
                             db.session.commit()
                     except Exception as e:
                         self.logger.error(f"Error linking trade to analysis: {str(e)}")
@@ -189,16 +217,18 @@ class TradingBot:
                 
             elif recommendation == 'sell':
                 result = self.execute_trade(currency_pair, 'sell', amount, user_id, 'auto')
+                result['sizing'] = sizing
                 
                 # Try to update the trade with analysis_id if available
-                if result['status'] == 'success' and 'id' in analysis and result['trade_id'] > 0:
+                if result['status'] == 'success' and result['trade_id'] > 0:
                     try:
                         from app import db
                         from models import Trade
                         
-                        trade = Trade.query.get(result['trade_id'])
+                        analysis_id = analysis.get('id') or saved_analysis_id(currency_pair, analysis.get('timeframe', '1d'))
+                        trade = Trade.query.get(result['trade_id']) if analysis_id else None
                         if trade:
-                            trade.analysis_id = analysis['id']
+                            trade.analysis_id = analysis_id
                             db.session.commit()
                     except Exception as e:
                         self.logger.error(f"Error linking trade to analysis: {str(e)}")
@@ -220,6 +250,113 @@ class TradingBot:
                 'message': str(e)
             }
     
+    def size_position(self, currency_pair, trade_type, amount, user_id=None, leverage=1):
+        """
+        Size a new position against the open trades it is correlated with.
+        
+        Returns:
+            tuple: (amount to trade, sizing details from correlation.size_position)
+        """
+        try:
+            import correlation
+            
+            sized, sizing = correlation.size_position(currency_pair, trade_type, amount,
+                                                      self.get_open_trades(user_id, limit=None), leverage)
+            if sized != amount:
+                self.logger.info(f"Sized {trade_type} {currency_pair} from {amount} to {sized} "
+                                 f"(correlated exposure {sizing['correlated_exposure']})")
+            return sized, sizing
+        except Exception as e:
+            self.logger.error(f"Error sizing position: {str(e)}")
+            return amount, None
+    
+    def execute_trades(self, orders, user_id=None, source='auto'):
+        """Execute several trades at once, e.g. the orders of an auto-traded watchlist.
+        
+        The orders are priced from one price snapshot and saved in one
+        commit, so either all of them are executed or none. Each order is
+        first shrunk by its correlated exposure to the open trades and to
+        the orders before it (see size_position).
+        
+        Args:
+            orders (list): Dicts with currency_pair, trade_type ('buy' or
+                'sell'), amount, and optionally leverage and analysis_id
+            user_id (int, optional): User ID for the trades
+            source (str, optional): Source of the trades
+            
+        Returns:
+            list: Trade information per order, like execute_trade
+        """
+        if not orders:
+            return []
+        try:
+            import correlation
+            from app import db
+            from models import Trade, User
+            
+            for order in orders:
+                if order['trade_type'] not in ('buy', 'sell'):
+                    raise ValueError(f"Trade type must be buy or sell, not {order['trade_type']}")
+            
+            prices = self.price_snapshot(order['currency_pair'] for order in orders)
+            exposure = self.get_open_trades(user_id, limit=None)
+            trades = []
+            for order in orders:
+                leverage = order.get('leverage') or 1
+                amount, sizing = correlation.size_position(order['currency_pair'], order['trade_type'],
+                                                           order['amount'], exposure, leverage)
+                trade = Trade(
+                    user_id=user_id,
+                    currency_pair=order['currency_pair'],
+                    trade_type=order['trade_type'],
+                    amount=amount,
+                    price=prices[order['currency_pair']],
+                    status='open',
+                    leverage=leverage,
+                    source=source,
+                    analysis_id=order.get('analysis_id')
+                )
+                trades.append((trade, sizing))
+                exposure.append({'currency_pair': trade.currency_pair, 'type': trade.trade_type,
+                                 'amount': amount, 'leverage': leverage})
+            
+            # Check the balance covers the whole batch
+            if user_id:
+                user = User.query.get(user_id)
+                total = sum(trade.amount for trade, _ in trades)
+                if user and user.account_balance < total:
+                    raise ValueError(f"Insufficient balance: {user.account_balance} < {total}")
+            
+            db.session.add_all([trade for trade, _ in trades])
+            db.session.commit()
+            self.logger.info(f"Executed {len(trades)} trades in one batch: {[trade for trade, _ in trades]}")
+            
+            return [{
+                'status': 'success',
+                'trade_id': trade.id,
+                'currency_pair': trade.currency_pair,
+                'type': trade.trade_type,
+                'amount': trade.amount,
+                'price': trade.price,
+                'leverage': trade.leverage,
+                'timestamp': trade.open_timestamp,
+                'sizing': sizing
+            } for trade, sizing in trades]
+        
+        except Exception as e:
+            self.logger.error(f"Error executing trades: {str(e)}")
+            try:
+                from app import db
+                db.session.rollback()
+            except Exception:
+                pass
+            return [{
+                'status': 'error',
+                'currency_pair': order.get('currency_pair'),
+                'type': order.get('trade_type'),
+                'message': str(e)
+            } for order in orders]
+    
     def close_trade(self, trade_id):
         """Close an open trade."""
         try:
@@ -236,10 +373,8 @@ class TradingBot:
             current_price = self.get_current_price(trade.currency_pair)
             
             # Calculate profit/loss
-            if trade.trade_type == 'buy':
-                profit_loss = (current_price - trade.price) * trade.amount * trade.leverage
-            else:  # sell
-                profit_loss = (trade.price - current_price) * trade.amount * trade.leverage
+            profit_loss = calculate_profit_loss(trade.trade_type, trade.price, current_price, trade.amount,
+                                                trade.leverage)
                 
             # Update trade record
             trade.status = 'closed'
@@ -0,0 +1,146 @@
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Buffer keyed writes in memory and apply them in batches in the background.
+
+    submit() returns a Future immediately. Writes are handed to `flush_batch`
+    once `max_batch` are pending or `flush_interval` seconds have passed.
+    Repeated writes for a key that is still pending are coalesced: only the
+    latest payload is written, and every caller gets the same Future.
+
+    flush_batch(items) receives a list of (key, payload) tuples and returns a
+    list with one result per item, which resolves the matching futures. If it
+    raises, all futures of the batch fail with that exception. Pending writes
+    are flushed when the process exits cleanly.
+    """
+
+    def __init__(self, name, flush_batch, max_batch=50, flush_interval=2.0):
+        self.name = name
+        self.flush_batch = flush_batch
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+
+        self._pending = OrderedDict()  # key -> (payload, future)
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'written': 0,
+            'batches': 0,
+            'errors': 0,
+            'last_batch_size': 0,
+            'last_flush_latency': None
+        }
+        self._thread = threading.Thread(target=self._run, name=f"write-behind-{name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, key, payload):
+        """Queue a write for `key` and return a Future resolving with its result."""
+        with self._cond:
+            self._stats['submitted'] += 1
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                entry = self._pending.pop(key, None)
+                if entry:
+                    future = entry[1]
+                    self._stats['coalesced'] += 1
+                else:
+                    future = Future()
+                self._pending[key] = (payload, future)
+                if len(self._pending) >= self.max_batch:
+                    self._cond.notify_all()
+
+        if closed:
+            # Late writes during shutdown are applied synchronously
+            future = Future()
+            self._apply([(key, payload, future)])
+        return future
+
+    def flush(self, wait=True, timeout=None):
+        """Write all pending items now; optionally block until they are written."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            if wait:
+                self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout=timeout)
+
+    def close(self):
+        """Flush pending writes and stop the background thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or self._flush_requested or len(self._pending) >= self.max_batch,
+                    timeout=self.flush_interval
+                )
+                if not self._pending:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                batch = []
+                while self._pending and len(batch) < self.max_batch:
+                    key, (payload, future) = self._pending.popitem(last=False)
+                    batch.append((key, payload, future))
+                if not self._pending:
+                    self._flush_requested = False
+                self._in_flight += 1
+
+            try:
+                self._apply(batch)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _apply(self, batch):
+        start = time.monotonic()
+        try:
+            results = self.flush_batch([(key, payload) for key, payload, _ in batch])
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(batch)} to {self.name}: {str(e)}")
+            with self._cond:
+                self._stats['errors'] += 1
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['last_flush_latency'] = round(time.monotonic() - start, 4)
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)